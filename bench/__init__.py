@@ -0,0 +1,8 @@
+"""Замеры конвейера распознавания (запуск: python -m bench.<модуль>).
+
+run        — скорость, вызовы OCR, память и точность на синтетических сканах
+synth      — генератор синтетических сканов с truth.json
+stub       — подставной движок OCR, читающий шрифт bench.font без tesseract
+preprocess — предобработка зон: PIL против NumPy, с кэшем и без
+startup    — холодный импорт модулей и запуск пула процессов
+"""
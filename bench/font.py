@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""Растровый шрифт 5×7 для синтетических сканов. Его умеет читать подставной движок
+(bench.stub), поэтому замеры идут без tesseract.
+
+Правила шрифта, на которые опирается разбор в stub: каждый знак занимает все 7 строк,
+в столбце 0 есть чернила, справа не больше двух пустых столбцов. Шаг знака — 6 точек,
+пробел между словами — не меньше 6 пустых столбцов."""
+
+GLYPHS = {
+    "0": ["#####", "#...#", "#...#", "#...#", "#...#", "#...#", "#####"],
+    "1": ["##...", ".#...", ".#...", ".#...", ".#...", ".#...", "###.."],
+    "2": ["#####", "....#", "....#", "#####", "#....", "#....", "#####"],
+    "3": ["#####", "....#", "....#", ".####", "....#", "....#", "#####"],
+    "4": ["#...#", "#...#", "#...#", "#####", "....#", "....#", "....#"],
+    "5": ["#####", "#....", "#....", "#####", "....#", "....#", "#####"],
+    "6": ["#####", "#....", "#....", "#####", "#...#", "#...#", "#####"],
+    "7": ["#####", "....#", "...#.", "..#..", ".#...", ".#...", ".#..."],
+    "8": ["#####", "#...#", "#...#", "#####", "#...#", "#...#", "#####"],
+    "9": ["#####", "#...#", "#...#", "#####", "....#", "....#", "#####"],
+    "№": ["#..#.", "##.#.", "#.##.", "#..#.", "#..#.", "#..#.", "#..##"],
+    "а": [".###.", "#...#", "#...#", "#####", "#...#", "#...#", "#...#"],
+    "в": ["####.", "#...#", "#...#", "####.", "#...#", "#...#", "####."],
+    "г": ["#####", "#....", "#....", "#....", "#....", "#....", "#...."],
+    "д": [".####", ".#..#", ".#..#", ".#..#", ".#..#", "#####", "#...#"],
+    "е": ["#####", "#....", "#....", "####.", "#....", "#....", "#####"],
+    "з": ["####.", "....#", "....#", ".###.", "....#", "....#", "####."],
+    "к": ["#...#", "#..#.", "#.#..", "##...", "#.#..", "#..#.", "#...#"],
+    "л": ["..###", ".#..#", ".#..#", ".#..#", ".#..#", ".#..#", "#...#"],
+    "н": ["#...#", "#...#", "#...#", "#####", "#...#", "#...#", "#...#"],
+    "о": [".###.", "#...#", "#...#", "#...#", "#...#", "#...#", ".###."],
+    "п": ["#####", "#...#", "#...#", "#...#", "#...#", "#...#", "#...#"],
+    "р": ["####.", "#...#", "#...#", "####.", "#....", "#....", "#...."],
+    "с": [".####", "#....", "#....", "#....", "#....", "#....", ".####"],
+    "т": ["#####", "..#..", "..#..", "..#..", "..#..", "..#..", "..#.."],
+    "у": ["#...#", "#...#", "#...#", ".####", "....#", "....#", "####."],
+    "я": [".####", "#...#", "#...#", ".####", "..#.#", ".#..#", "#...#"],
+}
+PITCH = 6        # шаг знака в точках шрифта
+WORD_GAP = 6     # пустых столбцов между словами (не считая межбуквенного)
+LINE_GAP = 5     # пустых строк между строками текста
+
+# слова-заполнители, собранные только из букв шрифта
+FILLER = ["накладная", "дата", "груз", "вес", "склад", "адрес", "нетто", "тара", "конверт",
+          "сдал", "договор", "сорт", "отдел", "дело", "вагон", "торг", "к", "до", "от"]
+
+def word_width(word: str)->int:
+    return len(word)*PITCH - 1
+
+def line_width(words)->int:
+    return sum(word_width(w) for w in words) + (WORD_GAP+1)*(len(words)-1)
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Предобработка зон: цепочка фильтров PIL против NumPy и старый проход (каждая вырезка
+обрабатывается заново) против RegionCache.
+
+    python -m bench.preprocess [скан ...] [--repeat 5]
+"""
+import argparse, tempfile, time
+from pathlib import Path
+
+from ella.lazy import Image, np
+from ella.imaging import open_page, orientations, preprocess_pil, preprocess_np
+from ella.recognize import search_regions, RegionCache
+
+def timeit(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter(); fn(); best = min(best, time.perf_counter() - t)
+    return best
+
+def old_flow(page, pre):
+    """Как до кэша: зона — для якорей и ещё раз для фолбэка, ROI у якоря — дважды."""
+    for angle, view in orientations(page):
+        for bbox, _ in search_regions(view):
+            region = view.crop(bbox); pre(region)
+            w, h = region.size; roi = region.crop((0, 0, w//2, h//4))
+            pre(roi); pre(roi)
+        for bbox, _ in search_regions(view):
+            pre(view.crop(bbox))
+
+def cached_flow(page):
+    cache = RegionCache()
+    for angle, view in orientations(page):
+        for bbox, _ in search_regions(view):
+            region = cache.get(view, bbox); w, h = region.size; region.crop((0, 0, w//2, h//4))
+        for bbox, _ in search_regions(view):
+            cache.get(view, bbox)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("files", nargs="*", type=Path)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args(argv)
+    files = args.files
+    if not files:
+        # без файлов — зашумлённая «страница» A4 при 300 dpi
+        p = Path(tempfile.gettempdir())/"ella_bench_page.png"
+        Image.effect_noise((2480, 3508), 40).convert("RGB").save(p); files = [p]
+    for f in files:
+        page = open_page(f, {})
+        region = page.crop(search_regions(page)[0][0])
+        print(f"{f.name}: зона {region.size[0]}×{region.size[1]}")
+        print(f"  фильтры PIL:           {timeit(lambda: preprocess_pil(region), args.repeat)*1000:8.1f} мс")
+        if np:
+            print(f"  NumPy:                 {timeit(lambda: preprocess_np(region), args.repeat)*1000:8.1f} мс")
+            print(f"  NumPy + бинаризация:   {timeit(lambda: preprocess_np(region, True), args.repeat)*1000:8.1f} мс")
+        print(f"  страница, без кэша:    {timeit(lambda: old_flow(page, preprocess_pil), args.repeat)*1000:8.1f} мс")
+        print(f"  страница, RegionCache: {timeit(lambda: cached_flow(page), args.repeat)*1000:8.1f} мс")
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Замер конвейера распознавания на синтетических сканах: файлов в секунду, вызовов OCR
+на файл, пиковая память и доля верно найденных номеров — для каждой конфигурации
+(стандартные/широкие зоны, с поворотами и без, с моделью мест номера, с индексом повторных
+сканов на наборе, где треть страниц — пересканы). По умолчанию вместо tesseract работает
+bench.stub, так что замер идёт офлайн и одинаково на любой машине.
+
+    python -m bench.run --n 40
+    python -m bench.run --n 40 --tesseract    # настоящий движок из config.json
+"""
+import argparse, json, multiprocessing, sys, tempfile, time
+from pathlib import Path
+
+# (название, широкие зоны, повороты, модель мест, набор, индекс пересканов); наборы: "листы",
+# "бланки" (типовые бланки, см. bench.synth --forms), "пересканы" (bench.synth --rescans)
+CONFIGS = [("стандартные", False, True, False, "листы", False),
+           ("стандартные, без поворотов", False, False, False, "листы", False),
+           ("широкие", True, True, False, "листы", False), ("широкие, без поворотов", True, False, False, "листы", False),
+           ("бланки", False, True, False, "бланки", False), ("бланки, модель мест", False, True, True, "бланки", False),
+           ("пересканы", False, True, False, "пересканы", False),
+           ("пересканы, индекс", False, True, False, "пересканы", True)]
+RESCANS = 0.3
+
+def peak_rss_mb():
+    """Пик памяти этого процесса. ru_maxrss для этого плох: при fork+exec (spawn) ядро переносит
+    в него пик родителя, поэтому на Linux берём VmHWM — пик собственного адресного пространства.
+    Родитель к тому же не держит растров (наборы генерирует отдельный процесс), так что и ru_maxrss
+    на macOS от родителя почти не завышается."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"): return int(line.split()[1])/1024
+    except OSError: pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset/1024/1024   # Windows
+    except Exception: pass
+    try:
+        import resource
+        r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return r/1024/1024 if sys.platform=="darwin" else r/1024
+    except ImportError:
+        return None
+
+def make_set(folder, n, seed, kind):
+    from bench.synth import generate
+    return generate(Path(folder), n, seed, forms=kind=="бланки", rescans=RESCANS if kind=="пересканы" else 0.0)
+
+def run_config(folder, truth, wide, rot, learn, dedupe, backend, conn):
+    """В отдельном процессе, чтобы пиковая память относилась только к этой конфигурации.
+    learn — модель мест учится с нуля по ходу прогона (на диск не пишется).
+    dedupe — индекс пересканов в чистой базе кэша, как в RecognizePool: хэш страницы, кандидаты,
+    распознанная страница с номером — в индекс (время хэширования входит в замер)."""
+    from ella.config import load_config
+    from ella.ocr import OcrBackend, ensure_tess, make_backend, set_backend
+    from ella.recognize import extract_number_debug
+    from ella.cache import OcrCache
+    from ella.dups import DupIndex, hash_file
+    from ella.hotspots import HotspotModel
+
+    class Counting(OcrBackend):
+        def __init__(self, inner): self.inner = inner; self.calls = 0
+        def words(self, *a, **kw): self.calls += 1; return self.inner.words(*a, **kw)
+        def text(self, *a, **kw): self.calls += 1; return self.inner.text(*a, **kw)
+        def osd(self, *a, **kw): self.calls += 1; return self.inner.osd(*a, **kw)
+
+    cfg = load_config() if backend!="bench.stub:GlyphBackend" else {}
+    cfg.update({"use_rotations": rot, "ocr_backend": backend})
+    ensure_tess(cfg)
+    counter = Counting(make_backend(cfg)); set_backend(counter)
+    model = HotspotModel(Path(folder)/"hotspots.json.bench") if learn else None
+    dups = None
+    if dedupe:
+        db = Path(folder)/"dups.sqlite.bench"
+        if db.exists(): db.unlink()
+        cache = OcrCache(db); dups = DupIndex(cache)
+    hits = wrong = found = 0; hint = None
+    t = time.perf_counter()
+    for name, meta in truth["pages"].items():
+        spots = model.snapshot() if model else None; path = Path(folder)/name
+        hashes = hash_file(path) if dups else None
+        cands = dups.find(hashes) if hashes else None
+        d = extract_number_debug(path, cfg, wide, hint=hint, keep_img=False, spots=spots,
+                                    dups=cands if dups else None)
+        if d.get("dup"): found += 1
+        elif hashes: dups.add(cache.key(path, cfg, wide)[0], hashes[0], d, path)
+        if d["serial"]:
+            hint = d["angle"]
+            if model: model.learn(d["bbox"], d.get("size"))
+        if d["serial"]==meta["serial"]: hits += 1
+        elif d["serial"]: wrong += 1
+    conn.send({"seconds": time.perf_counter() - t, "calls": counter.calls, "hits": hits,
+               "wrong": wrong, "dups": found, "rss_mb": peak_rss_mb()})
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--n", type=int, default=40, help="число синтетических страниц")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--dir", type=Path, default=Path(tempfile.gettempdir())/"ella_bench",
+                    help="куда сложить страницы (повторный запуск берёт готовые)")
+    ap.add_argument("--tesseract", action="store_true", help="настоящий OCR вместо bench.stub")
+    ap.add_argument("--json", type=Path, help="сохранить результаты в JSON")
+    args = ap.parse_args(argv)
+
+    ctx = multiprocessing.get_context("spawn"); results = []
+    dirs = {"листы": args.dir, "бланки": args.dir.with_name(args.dir.name + "_forms"),
+            "пересканы": args.dir.with_name(args.dir.name + "_rescans")}
+    # наборы рисует отдельный процесс: иначе пик памяти родителя достался бы замерам (см. peak_rss_mb)
+    with ctx.Pool(1) as gen:
+        sets = {k: (d, gen.apply(make_set, (str(d), args.n, args.seed, k))) for k, d in dirs.items()}
+    n = len(sets["листы"][1]["pages"])
+    backend = "auto" if args.tesseract else "bench.stub:GlyphBackend"
+    print(f"{n} страниц, движок: {'tesseract' if args.tesseract else 'bench.stub'}")
+    print(f"{'конфигурация':30} {'файл/с':>8} {'OCR/файл':>9} {'память, МБ':>11} {'найдено':>8} {'ошибок':>7}"
+          f" {'дублей':>7}")
+    for label, wide, rot, learn, kind, dedupe in CONFIGS:
+        folder, truth = sets[kind]
+        recv, send = ctx.Pipe(duplex=False)
+        p = ctx.Process(target=run_config, args=(str(folder), truth, wide, rot, learn, dedupe, backend, send))
+        p.start(); r = recv.recv(); p.join()
+        r.update(config=label, wide=wide, use_rotations=rot, hotspots=learn, set=kind, dedupe=dedupe, files=n)
+        results.append(r)
+        rss = f"{r['rss_mb']:.0f}" if r["rss_mb"] is not None else "—"
+        print(f"{label:30} {n/r['seconds']:8.2f} {r['calls']/n:9.1f} {rss:>11} "
+              f"{r['hits']/n:8.0%} {r['wrong']:7d} {r['dups']:7d}")
+    if args.json:
+        args.json.write_text(json.dumps(results, ensure_ascii=False, indent=1), encoding="utf-8")
+
+if __name__=="__main__":
+    main()
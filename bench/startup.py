@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Время запуска: холодный импорт модулей (каждый — в новом интерпретаторе) и какие тяжёлые
+зависимости он тянет, плюс запуск пула рабочих процессов (spawn, как на Windows и в exe)
+до первого ответа и до первой распознанной страницы.
+
+    python -m bench.startup
+    python -m bench.startup --repeat 9 --jobs 4 --json startup.json
+"""
+import argparse, json, os, statistics, subprocess, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# (что импортируем, зачем); GUI импортируется без создания окна
+TARGETS = [("ella.naming", "имена и даты"), ("ella.pool", "рабочий процесс"),
+           ("ella.batch", "пакетный прогон"), ("renamer_cli", "CLI"), ("renamer_gui", "GUI")]
+HEAVY = ("tkinter", "PIL.Image", "numpy", "pytesseract", "tesserocr")
+
+PROBE = """import sys, time
+t = time.perf_counter(); import {mod}; t = time.perf_counter() - t
+print(t, ",".join(m for m in {heavy!r} if m in sys.modules))"""
+
+def cold_import(mod, repeat):
+    """Медиана времени импорта и всего запуска интерпретатора (мс) и загруженные тяжёлые модули."""
+    imp = []; wall = []; heavy = ""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", PROBE.format(mod=mod, heavy=HEAVY)], cwd=ROOT, env=env,
+                             capture_output=True, text=True, check=True).stdout.split()
+        wall.append(time.perf_counter() - t); imp.append(float(out[0])); heavy = out[1] if len(out) > 1 else ""
+    return statistics.median(imp)*1000, statistics.median(wall)*1000, heavy
+
+def spawn_pool(jobs, page):
+    """Пул как у RecognizePool, но всегда spawn: (до первого ответа всех процессов,
+    первая страница, вторая страница) в мс."""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, wait
+    from ella.pool import _worker_init, recognize_file
+    cfg = {"ocr_backend": "bench.stub:GlyphBackend"}
+    t = time.perf_counter()
+    ex = ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_worker_init, initargs=(cfg,))
+    try:
+        wait([ex.submit(time.sleep, 0.05) for _ in range(jobs)])
+        up = time.perf_counter() - t - 0.05
+        # процессов jobs, задач jobs: первую страницу каждый читает «холодным» — с импортом PIL
+        t = time.perf_counter(); wait([ex.submit(recognize_file, str(page), cfg) for _ in range(jobs)])
+        first = time.perf_counter() - t
+        t = time.perf_counter(); wait([ex.submit(recognize_file, str(page), cfg) for _ in range(jobs)])
+        second = time.perf_counter() - t
+    finally:
+        ex.shutdown()
+    return up*1000, first*1000, second*1000
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--repeat", type=int, default=5, help="запусков на модуль (берётся медиана)")
+    ap.add_argument("--jobs", type=int, default=2, help="процессов в пуле")
+    ap.add_argument("--json", type=Path, help="сохранить результаты в JSON")
+    args = ap.parse_args(argv)
+
+    results = {"imports": [], "pool": None}
+    print(f"{'модуль':14} {'назначение':18} {'импорт, мс':>11} {'запуск, мс':>11}  тяжёлые модули")
+    for mod, what in TARGETS:
+        imp, wall, heavy = cold_import(mod, args.repeat)
+        results["imports"].append({"module": mod, "import_ms": imp, "process_ms": wall, "heavy": heavy.split(",") if heavy else []})
+        print(f"{mod:14} {what:18} {imp:11.1f} {wall:11.1f}  {heavy.replace(',', ', ') or '—'}")
+
+    from bench.synth import generate
+    out = Path(tempfile.gettempdir())/"ella_bench_startup"; truth = generate(out, 1, 1)
+    up, first, second = spawn_pool(args.jobs, out/next(iter(truth["pages"])))
+    results["pool"] = {"jobs": args.jobs, "spawn_ms": up, "first_page_ms": first, "next_page_ms": second}
+    print(f"пул из {args.jobs} (spawn): готов за {up:.0f} мс, первая страница {first:.0f} мс, "
+          f"следующая {second:.0f} мс")
+    if args.json:
+        args.json.write_text(json.dumps(results, ensure_ascii=False, indent=1), encoding="utf-8")
+
+if __name__=="__main__":
+    main()
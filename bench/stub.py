@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Подставной движок OCR для замеров без tesseract: детерминированно читает шрифт bench.font.
+
+Строки ищутся по горизонтальной проекции чернил, слова — по пустым столбцам, знаки —
+по фиксированному шагу от начала слова; каждый знак сверяется с шаблонами 5×7.
+Повёрнутый текст не читается — как и у настоящего OCR, поэтому перебор углов
+и зон нагружается честно. В настройках: "ocr_backend": "bench.stub:GlyphBackend"."""
+from array import array
+
+from PIL import Image, ImageFilter
+
+from ella.ocr import FakeBackend
+from bench.font import GLYPHS, PITCH
+
+# шаблон знака — 35-битная маска, сравнение — popcount от XOR
+TEMPLATES = {ch: sum(1 << i for i, c in enumerate("".join(rows)) if c=="#") for ch, rows in GLYPHS.items()}
+
+def _profile(img, size):
+    return array("f", img.resize(size, Image.BOX).tobytes())
+
+def _runs(profile, min_gap=1):
+    """Отрезки с чернилами; пропуски короче min_gap внутри отрезка не рвут его."""
+    runs = []; start = None; end = 0
+    for i, v in enumerate(profile):
+        if v > 0:
+            if start is None: start = i
+            end = i + 1
+        elif start is not None and i - end + 1 >= min_gap:
+            runs.append((start, end)); start = None
+    if start is not None: runs.append((start, end))
+    return runs
+
+def read_glyphs(pil, lang=None, whitelist=None):
+    # размытие 3×3 гасит одиночные точки шума, штрихи толщиной от 2 пикселей остаются тёмными
+    ink = pil.convert("L").filter(ImageFilter.BoxBlur(1)).point(lambda v: 255 if v<128 else 0)
+    W, H = ink.size
+    if W < 5 or H < 7: return []
+    inkf = ink.convert("F"); words = []
+    for y0, y1 in _runs(_profile(inkf, (1, H))):
+        h = y1 - y0; k = round(h/7)
+        if k < 1 or abs(h - 7*k) > max(1, k//2): continue
+        band = ink.crop((0, y0, W, y1)).tobytes()
+        for x0, x1 in _runs(_profile(inkf.crop((0, y0, W, y1)), (W, 1)), min_gap=5*k):
+            n = max(1, round((x1 - x0 - 4*k)/(PITCH*k)) + 1)
+            text = []; dist = 0
+            for i in range(n):
+                gx = x0 + i*PITCH*k
+                mask = 0
+                for j in range(35):
+                    r, c = divmod(j, 5)
+                    if band[min(h-1, r*k + k//2)*W + min(W-1, gx + c*k + k//2)]: mask |= 1 << j
+                ch, d = min(((ch, bin(mask ^ t).count("1")) for ch, t in TEMPLATES.items()), key=lambda x: x[1])
+                text.append(ch if d <= 4 else "?"); dist += d
+            words.append({"text": "".join(text), "left": x0, "top": y0, "width": x1 - x0, "height": h,
+                          "conf": max(0.0, 95.0 - 10.0*dist/n)})
+    return words
+
+def GlyphBackend():
+    return FakeBackend(read_glyphs)
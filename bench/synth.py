@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""Генератор синтетических сканов: страница A4 с «отправка №» и номером 2711xxxx/20xxxxxx
+в случайном месте, случайный поворот, шум и разрешение. Рядом кладётся truth.json
+с правильными ответами. Текст набран шрифтом bench.font — его читает bench.stub.
+С --forms номер стоит не где попало, а в одном из нескольких мест, как на типовых бланках.
+С --rescans доля страниц — повторные сканы недавних: тот же лист с другим шумом, сдвигом
+и иногда другой стороной (в truth у них есть dup_of).
+
+    python -m bench.synth OUT --n 40 --seed 1
+    python -m bench.synth OUT --n 40 --rescans 0.25
+"""
+import argparse, json, random
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageChops
+
+from bench.font import GLYPHS, PITCH, WORD_GAP, LINE_GAP, FILLER, line_width
+
+A4 = (8.27, 11.69)
+DPIS = (150, 200, 300, 400, 600)
+# где лежит номер: в правом верху с якорем, без «отправка», совсем без якоря, слева, вне зон
+LAYOUTS = (("anchor", 0.45), ("sign", 0.15), ("bare", 0.15), ("left", 0.15), ("outside", 0.10))
+# типовые бланки: (макет, x, y) левого верхнего угла строки в долях страницы; разброс — ±1%
+FORMS = (("anchor", 0.66, 0.08), ("sign", 0.72, 0.18), ("left", 0.04, 0.42))
+TRANSPOSE = {90: Image.Transpose.ROTATE_90, 180: Image.Transpose.ROTATE_180, 270: Image.Transpose.ROTATE_270}
+
+def draw_words(draw, x, y, words, k):
+    for w in words:
+        for ch in w:
+            for r, row in enumerate(GLYPHS[ch]):
+                for c, v in enumerate(row):
+                    if v=="#": draw.rectangle((x+c*k, y+r*k, x+(c+1)*k-1, y+(r+1)*k-1), fill=0)
+            x += PITCH*k
+        x += WORD_GAP*k
+
+def random_serial(rng)->str:
+    return rng.choice(("2711%04d" % rng.randrange(10**4), "20%06d" % rng.randrange(10**6)))
+
+def add_noise(img, level, rng):
+    """level 0 — чисто, 1 — лёгкий шум и редкие точки, 2 — сильный шум и частые точки."""
+    if not level: return img
+    amp, specks = ((0.15, 1), (0.45, 4))[level-1]
+    n = Image.frombytes("L", img.size, rng.randbytes(img.size[0]*img.size[1]))
+    img = ImageChops.add(img, n.point(lambda v: int((v-128)*amp)+128), 1.0, -128)
+    s = Image.frombytes("L", img.size, rng.randbytes(img.size[0]*img.size[1]))
+    return ImageChops.darker(img, s.point(lambda v: 0 if v<specks else 255))
+
+def finish_page(clean, rotation, noise, rng, shift=(0, 0)):
+    """Шум, сдвиг листа на стекле сканера и поворот — поверх чистой страницы."""
+    img = clean
+    if shift!=(0, 0):
+        img = Image.new("L", clean.size, 255); img.paste(clean, shift)
+    img = add_noise(img, noise, rng)
+    return img.transpose(TRANSPOSE[rotation]) if rotation else img
+
+def rescan(rng, clean, meta):
+    """Тот же лист ещё раз: шум свой, сдвиг до 1% страницы, сторона — чаще та же."""
+    W, H = clean.size
+    shift = (rng.randint(-W//100, W//100), rng.randint(-H//100, H//100))
+    rotation = meta["rotation"] if rng.random() < 0.7 else rng.choice((0, 90, 180, 270))
+    noise = rng.choices((0, 1, 2), (0.4, 0.4, 0.2))[0]
+    return finish_page(clean, rotation, noise, rng, shift), dict(meta, rotation=rotation, noise=noise)
+
+def make_page(rng, forms=False, clean_out=None):
+    dpi = rng.choice(DPIS); layout = rng.choices([l for l,_ in LAYOUTS], [w for _,w in LAYOUTS])[0]
+    if forms: layout, fx, fy = rng.choice(FORMS)
+    rotation = rng.choices((0, 90, 180, 270), (0.6, 0.15, 0.1, 0.15))[0]
+    noise = rng.choices((0, 1, 2), (0.4, 0.4, 0.2))[0]
+    W, H = int(A4[0]*dpi), int(A4[1]*dpi); k = max(2, round(dpi/100))
+    img = Image.new("L", (W, H), 255); draw = ImageDraw.Draw(img)
+
+    serial = random_serial(rng)
+    words = {"anchor": ["отправка", "№", serial], "sign": ["№", serial], "bare": [serial],
+             "left": ["№", serial], "outside": ["отправка", "№", serial]}[layout]
+    lw, lh = line_width(words)*k, 7*k
+    if forms:
+        x = int(W*(fx + rng.uniform(-0.01, 0.01))); y = int(H*(fy + rng.uniform(-0.01, 0.01)))
+    elif layout=="left":
+        x = rng.randint(int(W*0.01), max(int(W*0.01), int(W*0.20)-lw)); y = rng.randint(int(H*0.1), int(H*0.9))
+    elif layout=="outside":
+        x = rng.randint(int(W*0.30), int(W*0.50)); y = rng.randint(int(H*0.75), int(H*0.93))
+    else:
+        x = rng.randint(int(W*0.58), max(int(W*0.58), int(W*0.97)-lw)); y = rng.randint(int(H*0.03), int(H*0.30))
+    draw_words(draw, x, y, words, k)
+
+    # строки-заполнители, кроме полосы, где стоит номер
+    step = (7+LINE_GAP)*k
+    for ly in range(int(H*0.04), int(H*0.96)-lh, step):
+        if abs(ly-y) < lh + 2*LINE_GAP*k or rng.random() < 0.4: continue
+        lx = rng.randint(int(W*0.05), int(W*0.30)); line = []
+        while True:
+            w = rng.choice(FILLER)
+            if lx + line_width(line+[w])*k > W*0.95: break
+            line.append(w)
+        if line: draw_words(draw, lx, ly, line, k)
+
+    if clean_out is not None: clean_out.append(img)
+    img = finish_page(img, rotation, noise, rng)
+    return img, {"serial": serial, "layout": layout, "rotation": rotation, "dpi": dpi, "noise": noise}
+
+def generate(out: Path, n=40, seed=1, forms=False, rescans=0.0)->dict:
+    """Создаёт n страниц в out (или берёт готовые, если параметры те же); возвращает truth."""
+    out.mkdir(parents=True, exist_ok=True)
+    tpath = out/"truth.json"
+    if tpath.exists():
+        truth = json.loads(tpath.read_text(encoding="utf-8"))
+        if (truth.get("seed")==seed and len(truth.get("pages", {}))==n
+                and truth.get("forms", False)==forms and truth.get("rescans", 0.0)==rescans): return truth
+    rng = random.Random(seed); pages = {}
+    recent = []   # (имя, чистая страница, meta) последних листов — их и пересканируют
+    for i in range(n):
+        if rescans and recent and rng.random() < rescans:
+            orig, clean, ometa = rng.choice(recent)
+            img, meta = rescan(rng, clean, ometa); meta["dup_of"] = orig
+        else:
+            clean = []; img, meta = make_page(rng, forms, clean)
+            recent = (recent + [(None, clean[0], meta)])[-5:]
+        ext = rng.choices((".jpg", ".png", ".tif"), (0.6, 0.2, 0.2))[0]
+        name = f"scan_{i:04d}{ext}"
+        if ext==".jpg": img.save(out/name, quality=85, dpi=(meta["dpi"],)*2)
+        else: img.save(out/name, dpi=(meta["dpi"],)*2)
+        pages[name] = dict(meta, format=ext)
+        if recent[-1][0] is None: recent[-1] = (name,) + recent[-1][1:]
+    truth = {"seed": seed, "forms": forms, "rescans": rescans, "pages": pages}
+    tpath.write_text(json.dumps(truth, ensure_ascii=False, indent=1), encoding="utf-8")
+    return truth
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("out", type=Path)
+    ap.add_argument("--n", type=int, default=40)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--forms", action="store_true", help="номер в нескольких постоянных местах")
+    ap.add_argument("--rescans", type=float, default=0.0, help="доля повторных сканов (0..1)")
+    args = ap.parse_args(argv)
+    truth = generate(args.out, args.n, args.seed, args.forms, args.rescans)
+    print(f"{len(truth['pages'])} страниц в {args.out}")
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,17 @@
+"""Ядро Ella Renamer без интерфейса: его импортируют окно (renamer_gui.py), renamer_cli.py,
+рабочие процессы и bench. tkinter здесь не нужен, PIL/numpy/OCR подгружаются при первом
+обращении (ella.lazy).
+
+config    — config.json рядом с программой
+naming    — дата из имени папки, новые имена, снимок папки (без PIL)
+stats     — замеры этапов и сводка по пачке
+ocr       — движки OCR
+imaging   — декодирование сканов, повороты вырезок, предобработка, миниатюры
+recognize — поиск номера на странице (extract_number_debug)
+cache     — кэш результатов (SQLite)
+dups      — повторные сканы: хэш страницы и индекс
+hotspots  — модель мест номера
+pool      — пул процессов, обход и слежение за папками
+rename    — переименование с журналом, разрезание TIFF
+batch     — прогон папки и дерева датированных папок
+"""
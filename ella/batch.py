@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""Пакетный прогон: папка (FolderJob) и дерево датированных папок одним пулом (TreeRun)."""
+import os, json, time
+from pathlib import Path
+from typing import Optional, List, Tuple
+
+from ella.naming import SUPPORTED_EXTS, parse_date_from_folder, FolderSnapshot, NameIndex
+from ella.stats import StatsReport
+from ella.pool import iter_groups
+from ella.rename import SPLIT_KEEP_DIR, RenameBatch, rename_jobs, _ident
+
+TREE_STATE_NAME = ".ella-tree.json"   # состояние прогона дерева папок — в его корне
+
+# --- пакетный прогон папок ---
+class FolderJob:
+    """Одна папка пакетного прогона. Записи (строки JSONL renamer_cli) выходят в порядке файлов
+    с новыми именами по NameIndex — суффиксы совпадают с предпросмотром GUI, в каком бы порядке
+    ни пришли результаты. С apply записи копятся до finish(): переименование — одним пакетом
+    (RenameBatch), многостраничные файлы с несколькими номерами режутся в том же пакете."""
+    def __init__(self, folder: Path, date: str, apply=False, report: Optional[StatsReport]=None):
+        self.folder = Path(folder); self.date = date; self.apply = apply; self.report = report
+        self.snap = FolderSnapshot(self.folder); self.files = self.snap.files()
+        self.names = NameIndex(date, self.snap.names)
+        self.buf = {}; self.nxt = 0; self.held = []
+        self.counts = {"ok": 0, "not_found": 0, "renamed": 0, "split": 0, "exists": 0, "error": 0}
+
+    @property
+    def done(self)->bool:
+        return self.nxt >= len(self.files)
+
+    @property
+    def received(self)->int:
+        return self.nxt + len(self.buf)
+
+    def add(self, i, d: dict)->List[dict]:
+        """Итог файла i; возвращает записи, которые уже можно выдать (с apply — никаких до finish)."""
+        self.buf[i] = d; out = []
+        while self.nxt in self.buf:
+            rec = self._record(self.nxt, self.buf.pop(self.nxt)); self.nxt += 1
+            if self.apply: self.held.append(rec); continue
+            self.counts[rec["status"]] += 1; out.append(rec)
+        return out
+
+    def _record(self, i, d: dict)->dict:
+        p = self.files[i]; serial = d["serial"]; ext = p.suffix.lower()
+        rec = {"folder": str(self.folder), "file": p.name, "serial": serial, "new": None,
+               "status": "ok" if serial else "not_found", "angle": d.get("angle", 0),
+               "source": d.get("source"), "bbox": d.get("bbox"), "cached": bool(d.get("cached")),
+               "stats": d.get("stats")}
+        if d.get("error"):
+            # сбой распознавания (движок, файл) — не «номер не найден»: считается отдельно
+            rec["error"] = d["error"]
+            if not serial: rec["status"] = "error"
+        if d.get("dup"): rec["dup"] = d["dup"]
+        if self.report is not None: self.report.add(str(p), d)
+        if d.get("pages"): rec["pages"] = [pg["serial"] for pg in d["pages"]]
+        parts = d.get("parts") or []
+        if len(parts) > 1:
+            # многостраничный файл с несколькими номерами: части получают свои имена
+            self.names.set_parts(i, p.name, [ps for ps,_ in parts], ext)
+            rec["parts"] = [{"serial": ps, "pages": pg, "new": self.names.name(i, k)}
+                            for k,(ps,pg) in enumerate(parts)]
+            rec["new"] = rec["parts"][0]["new"]
+        elif serial:
+            self.names.set(i, p.name, serial, ext); rec["new"] = self.names.name(i)
+        return rec
+
+    def finish(self, jobs=16)->List[dict]:
+        """Конец папки: с apply — разрезать и переименовать, вернуть придержанные записи со статусами."""
+        held, self.held = self.held, []
+        pairs = [(r["file"], r["new"]) for r in held if r["new"] and r["new"]!=r["file"] and not r.get("parts")]
+        splits = [(r["file"], [(pt["new"], pt["pages"]) for pt in r["parts"]]) for r in held if r.get("parts")]
+        status = {}
+        if pairs or splits:
+            batch, skipped = RenameBatch.plan(self.folder, pairs, self.snap.names, splits)
+            status = dict(skipped, **batch.run(jobs))
+        for rec in held:
+            if rec["new"]:
+                st = status.get(rec["file"], "renamed")   # старое имя = новому — делать нечего
+                rec["status"] = "error" if st=="missing" else st
+            self.counts[rec["status"]] += 1
+        return held
+
+def find_dated_folders(root: Path)->List[Tuple[Path, str]]:
+    """Папки дерева root с датой в имени (parse_date_from_folder) и сканами — по дате, затем по пути.
+    Скрытые папки и SPLIT_KEEP_DIR (исходники разрезанных файлов) не обходятся."""
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith(".") and d!=SPLIT_KEEP_DIR)
+        folder = Path(dirpath); date = parse_date_from_folder(folder)
+        if date and any(n.lower().endswith(SUPPORTED_EXTS) for n in filenames):
+            found.append((folder, date))
+    found.sort(key=lambda fd: (fd[1][6:], fd[1][3:5], fd[1][:2], str(fd[0])))
+    return found
+
+class TreeCheckpoint:
+    """Состояние прогона дерева (TREE_STATE_NAME в корне): готовые папки и итоги уже
+    распознанных файлов незаконченных — прерванный прогон с теми же настройками продолжается
+    с места остановки без повторного OCR, даже при выключенном кэше. Итоги со сбоем
+    (dbg["error"]) сюда не попадают, как и в кэш распознавания. Пишется не чаще раза в
+    EVERY секунд и по концу каждой папки; после полного прохода удаляется."""
+    EVERY = 5.0
+    KEEP = ("serial", "angle", "source", "bbox", "size", "frame", "pages", "parts", "dup")
+
+    def __init__(self, root: Path, opts: dict, restart=False):
+        self.path = Path(root)/TREE_STATE_NAME; self.opts = opts
+        self.folders = {}   # путь от корня -> {"done", "counts"} или {"done": False, "results": {имя: [ident, итог]}}
+        self.saved = time.monotonic()
+        if restart: return
+        try: data = json.loads(self.path.read_text(encoding="utf-8"))
+        except Exception: return
+        if data.get("opts")==opts: self.folders = data.get("folders") or {}
+
+    def folder(self, rel: str)->dict:
+        return self.folders.setdefault(rel, {"done": False, "results": {}})
+
+    def result(self, rel: str, path: Path)->Optional[dict]:
+        """Итог файла из прошлого прогона, если файл с тех пор не менялся."""
+        r = self.folder(rel)["results"].get(path.name)
+        if not r: return None
+        try: ident = _ident(os.stat(path))
+        except OSError: return None
+        return dict(r[1], cached=True) if ident[:2]==r[0][:2] else None
+
+    def put(self, rel: str, path: Path, dbg: dict):
+        try: ident = _ident(os.stat(path))
+        except OSError: return
+        self.folder(rel)["results"][path.name] = [ident, {k: dbg.get(k) for k in self.KEEP if k in dbg}]
+        self.save()
+
+    def folder_done(self, rel: str, counts: dict):
+        self.folders[rel] = {"done": True, "counts": counts}; self.save(force=True)
+
+    def save(self, force=False):
+        if not force and time.monotonic() - self.saved < self.EVERY: return
+        data = json.dumps({"opts": self.opts, "folders": self.folders}, ensure_ascii=False)
+        tmp = self.path.with_suffix(".tmp")
+        try: tmp.write_text(data, encoding="utf-8"); os.replace(tmp, self.path)
+        except Exception: pass
+        self.saved = time.monotonic()
+
+    def discard(self):
+        try: os.remove(self.path)
+        except OSError: pass
+
+class TreeRun:
+    """Прогон дерева датированных папок (после праздников их десятки): файлы всех папок идут
+    в один пул процессов (iter_groups, по кругу), имена и переименование у каждой папки свои
+    (FolderJob), дата — из имени папки. Прерванный прогон продолжается (TreeCheckpoint)."""
+    def __init__(self, root: Path, cfg: dict, wide=False, apply=False, jobs=None, cache=None,
+                 force=False, model=None, report: Optional[StatsReport]=None, restart=False):
+        self.root = Path(root); self.cfg = cfg; self.wide = wide; self.apply = apply
+        self.jobs = jobs; self.cache = cache; self.force = force; self.model = model; self.report = report
+        opts = {"wide": wide, "apply": apply, "multipage": cfg.get("multipage", "first"),
+                "use_rotations": cfg.get("use_rotations", True)}
+        self.state = TreeCheckpoint(self.root, opts, restart)
+        self.folders = find_dated_folders(self.root)
+
+    def rel(self, folder: Path)->str:
+        return Path(folder).relative_to(self.root).as_posix()
+
+    def run(self, on_records=None, on_folder=None, cancel=None, on_file=None)->bool:
+        """on_records(job, записи) — по мере готовности; on_folder(rel, job или None, counts) — папка
+        закончена (None — была готова в прошлый раз или не открылась); on_file(rel, job) — после
+        каждого файла, для прогресса (job.received из len(job.files)). True — дерево пройдено целиком."""
+        todo = []
+        for folder, date in self.folders:
+            rel = self.rel(folder); st = self.state.folder(rel)
+            if st["done"]:
+                if on_folder: on_folder(rel, None, st["counts"])
+                continue
+            try:
+                if self.apply:
+                    status = RenameBatch.resume(folder, rename_jobs(self.cfg))
+                    if status and any(v!="renamed" for v in status.values()):
+                        raise OSError("прерванное переименование не доделано, см. --undo")
+                job = FolderJob(folder, date, self.apply, self.report)
+            except OSError:
+                if on_folder: on_folder(rel, None, {"error": 1})
+                continue
+            pend = []
+            for i, p in enumerate(job.files):
+                d = self.state.result(rel, p)
+                if d is None: pend.append(i); continue
+                recs = job.add(i, d)
+                if recs and on_records: on_records(job, recs)
+            if on_file: on_file(rel, job)
+            todo.append((rel, job, pend))
+        for rel, job, _ in todo:
+            if job.done: self._finish(rel, job, on_records, on_folder)
+        finished = False
+        it = iter_groups([[job.files[i] for i in pend] for _, job, pend in todo], self.cfg, self.wide,
+                         self.jobs, cancel, self.cache, self.force, self.model)
+        try:
+            for g, k, path, dbg in it:
+                rel, job, pend = todo[g]
+                # сбой (движок, файл, рабочий процесс) не запоминаем: при продолжении файл распознается заново
+                if not dbg.get("error"): self.state.put(rel, path, dbg)
+                recs = job.add(pend[k], dbg)
+                if recs and on_records: on_records(job, recs)
+                if on_file: on_file(rel, job)
+                if job.done: self._finish(rel, job, on_records, on_folder)
+            finished = all(job.done for _, job, _ in todo)
+        finally:
+            it.close()
+            if finished: self.state.discard()
+            else: self.state.save(force=True)
+        return finished
+
+    def _finish(self, rel, job, on_records, on_folder):
+        recs = job.finish(rename_jobs(self.cfg))
+        if recs and on_records: on_records(job, recs)
+        self.state.folder_done(rel, job.counts)
+        if on_folder: on_folder(rel, job, job.counts)
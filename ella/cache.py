@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Кэш результатов распознавания (SQLite рядом с config.json)."""
+import os, json, time, sqlite3, hashlib, threading
+from pathlib import Path
+from typing import Optional, Tuple
+
+from ella.config import app_dir
+
+CACHE_NAME = "ocr_cache.sqlite"
+CACHE_VERSION = 6   # повышать при любом изменении алгоритма распознавания — старый кэш сбросится
+
+# --- кэш результатов распознавания ---
+def file_digest(path: Path)->str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1<<20), b""): h.update(chunk)
+    return h.hexdigest()
+
+class OcrCache:
+    """Результаты extract_number_debug на диске (SQLite рядом с config.json).
+    Ключ — хэш содержимого + «широкие зоны» + «повороты»; размер/mtime/inode — быстрый путь к хэшу,
+    чтобы не перечитывать файл. При превышении max_mb выбрасываются давно не использованные записи."""
+    def __init__(self, path: Optional[Path]=None, max_mb=64):
+        self.path = path or app_dir()/CACHE_NAME
+        self.max_bytes = int(max_mb*1024*1024)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS meta(k TEXT PRIMARY KEY, v TEXT);
+            CREATE TABLE IF NOT EXISTS files(path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER,
+                                             inode INTEGER, digest TEXT);
+            CREATE TABLE IF NOT EXISTS results(digest TEXT, wide INTEGER, rot INTEGER, data TEXT,
+                                               size INTEGER, used REAL, PRIMARY KEY(digest, wide, rot));
+            CREATE INDEX IF NOT EXISTS results_used ON results(used);
+            CREATE TABLE IF NOT EXISTS pages(digest TEXT PRIMARY KEY, hash TEXT, data TEXT, used REAL);
+        """)
+        with self.db:
+            row = self.db.execute("SELECT v FROM meta WHERE k='version'").fetchone()
+            if not row or row[0]!=str(CACHE_VERSION):
+                self.db.execute("DELETE FROM results")
+                self.db.execute("INSERT OR REPLACE INTO meta VALUES('version', ?)", (str(CACHE_VERSION),))
+
+    def known(self, path: Path)->Tuple[Optional[str], tuple]:
+        """Хэш по быстрому пути (размер/mtime/inode не менялись) или None — файл надо прочитать;
+        вторым — подпись файла для remember()."""
+        st = os.stat(path); sig = (st.st_size, st.st_mtime_ns, st.st_ino)
+        with self.lock:
+            row = self.db.execute("SELECT size, mtime, inode, digest FROM files WHERE path=?",
+                                  (str(Path(path).resolve()),)).fetchone()
+        return (row[3] if row and tuple(row[:3])==sig else None), sig
+
+    def remember(self, path: Path, sig: tuple, digest: str):
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO files VALUES(?,?,?,?,?)", (str(Path(path).resolve()),)+sig+(digest,))
+
+    def digest(self, path: Path)->str:
+        d, sig = self.known(path)
+        if d is None: d = file_digest(path); self.remember(path, sig, d)
+        return d
+
+    @staticmethod
+    def result_key(digest: str, cfg: dict, wide=False)->Tuple[str,int,int]:
+        return (digest, int(bool(wide)), int(bool(cfg.get("use_rotations", True))))
+
+    def key(self, path: Path, cfg: dict, wide=False)->Tuple[str,int,int]:
+        return self.result_key(self.digest(path), cfg, wide)
+
+    def get(self, key)->Optional[dict]:
+        with self.lock, self.db:
+            row = self.db.execute("SELECT data FROM results WHERE digest=? AND wide=? AND rot=?", key).fetchone()
+            if not row: return None
+            self.db.execute("UPDATE results SET used=? WHERE digest=? AND wide=? AND rot=?", (time.time(),)+key)
+        d = json.loads(row[0])
+        d["bbox"] = tuple(d["bbox"]) if d.get("bbox") else None
+        d["regions"] = [(tuple(b), lbl) for b,lbl in d.get("regions") or []]
+        d["img"] = None; d["cached"] = True
+        return d
+
+    def put(self, key, dbg: dict):
+        keep = ("serial","angle","bbox","source","regions","size","frame","pages","parts","dup")
+        data = json.dumps({k: dbg[k] for k in keep if k in dbg}, ensure_ascii=False)
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO results VALUES(?,?,?,?,?,?)", key+(data, len(data), time.time()))
+            self._evict()
+
+    def _evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size),0) FROM results").fetchone()[0]
+        if total <= self.max_bytes: return
+        target = int(self.max_bytes*0.9)
+        for digest, wide, rot, size in self.db.execute(
+                "SELECT digest, wide, rot, size FROM results ORDER BY used").fetchall():
+            if total <= target: break
+            self.db.execute("DELETE FROM results WHERE digest=? AND wide=? AND rot=?", (digest, wide, rot))
+            total -= size
+        self.db.execute("DELETE FROM files WHERE digest NOT IN (SELECT digest FROM results)")
+
+    def close(self):
+        with self.lock: self.db.close()
+
+def open_cache(cfg: dict)->Optional[OcrCache]:
+    """Кэш по настройкам; если он выключен или база недоступна (папка только для чтения) — None."""
+    if not cfg.get("cache", True): return None
+    try: return OcrCache(max_mb=float(cfg.get("cache_max_mb", 64)))
+    except Exception: return None
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""Настройки (config.json рядом с программой)."""
+import sys, json
+from pathlib import Path
+
+CONFIG_NAME = "config.json"
+
+def app_dir()->Path:
+    if getattr(sys, "frozen", False):
+        return Path(sys.executable).parent
+    return Path(__file__).resolve().parent.parent
+
+def load_config()->dict:
+    cfg_path = app_dir() / CONFIG_NAME
+    if cfg_path.exists():
+        try:
+            return json.loads(cfg_path.read_text(encoding="utf-8"))
+        except Exception:
+            pass
+    return {"tesseract_path": r"C:\Program Files\Tesseract-OCR\tesseract.exe",
+            "use_rotations": True}
+
+def save_config(cfg: dict):
+    (app_dir() / CONFIG_NAME).write_text(json.dumps(cfg, ensure_ascii=False, indent=2), encoding="utf-8")
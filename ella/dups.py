@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""Повторные сканы одного листа: хэш страницы, отпечаток места номера и индекс (DupIndex)."""
+import json, time
+from pathlib import Path
+from typing import Optional, List, Tuple
+
+from ella.lazy import Image, np
+from ella.stats import timed
+from ella.imaging import ANGLE_OPS, RotView, open_frame
+from ella.cache import OcrCache
+
+# --- повторные сканы ---
+DUP_ROI_H = 32        # высота отпечатка места номера (с полями), пикселей
+
+def dhash(img, n=16)->int:
+    """Разностный хэш n×n бит: соседние пиксели строки миниатюры (n+1)×n — светлее/темнее."""
+    px = img.convert("L").resize((n+1, n), Image.BOX).tobytes(); bits = 0
+    for y in range(n):
+        row = px[y*(n+1):(y+1)*(n+1)]
+        for x in range(n): bits = bits<<1 | (row[x] > row[x+1])
+    return bits
+
+def page_hashes(path: Path)->List[int]:
+    """dHash страницы (после EXIF) в поворотах 0/90/180/270, как у RotView. Миниатюры хватает:
+    JPEG декодируется сразу в 1/8 (draft), так что это много дешевле распознавания."""
+    im, op = open_frame(path)
+    try: im.draft("L", (128, 128))
+    except Exception: pass
+    if op is not None: im = im.transpose(op)
+    im = im.convert("L"); im.thumbnail((128, 128))
+    return [dhash(im.transpose(ANGLE_OPS[a]) if a else im) for a in (0, 90, 180, 270)]
+
+def _roi_box(view, bbox, margin=0)->Tuple[Tuple[int,int,int,int], float]:
+    """Место номера с полями в полвысоты (и запасом margin на сдвиг листа) и масштаб отпечатка."""
+    x0, y0, x1, y1 = bbox; pad = max(1, (y1-y0)//2)
+    box = (max(0, x0-pad-margin), max(0, y0-pad-margin),
+           min(view.size[0], x1+pad+margin), min(view.size[1], y1+pad+margin))
+    return box, DUP_ROI_H/(y1-y0+2*pad)
+
+def _gray(view, box, s):
+    W, H = max(1, round((box[2]-box[0])*s)), max(1, round((box[3]-box[1])*s))
+    return np.asarray(view.crop(box).convert("L").resize((W, H), Image.BOX), dtype=np.float64)
+
+def roi_print(view, bbox)->Optional[list]:
+    """Отпечаток места номера — серая миниатюра bbox с полями: [ширина, высота, hex]."""
+    if not np or not bbox: return None
+    box, s = _roi_box(view, bbox)
+    if box[2] <= box[0] or box[3] <= box[1]: return None
+    a = _gray(view, box, s).astype(np.uint8)
+    return [a.shape[1], a.shape[0], a.tobytes().hex()]
+
+# пороги roi_match: на синтетике пересканы дают не ниже 0.75 / 0.49, чужие номера — до 0.61 / 0.37
+DUP_NCC = 0.7; DUP_STRIP = 0.45
+
+@timed("dup")
+def match_duplicate(base, dups: List[dict])->Optional[dict]:
+    """Сверка скана с кандидатами DupIndex.find: номер кандидата переходит к скану, если на
+    месте номера (с поправкой на сдвиг листа) стоит то же самое — без единого вызова OCR."""
+    if not np: return None
+    for c in dups:
+        if not c.get("size") or not c.get("bbox") or not c.get("roi"): continue
+        view = RotView(base, c["angle"])
+        sx, sy = view.size[0]/c["size"][0], view.size[1]/c["size"][1]
+        x0, y0, x1, y1 = c["bbox"]
+        r = roi_match(view, (round(x0*sx), round(y0*sy), round(x1*sx), round(y1*sy)), c["roi"])
+        if r and r[0] >= DUP_NCC and r[1] >= DUP_STRIP:
+            return {"serial": c["serial"], "angle": c["angle"], "bbox": r[2], "size": view.size,
+                    "source": f"{Path(c['name']).name}, повторный скан", "dup": c["name"], "dup_digest": c["digest"]}
+    return None
+
+def roi_match(view, bbox, fp)->Optional[Tuple[float, float, Tuple[int,int,int,int]]]:
+    """Ищет отпечаток fp около bbox (лист на стекле мог сдвинуться): нормированная корреляция
+    по всем сдвигам сразу (через FFT), в лучшем положении — ещё и по полосам шириной в цифру,
+    чтобы соседний номер того же бланка (одна цифра другая) не прошёл. (общая, худшая полоса, bbox)."""
+    w, h, data = fp
+    t = np.frombuffer(bytes.fromhex(data), dtype=np.uint8).reshape(h, w).astype(np.float64)
+    x0, y0, x1, y1 = bbox
+    box, s = _roi_box(view, bbox, max(2*(y1-y0), int(0.015*max(view.size))))
+    win = _gray(view, box, s); H, W = win.shape
+    if H < h or W < w: return None
+    tz = t - t.mean(); tn = np.sqrt((tz*tz).sum())
+    if tn < 1e-6: return None
+    corr = np.fft.irfft2(np.fft.rfft2(win) * np.fft.rfft2(tz[::-1, ::-1], s=win.shape), s=win.shape)[h-1:, w-1:]
+    S = np.pad(win, ((1, 0), (1, 0))).cumsum(0).cumsum(1); S2 = np.pad(win*win, ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+    box_sum = lambda A: A[h:, w:] - A[:-h, w:] - A[h:, :-w] + A[:-h, :-w]
+    s1 = box_sum(S); var = np.maximum(box_sum(S2) - s1*s1/(h*w), 1e-9)
+    ncc = corr/(np.sqrt(var)*tn)
+    dy, dx = np.unravel_index(int(np.argmax(ncc)), ncc.shape)
+    p = win[dy:dy+h, dx:dx+w]; worst = 1.0
+    ink = t < t.mean() - 0.5*t.std(); step = max(1, h//2)
+    for x in range(0, w - step//2, step):
+        if ink[:, x:x+step].mean() < 0.05: continue   # поле без знаков — сравнивать нечего
+        a = t[:, x:x+step] - t[:, x:x+step].mean(); b = p[:, x:x+step] - p[:, x:x+step].mean()
+        worst = min(worst, float((a*b).sum()/(np.sqrt((a*a).sum()*(b*b).sum()) + 1e-9)))
+    tb, _ = _roi_box(view, bbox)   # где отпечаток начинается относительно bbox
+    fx, fy = box[0] + dx/s + x0 - tb[0], box[1] + dy/s + y0 - tb[1]
+    return float(ncc[dy, dx]), worst, (round(fx), round(fy), round(fx + x1-x0), round(fy + y1-y0))
+
+def hash_file(path)->Optional[List[int]]:
+    try: return page_hashes(Path(path))
+    except Exception: return None
+
+class DupIndex:
+    """Повторные сканы одного листа. Для распознанных страниц с номером в базе кэша (таблица
+    pages) лежат dHash страницы и отпечаток места номера (roi_print), так что лист,
+    пересканированный через неделю, тоже узнаётся. find() отбирает кандидатов по хэшу в любом
+    из четырёх поворотов, а решает сверка места номера в рабочем процессе (match_duplicate):
+    у бланков одного вида хэши страниц близки, а номера разные."""
+    PAGE_DIST = 64     # из 256 бит; на синтетике пересканы — до 62, ближе бывают и чужие листы того же бланка
+    MAX_CANDS = 3
+
+    def __init__(self, cache: OcrCache, limit=20000):
+        self.cache = cache; self.limit = limit
+        with cache.lock:
+            rows = cache.db.execute("SELECT digest, hash FROM pages ORDER BY used DESC LIMIT ?", (limit,)).fetchall()
+        self.hashes = {d: int(h, 16) for d, h in rows}
+
+    @staticmethod
+    def near(hashes: List[int], h: int)->Optional[Tuple[int,int]]:
+        """(расстояние, поворот) самого близкого из hashes к h, если он в пределах PAGE_DIST."""
+        d, k = min((bin(hk ^ h).count("1"), k) for k, hk in enumerate(hashes))
+        return (d, k) if d <= DupIndex.PAGE_DIST else None
+
+    def find(self, hashes: List[int])->List[dict]:
+        """Кандидаты в оригиналы, ближние первыми; angle — уже для этого скана."""
+        close = sorted((dk, dg) for dg, h in self.hashes.items() for dk in [self.near(hashes, h)] if dk)
+        out = []
+        for (d, k), dg in close[:self.MAX_CANDS]:
+            with self.cache.lock:
+                row = self.cache.db.execute("SELECT data FROM pages WHERE digest=?", (dg,)).fetchone()
+            if not row: continue
+            c = json.loads(row[0])
+            c.update(angle=(k*90 + c["angle"]) % 360, digest=dg, dist=d); out.append(c)
+        return out
+
+    def touch(self, digest: str):
+        with self.cache.lock, self.cache.db:
+            self.cache.db.execute("UPDATE pages SET used=? WHERE digest=?", (time.time(), digest))
+
+    def add(self, digest: str, h: int, dbg: dict, path: Path):
+        """Страница с найденным номером становится оригиналом для будущих пересканов."""
+        if not dbg.get("serial") or not dbg.get("roi") or dbg.get("dup"): return
+        data = json.dumps({"serial": dbg["serial"], "angle": dbg["angle"], "bbox": dbg["bbox"],
+                           "size": dbg.get("size"), "roi": dbg["roi"], "name": str(path)}, ensure_ascii=False)
+        with self.cache.lock, self.cache.db:
+            self.cache.db.execute("INSERT OR REPLACE INTO pages VALUES(?,?,?,?)", (digest, f"{h:x}", data, time.time()))
+            if len(self.hashes) >= self.limit:
+                # старые листы пересканируют редко — вытесняем давно не встречавшиеся
+                old = [r[0] for r in self.cache.db.execute(
+                    "SELECT digest FROM pages ORDER BY used LIMIT ?", (self.limit//10,)).fetchall()]
+                self.cache.db.executemany("DELETE FROM pages WHERE digest=?", [(d,) for d in old])
+                for d in old: self.hashes.pop(d, None)
+        self.hashes[digest] = h
+
+def open_dups(cfg: dict, cache: Optional[OcrCache])->Optional[DupIndex]:
+    """Индекс пересканов живёт в базе кэша: без кэша (или без numpy для сверки) его нет."""
+    if cache is None or not np or not cfg.get("dedupe", True): return None
+    try: return DupIndex(cache, int(cfg.get("dedupe_max", 20000)))
+    except Exception: return None
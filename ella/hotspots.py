@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Модель мест номера на бланках (HotspotModel)."""
+import os, json, threading
+from pathlib import Path
+from typing import Optional, List
+
+from ella.config import app_dir
+
+MODEL_NAME = "hotspots.json"
+
+def layout_key(size)->float:
+    """Макет бланка грубо различаем по соотношению сторон страницы."""
+    w,h = size
+    return round(w/h, 1) if h else 0.0
+
+class HotspotModel:
+    """Где на бланке стоит номер: кластеры удачных bbox в долях страницы, повёрнутой «как читать»,
+    отдельно для каждого макета (layout_key той же страницы) — так место не зависит от того, какой
+    стороной скан положили в сканер. n — вес места: автоматические находки +1,
+    подтверждённые переименованием и исправленные вручную (F9) — больше. Хранится в JSON рядом
+    с config.json; рабочим процессам уходит snapshot() вместе с задачей."""
+    MERGE = 0.04     # центры ближе этой доли страницы — одно и то же место
+    MAX_N = 50.0     # потолок веса, чтобы модель успевала за новыми бланками
+    MAX_SPOTS = 64
+
+    def __init__(self, path: Optional[Path]=None):
+        self.path = path or app_dir()/MODEL_NAME
+        self.lock = threading.Lock(); self.spots = []; self.dirty = False
+        try: self.spots = json.loads(self.path.read_text(encoding="utf-8"))["spots"]
+        except Exception: pass
+
+    def learn(self, bbox, size, weight=1.0):
+        """bbox и size — как в dbg: координаты и размер страницы, повёрнутой на найденный угол."""
+        if not bbox or not size or not size[0] or not size[1]: return
+        W,H = size
+        box = [bbox[0]/W, bbox[1]/H, bbox[2]/W, bbox[3]/H]
+        lay = layout_key(size)
+        cx, cy = (box[0]+box[2])/2, (box[1]+box[3])/2
+        with self.lock:
+            self.dirty = True
+            for sp in self.spots:
+                b = sp["box"]
+                if (sp["layout"]==lay and abs((b[0]+b[2])/2-cx) < self.MERGE
+                        and abs((b[1]+b[3])/2-cy) < self.MERGE):
+                    k = weight/(sp["n"]+weight)
+                    sp["box"] = [round(v + (nv-v)*k, 5) for v,nv in zip(b, box)]
+                    sp["n"] = min(self.MAX_N, sp["n"]+weight)
+                    return
+            self.spots.append({"layout": lay, "box": [round(v, 5) for v in box], "n": weight})
+            if len(self.spots) > self.MAX_SPOTS:
+                self.spots.remove(min(self.spots, key=lambda sp: sp["n"]))
+
+    def snapshot(self)->List[dict]:
+        with self.lock: return [dict(sp) for sp in self.spots]
+
+    def save(self):
+        with self.lock:
+            if not self.dirty: return
+            data = json.dumps({"spots": self.spots}, ensure_ascii=False, indent=1); self.dirty = False
+        tmp = self.path.with_suffix(".tmp")
+        try: tmp.write_text(data, encoding="utf-8"); os.replace(tmp, self.path)
+        except Exception: pass
+
+def open_model(cfg: dict)->Optional[HotspotModel]:
+    if not cfg.get("hotspots", True): return None
+    return HotspotModel()
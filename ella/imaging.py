@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""Декодирование сканов (Page, RotView), предобработка вырезок и миниатюры для просмотра."""
+import math, queue, threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Tuple
+
+from ella.lazy import Image, ImageOps, ImageFilter, np
+from ella.stats import timed
+
+OCR_DPI = 300       # 8 цифр уверенно читаются с ~300 dpi; сканы плотнее уменьшаем при декодировании
+
+@timed("decode")
+def pil_open(path: Path, frame=0):
+    img, op = open_frame(path, frame)
+    return img.transpose(op) if op is not None else img
+
+def preprocess_pil(img):
+    img = img.convert("L")
+    try: img = ImageOps.autocontrast(img)
+    except Exception: pass
+    try: img = img.filter(ImageFilter.SHARPEN)
+    except Exception: pass
+    return img
+
+def preprocess_np(img, binarize=False):
+    """То же, что preprocess_pil (L → autocontrast → SHARPEN), одним проходом по массиву;
+    binarize — порог Оцу поверх."""
+    a = np.asarray(img.convert("L"), dtype=np.int32)
+    lo, hi = int(a.min()), int(a.max())
+    if hi > lo: a = (a - lo) * 255 // (hi - lo)
+    if a.shape[0] > 2 and a.shape[1] > 2:
+        # ядро SHARPEN: 32 в центре, -2 вокруг, /16; крайние пиксели PIL не трогает
+        c = a[1:-1, 1:-1]
+        s9 = (a[:-2, :-2] + a[:-2, 1:-1] + a[:-2, 2:] + a[1:-1, :-2] + c + a[1:-1, 2:]
+              + a[2:, :-2] + a[2:, 1:-1] + a[2:, 2:])
+        a = a.copy(); a[1:-1, 1:-1] = np.clip((34*c - 2*s9 + 8) // 16, 0, 255)
+    if binarize:
+        hist = np.bincount(a.ravel(), minlength=256).astype(np.float64)
+        w0 = np.cumsum(hist); m0 = np.cumsum(hist * np.arange(256))
+        w1 = w0[-1] - w0; mt = m0[-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            between = (mt * w0 / w0[-1] - m0) ** 2 / (w0 * w1)
+        a = np.where(a > int(np.nanargmax(between)), 255, 0)
+    return Image.fromarray(a.astype(np.uint8), "L")
+
+@timed("preprocess")
+def preprocess(img, binarize=False):
+    # по замерам (python -m bench.preprocess) цепочка PIL на ~30% быстрее NumPy,
+    # так что NumPy нужен только ради бинаризации
+    if binarize and np: return preprocess_np(img, True)
+    img = preprocess_pil(img)
+    return img.point(lambda v: 255 if v>127 else 0) if binarize else img
+
+# --- повороты: крутим только вырезки, а не всю страницу ---
+# коды Image.Transpose числами — модуль должен импортироваться и без PIL
+FLIP_LR, FLIP_TB, ROT90, ROT180, ROT270, TRANSPOSE, TRANSVERSE = range(7)
+ANGLE_OPS = {90: ROT90, 180: ROT180, 270: ROT270}
+INVERSE_OP = {ROT90: ROT270, ROT270: ROT90}
+
+def tp_point(op, x, y, w, h):
+    """Куда попадает точка (x, y) изображения w×h после transpose(op)."""
+    if op==ROT90: return y, w-x
+    if op==ROT180: return w-x, h-y
+    if op==ROT270: return h-y, x
+    if op==FLIP_LR: return w-x, y
+    if op==FLIP_TB: return x, h-y
+    if op==TRANSPOSE: return y, x
+    if op==TRANSVERSE: return h-y, w-x
+    return x, y
+
+def tp_size(op, size):
+    w,h = size
+    return (h,w) if op in (ROT90, ROT270, TRANSPOSE, TRANSVERSE) else (w,h)
+
+def tp_box(op, box, size):
+    x0,y0 = tp_point(op, box[0], box[1], *size)
+    x1,y1 = tp_point(op, box[2], box[3], *size)
+    return (min(x0,x1), min(y0,y1), max(x0,x1), max(y0,y1))
+
+class RotView:
+    """Страница, повёрнутая на angle (против часовой, как Image.rotate(expand=True)).
+    Координаты и size — как у повёрнутой страницы, но поворачивается только вырезка.
+    scale — масштаб вырезок относительно этих координат (см. Page)."""
+    def __init__(self, img, angle=0):
+        self.base = img; self.angle = angle; self.op = ANGLE_OPS.get(angle)
+        self.size = tp_size(self.op, img.size)
+        self.scale = getattr(img, "scale", 1.0)
+
+    @timed("crop")
+    def crop(self, box):
+        if self.op is None: return self.base.crop(box)
+        src = tp_box(INVERSE_OP.get(self.op, self.op), box, self.size)
+        return self.base.crop(src).transpose(self.op)
+
+def orientations(img, use_rot=True, order=(0, 90, 180, 270)):
+    return [(a, RotView(img, a)) for a in (order if use_rot else (0,))]
+
+# --- декодирование сканов для распознавания ---
+EXIF_OPS = {2: FLIP_LR, 3: ROT180, 4: FLIP_TB, 5: TRANSPOSE, 6: ROT270, 7: TRANSVERSE, 8: ROT90}
+
+def _raw_tiff(im)->bool:
+    return im.format=="TIFF" and bool(im.tile) and all(t[0]=="raw" for t in im.tile)
+
+def _unorient(im, size):
+    """Несжатый TIFF декодировать как записан, в буфер size: без тега Orientation load() не поворачивает."""
+    im._size = im._tile_size = size
+    im.tag_v2.pop(0x0112, None)
+    try: im.getexif().pop(0x0112, None)
+    except Exception: pass
+
+def open_frame(path: Path, frame=0):
+    """Image.open нужного кадра и EXIF-поворот, который к нему осталось применить (или None).
+    Сжатый TIFF Pillow поворачивает по тегу Orientation сам (size уже повёрнутый, load() крутит
+    растр) — ему поворот не нужен. Несжатый с тегом 5–8 Pillow декодирует в буфер повёрнутого
+    размера и портит: такой читаем как записан, а поворачиваем сами."""
+    im = Image.open(path)
+    if frame: im.seek(frame)
+    try: op = EXIF_OPS.get(im.getexif().get(0x0112))
+    except Exception: op = None
+    if im.format=="TIFF":
+        if op is not None and _raw_tiff(im):
+            _unorient(im, (max(t[1][2] for t in im.tile), max(t[1][3] for t in im.tile)))
+        else: op = None
+    return im, op
+
+def target_scale(im, dpi=OCR_DPI)->float:
+    """Во сколько раз можно уменьшить скан до dpi точек на дюйм. Без метаданных считаем,
+    что это A4 (длинная сторона 11.7"); 72/96 dpi «по умолчанию» уменьшению не поддаются."""
+    if not dpi: return 1.0
+    try: src = float((im.info.get("dpi") or (0,))[0])
+    except Exception: src = 0.0
+    if src < 50: src = max(im.size)/11.7
+    return min(1.0, dpi/src) if src>0 else 1.0
+
+def _tile(t, extents, offset):
+    if hasattr(t, "_replace"): return t._replace(extents=extents, offset=offset)
+    return (t[0], extents, offset, t[3])
+
+# reduce() не умеет bilevel (G4), палитру и 16 бит: такие сканы сначала переводим в L
+REDUCE_MODES = ("L","LA","RGB","RGBA","RGBX","CMYK","YCbCr","I","F","PA")
+
+def _reduce(img, k):
+    if k<=1: return img
+    return (img if img.mode in REDUCE_MODES else img.convert("L")).reduce(k)
+
+class Page:
+    """Скан для распознавания. size и координаты crop() — полноразмерные, с учётом EXIF-ориентации
+    (как у pil_open), а сами вырезки — в масштабе scale: JPEG декодируется в режиме draft,
+    прочие форматы уменьшаются reduce() до OCR_DPI. Несжатый TIFF не декодируется целиком:
+    каждая вырезка читает только нужные полосы/тайлы. EXIF-поворот применяется к вырезке."""
+    def __init__(self, path: Path, dpi=OCR_DPI, frame=0):
+        self.path = Path(path); self.frame = frame
+        im, self.op = open_frame(self.path, frame)
+        self.raw_size = im.size; self.mode = im.mode
+        self.size = tp_size(self.op, self.raw_size)
+        s = target_scale(im, dpi)
+        self.lazy = _raw_tiff(im)
+        self.factor = 1; self.img = None
+        if self.lazy:
+            self.factor = max(1, int(1/s))
+            self.rowbytes = {}
+            for t in im.tile:
+                if t[3][1]: self.rowbytes[t[3][0]] = t[3][1]
+            self.scale = 1.0/self.factor
+            return
+        if im.format=="JPEG" and s<1:
+            im.draft("L" if im.mode in ("L","RGB") else None,
+                     (math.ceil(self.raw_size[0]*s), math.ceil(self.raw_size[1]*s)))
+            im.load(); self.img = im
+        else:
+            im.load(); self.factor = max(1, int(1/s))
+            self.img = _reduce(im, self.factor)
+        self.scale = self.img.size[0]/self.raw_size[0]
+
+    def _raw_box(self, box):
+        return tp_box(INVERSE_OP.get(self.op, self.op), box, self.size) if self.op is not None else box
+
+    def _decode_region(self, box):
+        """Полноразмерный кусок несжатого TIFF: в список тайлов оставляем только пересекающие box,
+        полосы на всю ширину обрезаем по строкам."""
+        im = Image.open(self.path)
+        if self.frame: im.seek(self.frame)
+        W = self.raw_size[0]; L,T,R,B = box; tiles = []
+        for t in im.tile:
+            x0,y0,x1,y1 = t[1]
+            if x0>=R or x1<=L or y0>=B or y1<=T: continue
+            if x0==0 and x1==W and t[3][2]==1:
+                a, b = max(y0,T), min(y1,B)
+                t = _tile(t, (0,a,W,b), t[2] + (a-y0)*self._rowbytes(t[3][0], W))
+            tiles.append(t)
+        ux0 = min(t[1][0] for t in tiles); uy0 = min(t[1][1] for t in tiles)
+        ux1 = max(t[1][2] for t in tiles); uy1 = max(t[1][3] for t in tiles)
+        im.tile = [_tile(t, (t[1][0]-ux0, t[1][1]-uy0, t[1][2]-ux0, t[1][3]-uy0), t[2]) for t in tiles]
+        _unorient(im, (ux1-ux0, uy1-uy0))
+        im.load()
+        return im.crop((L-ux0, T-uy0, R-ux0, B-uy0))
+
+    def _rowbytes(self, rawmode, width):
+        if rawmode not in self.rowbytes:
+            self.rowbytes[rawmode] = len(Image.new(self.mode, (width, 1)).tobytes("raw", rawmode))
+        return self.rowbytes[rawmode]
+
+    def crop(self, box):
+        L,T,R,B = self._raw_box(box)
+        if self.lazy:
+            part = self._decode_region((L,T,R,B))
+            part = _reduce(part, self.factor)
+        else:
+            s = self.scale
+            part = self.img.crop((int(L*s), int(T*s), math.ceil(R*s), math.ceil(B*s)))
+        return part if self.op is None else part.transpose(self.op)
+
+    def thumbnail(self, max_side=1200):
+        """Уменьшенная копия всей страницы для оценки ориентации; TIFF собирается полосами."""
+        if not self.lazy:
+            img = _reduce(self.img, max(1, max(self.img.size)//max_side))
+        else:
+            W,H = self.raw_size; k = max(1, max(W,H)//max_side)
+            w,h = W - W%k, H - H%k
+            mode = self.mode if k==1 or self.mode in REDUCE_MODES else "L"
+            img = Image.new(mode, (w//k, h//k)); step = k*max(1, 256//k)
+            for y in range(0, h, step):
+                img.paste(_reduce(self._decode_region((0, y, w, min(y+step, h))), k), (0, y//k))
+        return img if self.op is None else img.transpose(self.op)
+
+@timed("decode")
+def open_page(path: Path, cfg: dict, frame=0)->Page:
+    return Page(path, cfg.get("ocr_dpi", OCR_DPI), frame)
+
+def frame_count(path: Path)->int:
+    """Страниц в файле: у многостраничного TIFF — по цепочке IFD, без декодирования растров."""
+    if not str(path).lower().endswith((".tif", ".tiff")) or not Image: return 1
+    try:
+        with Image.open(path) as im: return getattr(im, "n_frames", 1)
+    except Exception: return 1
+
+def load_rotated(path: Path, angle=0, frame=0):
+    """Открыть страницу и повернуть так же, как при распознавании (bbox — в этих координатах)."""
+    img = pil_open(path, frame)
+    return img.rotate(angle, expand=True) if angle else img
+
+def load_thumb(path: Path, angle, box, frame=0)->Tuple[object, Tuple[int,int]]:
+    """Миниатюра, вписанная в box, и полноразмерный (после EXIF и поворота) размер страницы.
+    JPEG декодируется сразу уменьшенным (draft) — полный растр не собирается."""
+    im, op = open_frame(path, frame)
+    W,H = tp_size(ANGLE_OPS.get(angle), tp_size(op, im.size))
+    scale = min(box[0]/W, box[1]/H, 1.0)
+    rw, rh = im.size
+    try: im.draft("RGB", (math.ceil(rw*scale), math.ceil(rh*scale)))
+    except Exception: pass
+    if op is not None: im = im.transpose(op)
+    if angle: im = im.transpose(ANGLE_OPS[angle])
+    return im.resize((max(1, int(W*scale)), max(1, int(H*scale)))), (W,H)
+
+class ImageCache:
+    """Картинки для панели просмотра: LRU миниатюр под размер холста и LRU из нескольких
+    страниц, декодированных для OCR (Page в масштабе OCR_DPI, нужны ручному выделению).
+    prefetch() в фоне декодирует показанную страницу и готовит миниатюры соседних строк,
+    чтобы ни листание стрелками, ни выделение номера не ждали декодирования."""
+    def __init__(self, thumbs=64, pages=2, dpi=OCR_DPI):
+        self.max_thumbs = thumbs; self.max_pages = pages; self.dpi = dpi
+        self.thumbs = OrderedDict(); self.pages = OrderedDict()
+        self.lock = threading.Lock(); self.page_lock = threading.Lock(); self.todo = queue.Queue()
+        threading.Thread(target=self._prefetch_loop, daemon=True).start()
+
+    @staticmethod
+    def _put(lru, key, val, limit):
+        lru[key] = val; lru.move_to_end(key)
+        while len(lru) > limit: lru.popitem(last=False)
+
+    def thumb(self, path: Path, angle, box, frame=0):
+        key = (str(path), angle, tuple(box), frame)
+        with self.lock:
+            if key in self.thumbs:
+                self.thumbs.move_to_end(key); return self.thumbs[key]
+        val = load_thumb(path, angle, box, frame)
+        with self.lock: self._put(self.thumbs, key, val, self.max_thumbs)
+        return val
+
+    def page(self, path: Path, frame=0)->Page:
+        key = (str(path), frame)
+        # одну страницу не декодируем дважды: выделение ждёт уже начатый prefetch
+        with self.page_lock:
+            with self.lock:
+                if key in self.pages:
+                    self.pages.move_to_end(key); return self.pages[key]
+            page = Page(path, self.dpi, frame)
+            with self.lock: self._put(self.pages, key, page, self.max_pages)
+        return page
+
+    def view(self, path: Path, angle, frame=0)->RotView:
+        """Страница в повороте показа: crop() поворачивает только вырезку."""
+        return RotView(self.page(path, frame), angle)
+
+    def prefetch(self, items, box, page=None):
+        """items — [(path, angle, frame)]; page — (path, frame) показанной страницы, она первая.
+        Прежние незаконченные заявки отбрасываются."""
+        try:
+            while True: self.todo.get_nowait()
+        except queue.Empty: pass
+        if page: self.todo.put((page[0], None, None, page[1]))
+        for path, angle, frame in items: self.todo.put((path, angle, tuple(box), frame))
+
+    def _prefetch_loop(self):
+        while True:
+            path, angle, box, frame = self.todo.get()
+            try:
+                if box is None: self.page(path, frame)
+                else: self.thumb(path, angle, box, frame)
+            except Exception: pass
+
+    def clear(self):
+        with self.lock: self.thumbs.clear(); self.pages.clear()
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""Тяжёлые и необязательные зависимости (PIL, numpy, pytesseract, tesserocr) импортируются
+при первом обращении, а не при загрузке модулей: имена, даты и журнал переименования работают
+без них, а GUI и рабочие процессы стартуют быстрее. bool(модуль) — удалось ли его импортировать."""
+import importlib, threading
+
+class LazyModule:
+    def __init__(self, name: str):
+        self._name = name; self._mod = None; self._tried = False; self._lock = threading.Lock()
+
+    def _load(self):
+        if not self._tried:
+            with self._lock:
+                if not self._tried:
+                    try: self._mod = importlib.import_module(self._name)
+                    except Exception: self._mod = None
+                    self._tried = True
+        return self._mod
+
+    def __bool__(self):
+        return self._load() is not None
+
+    def __getattr__(self, attr):
+        if attr.startswith("__"): raise AttributeError(attr)
+        mod = self._load()
+        if mod is None: raise ImportError(f"не установлен модуль {self._name}")
+        return getattr(mod, attr)
+
+    def __repr__(self):
+        return f"<lazy {self._name}{'' if self._tried else ', не загружен'}>"
+
+# PyInstaller не видит импорты по строке — эти имена перечислены в build.yml (--hidden-import)
+Image = LazyModule("PIL.Image")
+ImageOps = LazyModule("PIL.ImageOps")
+ImageFilter = LazyModule("PIL.ImageFilter")
+ImageTk = LazyModule("PIL.ImageTk")
+np = LazyModule("numpy")
+pytesseract = LazyModule("pytesseract")
+tesserocr = LazyModule("tesserocr")   # необязательно: OCR внутри процесса, без запуска tesseract на каждый вызов
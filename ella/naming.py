@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""Имена файлов: дата из имени папки, новые имена «ДД.ММ.ГГГГ номер[ суффикс]» и снимок папки.
+Модуль лёгкий — без PIL и OCR."""
+import os, re, bisect
+from pathlib import Path
+from typing import Optional, List
+
+SUPPORTED_EXTS = (".jpg",".jpeg",".png",".webp",".tif",".tiff",".bmp",".jfif")
+PATTERN = re.compile(r"(2711\d{4}|20\d{6})")
+
+def parse_date_from_folder(folder: Path)->Optional[str]:
+    name = folder.name
+    m = re.search(r"(\d{2})[.\-_/](\d{2})[.\-_/](\d{4})", name)
+    if m: return f"{m.group(1)}.{m.group(2)}.{m.group(3)}"
+    m = re.search(r"(\d{4})[.\-_/](\d{2})[.\-_/](\d{2})", name)
+    if m: return f"{m.group(3)}.{m.group(2)}.{m.group(1)}"
+    m = re.search(r"(\d{8})", name)
+    if m:
+        raw = m.group(1)
+        if raw.startswith("20"):
+            y,mm,d = raw[:4], raw[4:6], raw[6:]
+        else:
+            d,mm,y = raw[:2], raw[2:4], raw[4:]
+        return f"{d}.{mm}.{y}"
+    return None
+
+def list_files(folder: Path)->List[Path]:
+    return [folder/n for n in sorted(os.listdir(folder)) if n.lower().endswith(SUPPORTED_EXTS)]
+
+class FolderSnapshot:
+    """Имена в папке за один os.scandir; дальше список правится на месте (add/remove/rename)
+    по тому, что сделала сама программа, — без повторного чтения папки (на сетевом диске
+    listdir тысяч файлов заметно тормозит)."""
+    def __init__(self, folder: Path):
+        self.folder = Path(folder); self.names = set()
+        with os.scandir(self.folder) as it:
+            for e in it: self.names.add(e.name)
+
+    def files(self)->List[Path]:
+        """Как list_files()."""
+        return [self.folder/n for n in sorted(self.names) if n.lower().endswith(SUPPORTED_EXTS)]
+
+    def add(self, name): self.names.add(name)
+
+    def remove(self, name): self.names.discard(name)
+
+    def rename(self, old, new):
+        self.names.discard(old); self.names.add(new)
+
+class NameIndex:
+    """Новые имена «дата номер[ N].ext» для строк папки в порядке строк: k-й файл с номером
+    получает k-е свободное имя серии. Строки сгруппированы по номеру, так что set() одной
+    строки (распознавание, F9, ручной ввод) пересчитывает только затронутые серии, а не всю
+    папку, и в любом порядке поступления даёт один и тот же итог.
+    Занятыми считаются имена в папке, кроме старых имён строк с номером — их файлы уйдут.
+    part — часть многостраничного файла, который делится по номерам (split_parts): часть 0 —
+    сама строка, остальные встают в серии сразу за ней."""
+    def __init__(self, date: str, names):
+        self.date = date; self.taken = set(names)
+        self.rows = {}     # (i, часть) -> (старое имя, номер или None, ext)
+        self.groups = {}   # номер -> отсортированные (i, часть)
+        self.names = {}    # (i, часть) -> новое имя
+
+    def _series(self, name)->Optional[str]:
+        """Номер, если name — имя из серии этой даты (его освобождение сдвигает серию)."""
+        m = re.fullmatch(re.escape(self.date) + r" (\d{8})(?: \d+)?\.[^.]+", name)
+        return m.group(1) if m else None
+
+    def set(self, i, old: str, serial: Optional[str], ext: str, part=0)->List[int]:
+        """Задать номер строки i (или её части); возвращает строки, у которых поменялось новое имя."""
+        key = (i, part); touched = set()
+        prev = self.rows.get(key)
+        if prev and prev[1]:
+            self.groups[prev[1]].remove(key); touched.add(prev[1]); self.taken.add(prev[0])
+        self.rows[key] = (old, serial, ext)
+        if serial:
+            bisect.insort(self.groups.setdefault(serial, []), key); touched.add(serial); self.taken.discard(old)
+        if (prev and prev[1]) != serial:
+            s = self._series(old)
+            if s: touched.add(s)
+        if part and not serial: del self.rows[key]
+        changed = {i} if not serial and self.names.pop(key, None) else set()
+        for g in touched: changed.update(self._recompute(g))
+        return sorted(changed)
+
+    def set_parts(self, i, old: str, serials: List[str], ext: str)->List[int]:
+        """Номера частей строки i (serials[0] — сама строка); лишние старые части снимаются."""
+        changed = set()
+        for k in range(1, max(len(serials), self.nparts(i))):
+            changed.update(self.set(i, "", serials[k] if k < len(serials) else None, ext, k))
+        changed.update(self.set(i, old, serials[0] if serials else None, ext))
+        return sorted(changed)
+
+    def nparts(self, i)->int:
+        n = 1
+        while (i, n) in self.rows: n += 1
+        return n
+
+    def _recompute(self, serial)->List[int]:
+        """Имена серии по порядку строк. Строка, которая уже называется именем этой серии, его
+        сохраняет: иначе 0001.jpg выше «дата номер.jpg» забрал бы его имя, а тот — следующее."""
+        base = f"{self.date} {serial}"; n = 0; changed = []
+        def name(n, ext): return f"{base} {n}{ext}" if n else f"{base}{ext}"
+        keys = self.groups.get(serial, ()); kept = {}
+        for key in keys:
+            old, _, ext = self.rows[key]
+            if re.fullmatch(re.escape(base) + r"(?: [1-9]\d*)?" + re.escape(ext), old): kept[key] = old
+        used = set(kept.values())
+        for key in keys:
+            new = kept.get(key)
+            if new is None:
+                ext = self.rows[key][2]
+                while name(n, ext) in self.taken or name(n, ext) in used: n += 1
+                new = name(n, ext); n += 1
+            if self.names.get(key)!=new: self.names[key] = new; changed.append(key[0])
+        return changed
+
+    def name(self, i, part=0)->str:
+        return self.names.get((i, part), "")
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""Движки OCR (tesserocr, pytesseract, подставные) и вызовы OCR с замерами."""
+import os, threading, importlib
+from pathlib import Path
+from typing import Optional, List, Dict
+
+from ella.lazy import pytesseract, tesserocr
+from ella.stats import timed, mark
+
+def ensure_tess(cfg: dict):
+    global _backend_cfg, _backend, _backend_failed
+    # движок (и сам pytesseract/tesserocr) создаётся лениво при первом OCR — по этим настройкам
+    _backend_cfg = dict(cfg); _backend = None; _backend_failed = False
+
+# --- движки OCR ---
+DIGITS = "0123456789"
+CONF_OK = 80.0   # conf Tesseract (0–100), с которого номер из словесного прохода не перечитывается
+
+class OcrBackend:
+    """Движок OCR. words() — слова с рамками и уверенностью (conf), text() — распознанная строка.
+    whitelist — допустимые символы (None — любые). Все вызовы идут с --psm 6."""
+    def words(self, pil, lang="rus+eng", whitelist=None)->List[Dict]:
+        raise NotImplementedError
+    def text(self, pil, lang="eng", whitelist=None)->str:
+        raise NotImplementedError
+    def osd(self, pil)->Optional[int]:
+        """Угол (против часовой, как у Image.rotate), на который надо повернуть страницу; None — не умеет."""
+        return None
+
+class PytesseractBackend(OcrBackend):
+    """Через pytesseract: на каждый вызов — временный файл, новый процесс и загрузка traineddata."""
+    def __init__(self, cmd=None):
+        if os.name=="nt" and cmd and os.path.exists(cmd):
+            pytesseract.pytesseract.tesseract_cmd = cmd
+
+    def _config(self, whitelist):
+        return "--psm 6" + (f" -c tessedit_char_whitelist={whitelist}" if whitelist else "")
+
+    def words(self, pil, lang="rus+eng", whitelist=None):
+        d = pytesseract.image_to_data(pil, lang=lang, config=self._config(whitelist),
+                                      output_type=pytesseract.Output.DICT)
+        out=[]
+        for i in range(len(d["text"])):
+            txt=(d["text"][i] or "").strip()
+            if not txt: continue
+            out.append({"text": txt, "left": d["left"][i], "top": d["top"][i], "width": d["width"][i],
+                        "height": d["height"][i], "conf": float(d["conf"][i])})
+        return out
+
+    def text(self, pil, lang="eng", whitelist=None):
+        return pytesseract.image_to_string(pil, lang=lang, config=self._config(whitelist))
+
+    def osd(self, pil):
+        # «Rotate» у tesseract — по часовой стрелке
+        d = pytesseract.image_to_osd(pil, config="--psm 0", output_type=pytesseract.Output.DICT)
+        return (360 - int(d["rotate"])) % 360
+
+class TesserocrBackend(OcrBackend):
+    """Движок внутри процесса (tesserocr): по одному PyTessBaseAPI на (язык, whitelist) в каждом потоке.
+    traineddata грузится один раз за жизнь рабочего процесса, а не на каждый вызов."""
+    def __init__(self, tessdata: Optional[str]=None):
+        self.tessdata = tessdata
+        self.langs = set(tesserocr.get_languages(tessdata)[1] if tessdata else tesserocr.get_languages()[1])
+        if "eng" not in self.langs: raise RuntimeError("tesserocr: нет eng.traineddata")
+        self.local = threading.local()
+
+    def _api(self, lang, whitelist):
+        apis = self.local.__dict__.setdefault("apis", {})
+        api = apis.get((lang, whitelist))
+        if api is None:
+            kw = {"lang": lang, "psm": tesserocr.PSM.SINGLE_BLOCK}
+            if self.tessdata: kw["path"] = self.tessdata
+            api = tesserocr.PyTessBaseAPI(**kw)
+            if whitelist: api.SetVariable("tessedit_char_whitelist", whitelist)
+            apis[(lang, whitelist)] = api
+        return api
+
+    def words(self, pil, lang="rus+eng", whitelist=None):
+        api = self._api(lang, whitelist); api.SetImage(pil); api.Recognize()
+        ri = api.GetIterator(); level = tesserocr.RIL.WORD; out=[]
+        if ri is None: return out
+        for r in tesserocr.iterate_level(ri, level):
+            try: txt = (r.GetUTF8Text(level) or "").strip()
+            except RuntimeError: continue
+            if not txt: continue
+            x1,y1,x2,y2 = r.BoundingBox(level)
+            out.append({"text": txt, "left": x1, "top": y1, "width": x2-x1, "height": y2-y1,
+                        "conf": float(r.Confidence(level))})
+        return out
+
+    def text(self, pil, lang="eng", whitelist=None):
+        api = self._api(lang, whitelist); api.SetImage(pil)
+        return api.GetUTF8Text()
+
+    def osd(self, pil):
+        if "osd" not in self.langs: return None
+        api = self.local.__dict__.get("osd")
+        if api is None:
+            kw = {"lang": "osd", "psm": tesserocr.PSM.OSD_ONLY}
+            if self.tessdata: kw["path"] = self.tessdata
+            api = self.local.osd = tesserocr.PyTessBaseAPI(**kw)
+        api.SetImage(pil)
+        d = api.DetectOrientationScript()
+        return int(d["orient_deg"]) % 360 if d else None
+
+class FakeBackend(OcrBackend):
+    """Подставной движок для проверок без tesseract: reader(pil, lang, whitelist) -> слова.
+    Учитывает whitelist, считает вызовы; text() склеивает слова в строку."""
+    def __init__(self, reader=None):
+        self.reader = reader or (lambda pil, lang, whitelist: [])
+        self.calls = 0
+
+    def words(self, pil, lang="rus+eng", whitelist=None):
+        self.calls += 1; out=[]
+        for w in self.reader(pil, lang, whitelist):
+            txt = w["text"]
+            if whitelist: txt = "".join(c for c in txt if c in whitelist)
+            if txt: out.append(dict(w, text=txt, conf=float(w.get("conf", 95.0))))
+        return out
+
+    def text(self, pil, lang="eng", whitelist=None):
+        return " ".join(w["text"] for w in self.words(pil, lang, whitelist))
+
+def tessdata_dir(cfg: dict)->Optional[str]:
+    path = cfg.get("tesseract_path") or ""
+    d = Path(path).parent/"tessdata" if path else None
+    if d and d.is_dir(): return str(d)
+    return os.environ.get("TESSDATA_PREFIX") or None
+
+def make_backend(cfg: dict)->Optional[OcrBackend]:
+    """ocr_backend: auto | tesserocr | pytesseract | «модуль:фабрика» (например, подставной движок).
+    auto — tesserocr, если он ставится и запускается, иначе pytesseract. Явно заданный tesserocr
+    не подменяется: не установлен или не запустился (нет traineddata) — RuntimeError с причиной."""
+    name = (cfg.get("ocr_backend") or "auto").strip()
+    if ":" in name:
+        mod, attr = name.split(":", 1)
+        return getattr(importlib.import_module(mod), attr)()
+    if name in ("auto", "tesserocr") and tesserocr:
+        try: return TesserocrBackend(tessdata_dir(cfg))
+        except Exception as e:
+            if name=="tesserocr": raise RuntimeError(f"tesserocr не запустился: {e}") from e
+    if name=="tesserocr": raise RuntimeError("tesserocr не установлен")
+    if pytesseract: return PytesseractBackend(cfg.get("tesseract_path") or "")
+    return None
+
+def backend_error(cfg: dict)->Optional[str]:
+    """Почему по этим настройкам не будет OCR (для сообщения оператору), None — движок есть."""
+    try: b = make_backend(cfg)
+    except Exception as e: return str(e) or type(e).__name__
+    return None if b is not None else "нет ни tesserocr, ни pytesseract"
+
+_backend: Optional[OcrBackend] = None
+_backend_cfg: dict = {}
+_backend_failed = False
+
+def get_backend()->Optional[OcrBackend]:
+    """Движок процесса; не создался — None (вызовы OCR считаются сбоями, см. backend_error)."""
+    global _backend, _backend_failed
+    if _backend is None and not _backend_failed:
+        try: _backend = make_backend(_backend_cfg)
+        except Exception: _backend_failed = True
+    return _backend
+
+def set_backend(backend: Optional[OcrBackend]):
+    global _backend
+    _backend = backend
+
+# --- OCR helpers ---
+# движка нет или вызов упал — пустой ответ, но со сбоем в счётчиках: такой «не найден» не кэшируется
+@timed("ocr_words")
+def ocr_data_words(pil, lang="rus+eng")->List[Dict]:
+    b = get_backend()
+    if b is None: mark("ocr_error"); return []
+    try: return b.words(pil, lang)
+    except Exception: mark("ocr_error"); return []
+
+@timed("ocr_text")
+def ocr_text_digits(pil)->str:
+    b = get_backend()
+    if b is None: mark("ocr_error"); return ""
+    try: return b.text(pil, "eng", DIGITS)
+    except Exception: mark("ocr_error"); return ""
+
+@timed("ocr_digits")
+def ocr_data_digits(pil)->List[Dict]:
+    b = get_backend()
+    if b is None: mark("ocr_error"); return []
+    try: words = b.words(pil, "eng", DIGITS)
+    except Exception: mark("ocr_error"); return []
+    for w in words: w["text"] = w["text"].replace(" ","")
+    return words
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""Параллельное распознавание: пул процессов (RecognizePool), обход папок и слежение за сканером."""
+import os, sys, time, select, signal, ctypes
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+from typing import Optional, List, Tuple
+
+from ella.naming import SUPPORTED_EXTS, list_files
+from ella.ocr import ensure_tess
+from ella.imaging import frame_count
+from ella.recognize import extract_number_debug, combine_pages, empty_result
+from ella.cache import OcrCache, file_digest
+from ella.dups import DupIndex, open_dups, hash_file
+from ella.hotspots import HotspotModel
+
+# --- параллельное распознавание ---
+def default_jobs(cfg: dict)->int:
+    try: n = int(cfg.get("jobs") or 0)
+    except Exception: n = 0
+    return n if n>0 else (os.cpu_count() or 1)
+
+def _worker_init(cfg: dict):
+    # tesseract сам распараллеливается через OpenMP — в пуле процессов это только мешает
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    # Ctrl+C обрабатывает главный процесс, рабочие просто доделывают файл и выходят
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    ensure_tess(cfg)
+
+def recognize_file(path, cfg: dict, wide=False, hint=None, spots=None, frame=0, dups=None)->dict:
+    """Распознавание одного файла (страницы) в рабочем процессе; растр обратно не передаём."""
+    try: dbg = extract_number_debug(Path(path), cfg, wide, hint=hint, keep_img=False, spots=spots, frame=frame,
+                                    dups=dups)
+    except Exception: dbg = dict(empty_result(), error="сбой распознавания")
+    dbg["img"] = None
+    return dbg
+
+class RecognizePool:
+    """Пул процессов распознавания: submit() ставит файл в работу, poll() отдаёт готовые (key, path, dbg).
+    С кэшем попадания отдаются сразу, без OCR; force=True — распознать заново и перезаписать кэш.
+    Хэш содержимого файла, которого кэш ещё не видел, считает рабочий процесс (digesting), а не
+    поток, подающий задачи: холодная сетевая папка читается параллельно. Итоги со сбоем (dbg["error"]:
+    файл не открылся, движка OCR нет, вызов упал) не кэшируются — после починки настроек их распознают.
+    model — HotspotModel: задачи получают её прогноз, свежие находки её дообучают.
+    Страницы многостраничного TIFF — отдельные задачи (каждый процесс держит одну страницу);
+    файл готов, когда известны все страницы до первой с номером (multipage="first", остальные
+    снимаются) или все страницы (multipage="split"), итог собирает combine_pages.
+    С индексом пересканов (DupIndex, живёт в кэше) одностраничный файл сначала хэшируется
+    (hash_file — дёшево), и задача распознавания получает кандидатов в оригиналы. Если оригинал
+    сам ещё распознаётся (лист пересканировали сразу), скан ждёт его в parked."""
+    def __init__(self, cfg: dict, wide=False, jobs=None, cache: Optional[OcrCache]=None, force=False,
+                 model: Optional[HotspotModel]=None):
+        self.cfg = cfg; self.wide = wide; self.cache = cache; self.force = force; self.model = model
+        self.mode = cfg.get("multipage", "first")
+        self.jobs = jobs or default_jobs(cfg)
+        self.ex = ProcessPoolExecutor(max_workers=self.jobs, initializer=_worker_init, initargs=(cfg,))
+        self.pending = {}; self.ready = []
+        self.hint = None   # угол последнего найденного номера — сканы в пачке обычно лежат одинаково
+        self.dups = open_dups(cfg, cache)
+        self.digesting = {} # future хэша содержимого -> (key, путь, подпись файла)
+        self.hashing = {}   # future хэша -> (key, путь, ключ кэша)
+        self.flying = {}    # key -> хэши страницы, пока она распознаётся
+        self.parked = {}    # key оригинала -> [(key, путь, ключ кэша, хэши)] ждущих его пересканов
+
+    def submit(self, key, path: Path):
+        if self.cache is not None:
+            try: digest, sig = self.cache.known(path)
+            except Exception: digest = sig = None
+            if digest is not None: self._lookup(key, path, digest); return
+            if sig is not None:
+                self.digesting[self.ex.submit(file_digest, str(path))] = (key, path, sig); return
+        self._begin(key, path, None)
+
+    def _lookup(self, key, path, digest):
+        ckey = self.cache.result_key(digest, self.cfg, self.wide)
+        try: hit = None if self.force else self.cache.get(ckey)
+        except Exception: hit = None
+        # в кэше многостраничный файл мог остаться после режима "first" — частей там нет
+        if hit is not None and not (self.mode=="split" and "pages" in hit and "parts" not in hit):
+            self.ready.append((key, path, hit)); return
+        self._begin(key, path, ckey)
+
+    def _begin(self, key, path, ckey):
+        n = frame_count(path)
+        if self.dups is not None and ckey is not None and n==1:
+            self.hashing[self.ex.submit(hash_file, str(path))] = (key, path, ckey); return
+        self._start(key, path, ckey, n)
+
+    def _start(self, key, path, ckey, n=1, hashes=None, cands=None):
+        spots = self.model.snapshot() if self.model is not None else None
+        doc = {"n": n, "res": {}, "futs": {}} if n > 1 else None
+        dups = (cands or []) if hashes else None
+        if hashes: self.flying[key] = hashes
+        for k in range(n):
+            fut = self.ex.submit(recognize_file, str(path), self.cfg, self.wide, self.hint, spots, k, dups)
+            self.pending[fut] = (key, path, ckey, doc, k)
+            if doc is not None: doc["futs"][k] = fut
+
+    def _hashed(self, key, path, ckey, hashes):
+        if not hashes: self._start(key, path, ckey); return
+        cands = [] if self.force else self.dups.find(hashes)
+        if not cands and not self.force:
+            for okey, oh in self.flying.items():
+                if DupIndex.near(hashes, oh[0]):
+                    self.parked.setdefault(okey, []).append((key, path, ckey, hashes)); return
+        self._start(key, path, ckey, 1, hashes, cands)
+
+    def _indexed(self, key, path, ckey, dbg):
+        """Итог страницы — в индекс пересканов; ждавшие её сканы идут в работу, даже если индекс
+        подвёл: иначе они остались бы в parked навсегда, а iter_groups ждал бы их итогов."""
+        try:
+            hashes = self.flying.pop(key, None); digest = dbg.pop("dup_digest", None)
+            if digest: self.dups.touch(digest)
+            elif hashes: self.dups.add(ckey[0], hashes[0], dbg, path)
+        finally:
+            dbg.pop("roi", None)
+            for item in self.parked.pop(key, []):
+                try: self._hashed(*item)
+                except Exception: self._start(*item[:3])   # без кандидатов в оригиналы — обычное распознавание
+
+    def keys(self):
+        return ([v[0] for v in self.pending.values()] + [v[0] for v in self.hashing.values()]
+                + [v[0] for v in self.digesting.values()]
+                + [v[0] for p in self.parked.values() for v in p] + [k for k,_,_ in self.ready])
+
+    def _page_done(self, doc, k, dbg)->Optional[dict]:
+        """Итог файла, если он уже определился; None — ждём ещё страниц."""
+        res = doc["res"]; res[k] = dbg
+        upto = None
+        if self.mode!="split":
+            for j in range(doc["n"]):
+                if j not in res: break
+                if res[j]["serial"]: upto = j+1; break
+        if upto is None and len(res) < doc["n"]: return None
+        upto = upto or doc["n"]
+        for j, f in doc["futs"].items():   # страницы после найденной не нужны
+            if j >= upto and j not in res: f.cancel(); self.pending.pop(f, None)
+        return combine_pages([res[j] for j in range(upto)], self.mode)
+
+    def poll(self, timeout=None)->List[Tuple]:
+        out, self.ready = self.ready, []
+        if not self.pending and not self.hashing and not self.digesting: return out
+        # хэши разбираются в порядке подачи: оригиналом считается скан, поданный раньше
+        done, _ = wait(list(self.pending) + list(self.digesting)[:1] + list(self.hashing)[:1],
+                       timeout=0 if out else timeout, return_when=FIRST_COMPLETED)
+        while self.digesting and next(iter(self.digesting)).done():
+            f = next(iter(self.digesting)); key, path, sig = self.digesting.pop(f)
+            try: digest = f.result(); self.cache.remember(path, sig, digest)
+            except Exception: self._begin(key, path, None); continue
+            self._lookup(key, path, digest)
+        out, self.ready = out + self.ready, []
+        while self.hashing and next(iter(self.hashing)).done():
+            f = next(iter(self.hashing)); key, path, ckey = self.hashing.pop(f)
+            try: hashes = f.result()
+            except Exception: hashes = None
+            self._hashed(key, path, ckey, hashes)
+        for f in done:
+            if f not in self.pending: continue   # страница снята: файл уже собран
+            key, path, ckey, doc, k = self.pending.pop(f)
+            try: dbg = f.result(); ok = True
+            except Exception: dbg = dict(empty_result(), error="сбой распознавания"); ok = False
+            if doc is not None:
+                dbg = self._page_done(doc, k, dbg); ok = True
+                if dbg is None: continue
+            if key in self.flying or key in self.parked:
+                try: self._indexed(key, path, ckey, dbg)
+                except Exception: pass
+            if ok:
+                if dbg["serial"]:
+                    self.hint = dbg["angle"]
+                    if self.model is not None and not dbg.get("dup"): self.model.learn(dbg["bbox"], dbg.get("size"))
+                if ckey is not None and not dbg.get("error"):
+                    try: self.cache.put(ckey, dbg)
+                    except Exception: pass
+            out.append((key, path, dbg))
+        return out
+
+    def close(self, cancel=False):
+        self.ex.shutdown(wait=not cancel, cancel_futures=cancel)
+        if self.model is not None: self.model.save()
+
+def iter_recognize(paths, cfg: dict, wide=False, jobs=None, cancel=None, cache=None, force=False, model=None):
+    """Выдаёт (индекс, путь, dbg) по мере готовности, в порядке завершения.
+    Новые файлы подаются не дальше окна от самого старого незавершённого, поэтому
+    память (и буфер упорядочивания у вызывающего) не растёт с размером папки."""
+    it = iter_groups([paths], cfg, wide, jobs, cancel, cache, force, model)
+    try:
+        for _g, i, path, dbg in it: yield i, path, dbg
+    finally:
+        it.close()
+
+def iter_groups(groups, cfg: dict, wide=False, jobs=None, cancel=None, cache=None, force=False, model=None):
+    """Как iter_recognize, но для нескольких списков файлов (папок) в одном пуле: выдаёт
+    (группа, индекс, путь, dbg). Файлы подаются по кругу — по одному от каждой группы, так что
+    большая папка не задерживает остальные и прогресс идёт у всех сразу. В работе не больше
+    окна файлов, и внутри группы — не дальше окна от её самого старого незавершённого."""
+    pool = RecognizePool(cfg, wide, jobs, cache, force, model); window = pool.jobs*4
+    its = [enumerate(paths) for paths in groups]; heads = {}
+    for g, it in enumerate(its):
+        nxt = next(it, None)
+        if nxt is not None: heads[g] = nxt
+    turn = deque(heads); finished = False
+    try:
+        while True:
+            busy = pool.keys(); lo = {}
+            for g, i in busy: lo[g] = min(lo.get(g, i), i)
+            room = window - len(busy); stalled = 0
+            while turn and room > 0 and stalled < len(turn):
+                g = turn.popleft(); i, path = heads[g]
+                if i >= lo.setdefault(g, i) + window:
+                    turn.append(g); stalled += 1; continue
+                pool.submit((g, i), path); room -= 1; stalled = 0
+                nxt = next(its[g], None)
+                if nxt is None: del heads[g]
+                else: heads[g] = nxt; turn.append(g)
+            if not pool.keys(): finished = True; break
+            for (g, i), path, dbg in pool.poll(0.2):
+                yield g, i, path, dbg
+            if cancel is not None and cancel.is_set(): break
+    finally:
+        pool.close(cancel=not finished)
+
+# --- слежение за папками сканера ---
+class _Inotify:
+    """Будильник на inotify (Linux): события не разбираем, только просыпаемся и пересматриваем папки."""
+    MASK = 0x8 | 0x80 | 0x100 | 0x2   # CLOSE_WRITE | MOVED_TO | CREATE | MODIFY
+
+    def __init__(self, folders):
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0: raise OSError(ctypes.get_errno(), "inotify_init1")
+        for f in folders:
+            if libc.inotify_add_watch(self.fd, os.fsencode(str(f)), self.MASK) < 0:
+                os.close(self.fd); raise OSError(ctypes.get_errno(), f"inotify_add_watch {f}")
+
+    def wait(self, timeout):
+        if select.select([self.fd], [], [], timeout)[0]:
+            try:
+                while os.read(self.fd, 65536): pass
+            except BlockingIOError: pass
+
+    def close(self):
+        os.close(self.fd)
+
+class FolderWatcher:
+    """Новые сканы в папках. Файл отдаётся, когда его размер и mtime не менялись settle секунд
+    и он открывается на чтение — сканер его дописал. На Linux просыпается по inotify,
+    в остальных случаях опрашивает папки раз в interval секунд."""
+    def __init__(self, folders, settle=2.0, interval=1.0, skip_existing=False):
+        self.folders = [Path(f) for f in folders]
+        self.settle = settle; self.interval = interval
+        self.done = set(); self.growing = {}
+        if skip_existing:
+            for f in self.folders: self.done.update(list_files(f))
+        self.notify = None
+        if sys.platform.startswith("linux"):
+            try: self.notify = _Inotify(self.folders)
+            except Exception: self.notify = None
+
+    def poll(self, timeout=None)->List[Path]:
+        timeout = self.interval if timeout is None else timeout
+        if timeout > 0:
+            if self.notify: self.notify.wait(timeout)
+            else: time.sleep(timeout)
+        now = time.monotonic(); ready = []; present = set()
+        for folder in self.folders:
+            try: entries = list(os.scandir(folder))
+            except OSError: continue
+            for e in entries:
+                p = folder/e.name
+                if not e.name.lower().endswith(SUPPORTED_EXTS) or p in self.done: continue
+                try: st = e.stat()
+                except OSError: continue
+                present.add(p); sig = (st.st_size, st.st_mtime_ns)
+                prev = self.growing.get(p)
+                if prev is None or prev[0]!=sig:
+                    self.growing[p] = (sig, now); continue
+                if st.st_size and now - prev[1] >= self.settle and _readable(p):
+                    ready.append(p); self.done.add(p); del self.growing[p]
+        for p in list(self.growing):
+            if p not in present: del self.growing[p]
+        return sorted(ready)
+
+    def close(self):
+        if self.notify: self.notify.close()
+
+def _readable(path: Path)->bool:
+    try:
+        with open(path, "rb"): return True
+    except OSError:
+        return False
+
+def watch_folders(folders, cfg: dict, on_result, wide=False, jobs=None, cache=None, stop=None,
+                  settle=2.0, interval=1.0, skip_existing=False, model=None):
+    """Распознаёт сканы по мере появления, пока не выставлен stop (threading.Event).
+    on_result(path, dbg) вызывается в этом же потоке. Результаты попадают в кэш распознавания,
+    так что к концу дня предпросмотр папки собирается из кэша без OCR."""
+    watcher = FolderWatcher(folders, settle, interval, skip_existing)
+    pool = RecognizePool(cfg, wide, jobs, cache, model=model)
+    try:
+        while stop is None or not stop.is_set():
+            for p in watcher.poll(0.3 if pool.keys() else interval):
+                pool.submit(p, p)
+            for _key, p, dbg in pool.poll(0):
+                on_result(p, dbg)
+    finally:
+        pool.close(cancel=True); watcher.close()
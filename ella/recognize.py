@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+"""Поиск номера на скане: зоны, повороты, якоря «№», места из HotspotModel; extract_number_debug."""
+import os, re, math, time, threading, functools
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+from typing import Optional, List, Tuple, Dict
+
+from ella.lazy import Image, ImageOps
+from ella.naming import PATTERN
+from ella.stats import OCR_STAGES, stage, timed, add_stages, _tls
+from ella.ocr import CONF_OK, get_backend, ocr_data_words, ocr_data_digits, ocr_text_digits
+from ella.imaging import (ANGLE_OPS, RotView, tp_size, orientations, pil_open, open_page, frame_count,
+                          preprocess, load_rotated)
+from ella.hotspots import layout_key
+from ella.dups import match_duplicate, roi_print
+
+class RegionCache:
+    """Предобработанные зоны одной страницы по (угол, зона): якорный проход и фолбэк берут
+    одну и ту же вырезку, а ROI у якорей вырезаются из уже обработанной зоны.
+    Потокобезопасен: параллельные задачи (run_jobs) ждут уже начатую обработку, а не повторяют её."""
+    def __init__(self, binarize=False):
+        self.binarize = binarize; self.items = {}
+        self.lock = threading.Lock(); self.busy = {}
+
+    def _memo(self, key, make):
+        if key in self.items: return self.items[key]
+        with self.lock: kl = self.busy.setdefault(key, threading.Lock())
+        with kl:
+            if key not in self.items: self.items[key] = make()
+        return self.items[key]
+
+    def get(self, view, bbox):
+        return self._memo((view.angle, tuple(bbox)), lambda: preprocess(view.crop(bbox), self.binarize))
+
+    def words(self, view, bbox)->List[Dict]:
+        """Словесный проход по зоне — один на зону: его же читают якоря и фолбэк."""
+        return self._memo(("words", view.angle, tuple(bbox)), lambda: ocr_data_words(self.get(view, bbox)))
+
+# --- зоны поиска (стандарт/широкие) ---
+def search_regions(img, wide=False):
+    w,h = img if isinstance(img, tuple) else img.size
+    if not wide:
+        return [
+            ((int(w*0.55), 0, int(w*0.995), int(h*0.40)), "правый верх"),
+            ((0, 0, int(w*0.22), h), "левая вертикаль"),
+        ]
+    else:
+        return [
+            ((int(w*0.50), 0, int(w*0.995), int(h*0.55)), "правый верх (шир.)"),
+            ((0, 0, int(w*0.28), h), "левая вертикаль (шир.)"),
+        ]
+
+def text_axis(img)->Optional[int]:
+    """Направление строк по проекциям уменьшенной копии: 0 — строки горизонтальны, 90 — вертикальны.
+    Поперёк строк профиль чернил чередуется (строка/просвет), вдоль — усредняется по многим строкам."""
+    try:
+        small = img.reduce(max(1, max(img.size)//400)).convert("L")
+        ink = ImageOps.autocontrast(small).point(lambda v: 255 if v<128 else 0)
+    except Exception:
+        return None
+    w,h = ink.size
+    def spread(p):
+        m = sum(p)/len(p) if p else 0
+        if m<=0: return 0.0
+        return sum((v-m)**2 for v in p)/len(p)/(m*m)
+    rows = spread(ink.resize((1,h), Image.BOX).tobytes())
+    cols = spread(ink.resize((w,1), Image.BOX).tobytes())
+    if rows > cols*1.15: return 0
+    if cols > rows*1.15: return 90
+    return None
+
+@timed("orient")
+def rank_orientations(page, cfg: dict, hint=None)->Tuple[List[int], str]:
+    """Порядок перебора углов до дорогих проходов: OSD (use_osd), затем направление строк,
+    затем угол, на котором нашёлся номер у соседних файлов. Перебираются всё равно все углы —
+    ошибка оценки стоит только времени."""
+    how=[]; osd=None
+    try: thumb = page.thumbnail(1200)
+    except Exception: return [0, 90, 180, 270], ""
+    if cfg.get("use_osd"):
+        b = get_backend()
+        try:
+            with stage("osd"): osd = b.osd(thumb) if b else None
+        except Exception: osd = None
+        if osd is not None: how.append(f"OSD {osd}°")
+    axis = text_axis(thumb)
+    if axis is not None: how.append("строки " + ("горизонтальны" if axis==0 else "вертикальны"))
+    if hint is not None: how.append(f"соседи {hint}°")
+    def key(a):
+        return (a!=osd, axis is not None and a%180!=axis, a!=hint, a)
+    return sorted((0, 90, 180, 270), key=key), ", ".join(how)
+
+# --- Поиск рядом с якорями «отправка №», «№» ---
+def serial_in(text)->Optional[str]:
+    """Номер из одного слова OCR: допускаем прилипшие «№», двоеточие, точку — не больше двух знаков."""
+    digits = re.sub(r"\D", "", text)
+    m = PATTERN.fullmatch(digits)
+    return m.group(1) if m and len(text)-len(digits) <= 2 else None
+
+def word_serials(words)->List[Tuple[float, str, Tuple[int,int,int,int]]]:
+    """Все номера из готового словесного прохода: (conf, номер, рамка), уверенные первыми."""
+    out = []
+    for w in words:
+        serial = serial_in(w["text"])
+        if serial:
+            out.append((w.get("conf", 0.0), serial, (w["left"], w["top"], w["left"]+w["width"], w["top"]+w["height"])))
+    return sorted(out, key=lambda c: -c[0])
+
+def find_near_anchor(region_img, prepared=False, words=None)->Tuple[Optional[str], Optional[Tuple[int,int,int,int]], str]:
+    """prepared=True — зона уже прошла preprocess (см. RegionCache), ROI режутся прямо из неё;
+    words — уже сделанный словесный проход по этой зоне.
+    Номер рядом с якорем берётся прямо из словесного прохода, если Tesseract в нём уверен
+    (conf ≥ CONF_OK); отдельный OCR цифр — только для якорей, где уверенного номера нет.
+    Из всех находок побеждает самая уверенная, а не первая."""
+    if not prepared: region_img = preprocess(region_img)
+    if words is None: words = ocr_data_words(region_img)
+    W,H = region_img.size
+    norm = [(w["text"].lower().replace("ё","е"), w) for w in words]
+    candidates = []
+    for i,(t,w) in enumerate(norm):
+        has_no = ("№" in w["text"]) or (t=="no") or (t=="n°") or (t=="№")
+        has_otpr = ("отправк" in t)
+        if has_no and i>0 and "отправк" in norm[i-1][0]:
+            anchor = w
+            l = anchor["left"] + anchor["width"]
+            t0 = max(0, anchor["top"] - int(anchor["height"]*0.5))
+            r = min(W, l + int(W*0.40))
+            b = min(H, anchor["top"] + int(anchor["height"]*1.8))
+            candidates.append((l,t0,r,b,"по якорю: отправка №"))
+        elif has_no:
+            anchor = w
+            l = anchor["left"] + anchor["width"]
+            t0 = max(0, anchor["top"] - int(anchor["height"]*0.5))
+            r = min(W, l + int(W*0.40))
+            b = min(H, anchor["top"] + int(anchor["height"]*1.8))
+            candidates.append((l,t0,r,b,"по якорю: №"))
+        elif has_otpr:
+            anchor = w
+            l = anchor["left"] + anchor["width"]
+            t0 = max(0, anchor["top"] - int(anchor["height"]*0.5))
+            r = min(W, l + int(W*0.45))
+            b = min(H, anchor["top"] + int(anchor["height"]*1.8))
+            candidates.append((l,t0,r,b,"по якорю: отправка"))
+    # 1) без нового OCR: слова, чей центр попал в окно справа от якоря
+    found = []; weak = []; unsure = []
+    ws = word_serials(words)
+    for (l,t0,r,b,source) in candidates:
+        near = [(c, serial, box) for c, serial, box in ws
+                if l <= (box[0]+box[2])/2 <= r and t0 <= (box[1]+box[3])/2 <= b]
+        if near and near[0][0] >= CONF_OK: found.append(near[0] + (source,))
+        else:
+            unsure.append((l,t0,r,b,source))
+            if near: weak.append(near[0] + (source,))
+    if found:
+        c, serial, box, source = max(found, key=lambda f: f[0])
+        return serial, box, source
+    # 2) повторный OCR цифр только по неуверенным окнам; ранжируем по conf
+    for (l,t0,r,b,source) in unsure:
+        roi = region_img.crop((l,t0,r,b))
+        for item in ocr_data_digits(roi):
+            m = PATTERN.fullmatch(item["text"])
+            if m:
+                L = l + item["left"]; T = t0 + item["top"]
+                found.append((item.get("conf", 0.0), m.group(1), (L,T,L+item["width"],T+item["height"]), source))
+                if found[-1][0] >= CONF_OK: break
+    if found or weak:
+        c, serial, box, source = max(found or weak, key=lambda f: f[0])
+        return serial, box, source
+    for (l,t0,r,b,source) in unsure:
+        text = ocr_text_digits(region_img.crop((l,t0,r,b))).replace(" ", "")
+        m = PATTERN.search(text)
+        if m:
+            return m.group(1), (l,t0,r,b), source
+    return None, None, ""
+
+def read_selection(view, box, stale=None)->Tuple[Optional[str], Optional[Tuple[int,int,int,int]]]:
+    """Номер в области, выделенной оператором; box и найденная рамка — в координатах view.
+    Вырезка берётся в масштабе страницы (Page уже уменьшена до OCR_DPI — крупнее Tesseract не нужно)
+    и обрабатывается один раз: сначала проход цифр с рамками, строкой — только если он пуст.
+    stale() — выделение уже заменено новым: следующий проход не начинаем."""
+    L, T = box[0], box[1]; s = getattr(view, "scale", 1.0) or 1.0
+    img = preprocess(view.crop(box))
+    for w in ocr_data_digits(img):
+        m = PATTERN.fullmatch(w["text"])
+        if m:
+            x, y = L + w["left"]/s, T + w["top"]/s
+            return m.group(1), (round(x), round(y), round(x + w["width"]/s), round(y + w["height"]/s))
+    if stale is not None and stale(): return None, None
+    m = PATTERN.search(ocr_text_digits(img).replace(" ", ""))
+    return (m.group(1), tuple(box)) if m else (None, None)
+
+def predict_rois(spots, size, angles, k=3, min_n=2)->List[Tuple[int, Tuple[int,int,int,int], float]]:
+    """До k самых частых мест номера для страницы размера size (до поворота): (угол, bbox с запасом
+    в координатах повёрнутой страницы, вес). spots — HotspotModel.snapshot(). Углы берутся в порядке
+    angles (см. rank_orientations), при каждом — места бланков того же макета, частые первыми.
+    Места, встреченные однажды (вес меньше min_n), не пробуются: на разнобойных сканах это лишний OCR."""
+    out = []
+    for angle in angles if spots else ():
+        W,H = tp_size(ANGLE_OPS.get(angle), size); lay = layout_key((W,H))
+        for sp in sorted(spots, key=lambda sp: -sp["n"]):
+            if sp["n"]<min_n or sp["layout"]!=lay: continue
+            x0,y0,x1,y1 = sp["box"]; dx = (x1-x0)*0.3 + 0.02; dy = (y1-y0) + 0.01
+            box = (max(0, int((x0-dx)*W)), max(0, int((y0-dy)*H)),
+                   min(W, math.ceil((x1+dx)*W)), min(H, math.ceil((y1+dy)*H)))
+            out.append((angle, box, sp["n"]))
+            if len(out)>=k: return out
+    return out
+
+def extract_number_debug(path: Path, cfg: dict, wide=False, hint=None, keep_img=True, spots=None, par=1, frame=0,
+                         dups=None):
+    """hint — угол, сработавший на соседних файлах; keep_img=False — не открывать страницу
+    для показа (в рабочих процессах она не нужна). bbox и зоны — в полноразмерных координатах.
+    spots — места номера из HotspotModel: сначала цифры ищутся только там, каскад зон — если мимо.
+    par — сколько задач (угол, зона, стратегия) считать одновременно (см. run_jobs); в пакете
+    файлы и так идут параллельно по процессам, par>1 — для одного файла по запросу оператора.
+    frame — страница многостраничного TIFF (см. extract_pages).
+    dups — кандидаты в оригиналы (DupIndex.find): совпал с одним — его номер, без OCR; при
+    dups не None у найденного номера есть dbg["roi"] — отпечаток для индекса пересканов.
+    dbg["stats"] — замеры по этапам (см. STAGES) и какая стратегия сработала; dbg["error"] — страницу
+    не открыть или OCR сбоил (движка нет, вызов упал): такой итог не кэшируется."""
+    prev = getattr(_tls, "stages", None); _tls.stages = {}; t0 = time.perf_counter()
+    try: dbg = _extract_number(path, cfg, wide, hint, keep_img, spots, par, frame, dups)
+    finally: stages, _tls.stages = _tls.stages, prev
+    src = dbg.get("source") or ""
+    dbg["stats"] = {"stages": stages, "total": time.perf_counter()-t0,
+                    "ocr_calls": sum(stages.get(k, (0,))[0] for k in OCR_STAGES),
+                    "hit": src.split(", ", 1)[-1] if src else None,
+                    "angle": dbg["angle"] if dbg["serial"] else None}
+    if stages.get("ocr_error") and not dbg.get("error"): dbg["error"] = "сбой OCR"
+    dbg["frame"] = frame
+    return dbg
+
+def split_parts(serials: List[Optional[str]])->List[list]:
+    """Страницы документа по номерам: [[номер, [страницы]], ...]. Страница без номера — продолжение
+    предыдущей части (оборот, приложение); начальные страницы без номера — к первой части."""
+    parts = []; lead = []
+    for k, serial in enumerate(serials):
+        if serial and (not parts or parts[-1][0]!=serial): parts.append([serial, lead + [k]]); lead = []
+        elif parts: parts[-1][1].append(k)
+        else: lead.append(k)
+    return parts
+
+def combine_pages(pages: List[dict], mode="first")->dict:
+    """Итог многостраничного файла по итогам его страниц (по порядку): номер, угол и рамка —
+    первой страницы с номером (её же показывает просмотр, см. dbg["frame"]); pages — краткие итоги
+    страниц; parts — части документа по номерам (mode="split", см. split_parts)."""
+    dbg = dict(next((d for d in pages if d["serial"]), pages[0]))
+    err = next((d["error"] for d in pages if d.get("error")), None)
+    if err: dbg["error"] = err
+    dbg["pages"] = [{"serial": d["serial"], "angle": d["angle"], "source": d["source"]} for d in pages]
+    if mode=="split": dbg["parts"] = split_parts([d["serial"] for d in pages])
+    st = {"stages": {}, "total": 0.0, "ocr_calls": 0}
+    for d in pages:
+        ps = d.get("stats") or {}
+        st["total"] += ps.get("total", 0.0); st["ocr_calls"] += ps.get("ocr_calls", 0)
+        add_stages(st["stages"], ps.get("stages", {}))
+    dbg["stats"] = dict(dbg.get("stats") or {}, **st)
+    return dbg
+
+def extract_pages(path: Path, cfg: dict, wide=False, hint=None, spots=None, par=1, mode=None)->dict:
+    """Файл целиком: одностраничный — как extract_number_debug, многостраничный TIFF — страница
+    за страницей (в памяти одна), до первого номера (mode="first") или все (mode="split").
+    Пакетное распознавание раздаёт страницы по процессам параллельно (RecognizePool)."""
+    n = frame_count(path); mode = mode or cfg.get("multipage", "first")
+    if n <= 1: return extract_number_debug(path, cfg, wide, hint, keep_img=False, spots=spots, par=par)
+    pages = []
+    for k in range(n):
+        pages.append(extract_number_debug(path, cfg, wide, hint, keep_img=False, spots=spots, par=par, frame=k))
+        if pages[-1]["serial"]:
+            hint = pages[-1]["angle"]
+            if mode=="first": break
+    return combine_pages(pages, mode)
+
+def recognition_jobs(base, wide, order, use_rot, spots, pre)->List:
+    """Задачи распознавания одной страницы в порядке приоритета (как шёл последовательный проход):
+    прогноз модели, затем на каждом угле — якоря по зонам и фолбэк. Задача — функция без
+    аргументов: (угол, номер, bbox, источник, доп. зона) или None."""
+    s = base.scale; jobs = []
+    def scale_box(bbox_reg, box):
+        return (bbox_reg[0] + round(box[0]/s), bbox_reg[1] + round(box[1]/s),
+                bbox_reg[0] + round(box[2]/s), bbox_reg[1] + round(box[3]/s))
+    # 0) Прогноз по прошлым файлам: только цифры и только в тесной зоне
+    def model_job(angle, roi):
+        img = RotView(base, angle)
+        for item in ocr_data_digits(pre.get(img, roi)):
+            m = PATTERN.fullmatch(item["text"])
+            if m:
+                box = (item["left"], item["top"], item["left"]+item["width"], item["top"]+item["height"])
+                return angle, m.group(1), scale_box(roi, box), "прогноз, по модели", (roi, "прогноз")
+    # 1) По якорям
+    def anchor_job(angle, bbox_reg, lbl):
+        img = RotView(base, angle)
+        serial, box, why = find_near_anchor(pre.get(img, bbox_reg), prepared=True,
+                                            words=pre.words(img, bbox_reg))
+        if serial: return angle, serial, scale_box(bbox_reg, box) if box else bbox_reg, f"{lbl}, {why}", None
+    # 2) Фолбэк: номер без якоря — сначала из уже сделанного словесного прохода,
+    #    отдельный OCR цифр — если уверенного там нет; побеждает самая высокая conf
+    def fallback_job(angle, regs):
+        img = RotView(base, angle)
+        loose = [(c, serial, scale_box(bbox_reg, box), lbl) for bbox_reg, lbl in regs
+                 for c, serial, box in word_serials(pre.words(img, bbox_reg))]
+        sure = [f for f in loose if f[0] >= CONF_OK]
+        if not sure:
+            for bbox_reg, lbl in regs:
+                for item in ocr_data_digits(pre.get(img, bbox_reg)):
+                    m = PATTERN.fullmatch(item["text"])
+                    if m:
+                        box = (item["left"], item["top"], item["left"]+item["width"], item["top"]+item["height"])
+                        sure.append((item.get("conf", 0.0), m.group(1), scale_box(bbox_reg, box), lbl))
+        if sure or loose:
+            c, serial, gb, lbl = max(sure or loose, key=lambda f: f[0])
+            return angle, serial, gb, f"{lbl}, без якоря", None
+    for angle, roi, n in predict_rois(spots, base.size, order):
+        jobs.append(functools.partial(model_job, angle, roi))
+    for angle, img in orientations(base, use_rot, order):
+        regs = search_regions(img, wide)
+        jobs += [functools.partial(anchor_job, angle, bbox_reg, lbl) for bbox_reg, lbl in regs]
+        jobs.append(functools.partial(fallback_job, angle, regs))
+    return jobs
+
+JOB_THREADS = min(16, os.cpu_count() or 1)   # потолок потоков run_jobs на процесс
+_job_pool: Optional[ThreadPoolExecutor] = None
+_job_pool_lock = threading.Lock()
+
+def _job_executor()->ThreadPoolExecutor:
+    """Потоки run_jobs живут весь процесс: движок tesserocr держит PyTessBaseAPI в каждом потоке,
+    и новый пул на каждый файл заново грузил бы traineddata."""
+    global _job_pool
+    with _job_pool_lock:
+        if _job_pool is None: _job_pool = ThreadPoolExecutor(JOB_THREADS, thread_name_prefix="ocr-job")
+        return _job_pool
+
+def _call_job(job):
+    """Задача со своими счётчиками этапов: в счётчики файла их сливает run_jobs, и только
+    у дождавшихся задач — снятая после ответа задача общий словарь не трогает."""
+    _tls.stages = {}
+    try: return job(), _tls.stages
+    finally: _tls.stages = None
+
+def run_jobs(jobs, par=1):
+    """Первый по приоритету непустой результат. par>1 — задачи идут спекулятивно в потоках
+    (OCR отпускает GIL: tesseract — отдельный процесс или C-библиотека): ответ принимается,
+    когда все задачи выше по приоритету закончились ничем, а всё, что ниже найденного, снимается.
+    Одновременно не больше par задач (и JOB_THREADS), так что на лёгком файле лишней работы почти нет."""
+    par = min(par, JOB_THREADS)
+    if par <= 1:
+        for job in jobs:
+            r = job()
+            if r: return r
+        return None
+    stages = getattr(_tls, "stages", None)
+    ex = _job_executor(); futs = {}; results = {}
+    nxt = 0; sub = 0; limit = len(jobs)
+    try:
+        while nxt < limit:
+            while sub < limit and len(futs) < par:
+                futs[ex.submit(_call_job, jobs[sub])] = sub; sub += 1
+            done, _ = wait(list(futs), return_when=FIRST_COMPLETED)
+            for f in done:
+                k = futs.pop(f)
+                try: results[k], st = f.result()
+                except Exception: results[k] = None; st = {}
+                if stages is not None: add_stages(stages, st)
+                if results[k]: limit = min(limit, k+1)   # ниже найденного можно не считать
+            while nxt < limit and nxt in results:
+                if results[nxt]: return results[nxt]
+                nxt += 1
+        return None
+    finally:
+        for f in futs: f.cancel()
+
+def _extract_number(path: Path, cfg: dict, wide, hint, keep_img, spots, par=1, frame=0, dups=None):
+    if not Image: return dict(empty_result(), error="нет Pillow")
+    try: base = open_page(path, cfg, frame)
+    except Exception: return dict(empty_result(), error="файл не открылся")
+    d = match_duplicate(base, dups) if dups else None
+    if d:
+        view = RotView(base, d["angle"])
+        return dict(empty_result(), regions=search_regions(view, wide) + [(d["bbox"], "повторный скан")],
+                    img=load_rotated(path, d["angle"], frame) if keep_img else None, **d)
+
+    use_rot = cfg.get("use_rotations", True)
+    order, how = rank_orientations(base, cfg, hint) if use_rot else ([0], "")
+    best = {"serial": None, "angle":0, "bbox": None, "source": None, "img": None,
+            "regions": search_regions(base, wide), "angles": order, "orient": how}
+    pre = RegionCache(cfg.get("binarize", False))
+    r = run_jobs(recognition_jobs(base, wide, order, use_rot, spots, pre), par)
+    if r:
+        angle, serial, gb, source, extra = r
+        view = RotView(base, angle); regs = search_regions(view, wide) + ([extra] if extra else [])
+        best = dict(best, serial=serial, angle=angle, bbox=gb, source=source, regions=regs,
+                    size=view.size, img=load_rotated(path, angle, frame) if keep_img else None)
+        if dups is not None: best["roi"] = roi_print(view, gb)
+        return best
+    if keep_img:
+        try: best["img"] = pil_open(path, frame)
+        except Exception: pass
+    return best
+
+def empty_result()->dict:
+    return {"serial": None, "angle":0, "bbox": None, "source": None, "img": None, "regions": []}
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""Пакетное переименование с журналом (RenameBatch) и разрезание многостраничных TIFF."""
+import os, json, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, List, Tuple, Dict
+
+from ella.lazy import Image
+
+JOURNAL_NAME = ".ella-rename.json"   # журнал пакетного переименования — в самой папке
+SPLIT_KEEP_DIR = "исходные"           # куда уходят многостраничные файлы после разрезания
+
+# --- пакетное переименование с журналом ---
+def _ident(st)->List[int]:
+    """Чем файл узнаётся после переименования: размер, mtime и (если ФС его даёт) номер inode."""
+    return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+def _same(path: Path, ident)->bool:
+    try: cur = _ident(os.stat(path))
+    except OSError: return False
+    # на сетевых дисках inode бывает 0 или меняется — тогда сверяем размер и mtime
+    return cur==ident or (cur[:2]==ident[:2] and (not cur[2] or not ident[2]))
+
+class RenameBatch:
+    """Пакет переименований одной папки. Журнал (JOURNAL_NAME) пишется до первого rename;
+    что уже сделано, в журнал не пишется — это видно по самим файлам: каждый ход помнит
+    «отпечаток» файла (_ident) и ищется под старым, временным или новым именем. Поэтому после
+    сбоя пакет можно и доделать (run), и откатить (undo), а после успеха — отменить (undo).
+    Обмены и циклы имён (a→b, b→a) проходят через временные имена: сначала на временные уходят
+    только файлы, чьё имя кому-то нужно, затем все ходы выполняются параллельно — на сетевой
+    папке каждый rename стоит сетевого запроса.
+    Разрезания многостраничных файлов (splits) — в том же журнале и после всех ходов: часть
+    может занять имя, которое освобождает переименование. Записанные части помнят свои
+    отпечатки, так что undo удаляет только их и возвращает исходник из SPLIT_KEEP_DIR."""
+    def __init__(self, folder: Path, moves: List[dict], bid: Optional[str]=None, done=False,
+                 splits: Optional[List[dict]]=None):
+        self.folder = Path(folder); self.moves = moves; self.done = done; self.splits = splits or []
+        self.id = bid or time.strftime("%Y%m%d%H%M%S") + f"-{os.getpid()}"
+
+    @classmethod
+    def plan(cls, folder: Path, pairs: List[Tuple[str,str]], names=None,
+             splits: List[Tuple[str, List[Tuple[str, List[int]]]]]=())->Tuple["RenameBatch", Dict[str,str]]:
+        """pairs — (старое имя, новое имя); splits — (имя файла, [(имя части, страницы)]);
+        names — имена в папке (FolderSnapshot), если уже известны.
+        Возвращает пакет и отказы {старое имя: статус}:
+        «exists» — новое имя занято файлом не из пакета, «missing» — исходника нет."""
+        folder = Path(folder); moves = []; cuts = []; skipped = {}
+        srcs = {a for a,b in pairs if a!=b}; taken = set()
+        names = set(os.listdir(folder)) if names is None else names
+        for a,b in pairs:
+            if a==b: continue
+            if a not in names: skipped[a] = "missing"; continue
+            if (b in names and b not in srcs) or b in taken: skipped[a] = "exists"; continue
+            taken.add(b)
+            try: ident = _ident(os.stat(folder/a))
+            except OSError: skipped[a] = "missing"; continue
+            moves.append({"src": a, "dst": b, "ident": ident})
+        for a, parts in splits:
+            if a not in names: skipped[a] = "missing"; continue
+            if any((b in names and b not in srcs) or b in taken for b,_ in parts): skipped[a] = "exists"; continue
+            taken.update(b for b,_ in parts)
+            try: ident = _ident(os.stat(folder/a))
+            except OSError: skipped[a] = "missing"; continue
+            cuts.append({"src": a, "ident": ident, "parts": [[b, list(pg)] for b,pg in parts]})
+        batch = cls(folder, moves, splits=cuts)
+        for i,m in enumerate(moves): m["tmp"] = f".ella-tmp-{batch.id}-{i}"
+        return batch, skipped
+
+    @classmethod
+    def load(cls, folder: Path)->Optional["RenameBatch"]:
+        try: d = json.loads((Path(folder)/JOURNAL_NAME).read_text(encoding="utf-8"))
+        except Exception: return None
+        return cls(folder, d["moves"], d["id"], d.get("done", False), d.get("splits"))
+
+    def save(self):
+        data = json.dumps({"id": self.id, "done": self.done, "moves": self.moves, "splits": self.splits},
+                          ensure_ascii=False, indent=1)
+        tmp = self.folder/(JOURNAL_NAME + ".tmp")
+        tmp.write_text(data, encoding="utf-8"); os.replace(tmp, self.folder/JOURNAL_NAME)
+
+    def discard(self):
+        try: os.remove(self.folder/JOURNAL_NAME)
+        except OSError: pass
+
+    def locate(self, m)->Optional[str]:
+        """Под каким именем сейчас файл хода m («src»/«tmp»/«dst»); None — не найден."""
+        for k in ("tmp", "src", "dst"):
+            if _same(self.folder/m[k], m["ident"]): return k
+        return None
+
+    def _drive(self, want: str, jobs=8, progress=None)->Dict[str,str]:
+        """Довести каждый файл до имени want («dst» — переименовать, «src» — вернуть)."""
+        where = [self.locate(m) for m in self.moves]
+        status = {}
+        for m,w in zip(self.moves, where):
+            if w is None: status[m["src"]] = "missing"
+        def move(i, to):
+            m = self.moves[i]; src = self.folder/m[where[i]]; dst = self.folder/m[to]
+            try:
+                # rename() на POSIX молча затирает цель — занятое чужим файлом имя не трогаем
+                if to!="tmp" and dst.exists(): return i, "exists"
+                os.rename(src, dst); where[i] = to; return i, "renamed"
+            except FileExistsError: return i, "exists"
+            except OSError: return i, "error"
+        # 1) на временные имена — файлы, стоящие на чужом целевом имени
+        targets = {m[want] for m,w in zip(self.moves, where) if w is not None and w!=want}
+        first = [i for i,(m,w) in enumerate(zip(self.moves, where)) if w not in (None, want, "tmp") and m[w] in targets]
+        second = [i for i,w in enumerate(where) if w not in (None, want)]
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as ex:
+            for i, st in ex.map(lambda i: move(i, "tmp"), first):
+                if st!="renamed": status[self.moves[i]["src"]] = st
+            second = [i for i in second if self.moves[i]["src"] not in status]
+            for n, (i, st) in enumerate(ex.map(lambda i: move(i, want), second), 1):
+                status[self.moves[i]["src"]] = st
+                if progress: progress(n, len(second))
+        for m,w in zip(self.moves, where):
+            status.setdefault(m["src"], "renamed" if w==want else "error")
+        return status
+
+    def _split(self, s)->str:
+        """Разрезать файл s (или доделать разрез после сбоя): "split", "exists", "missing" или "error"."""
+        src = self.folder/s["src"]; keep = self.folder/SPLIT_KEEP_DIR/s["src"]
+        made = s.get("made")
+        if made and all(_same(self.folder/b, made[b]) for b,_ in s["parts"]):
+            if _same(keep, s["ident"]) or not _same(src, s["ident"]): return "split"
+        elif _same(src, s["ident"]):
+            try: written = split_tiff(src, [(b, pg) for b,pg in s["parts"]])
+            except FileExistsError: return "exists"
+            except Exception: return "error"
+            s["made"] = {b: _ident(os.stat(self.folder/b)) for b in written}; self.save()
+        else: return "missing"
+        try:
+            keep.parent.mkdir(exist_ok=True)
+            if not keep.exists(): os.rename(src, keep)   # занято — исходник остаётся на месте
+        except OSError: pass
+        return "split"
+
+    def _unsplit(self, s)->str:
+        """Отменить разрез: удалить записанные части, вернуть исходник из SPLIT_KEEP_DIR."""
+        src = self.folder/s["src"]; keep = self.folder/SPLIT_KEEP_DIR/s["src"]
+        try:
+            if not src.exists() and _same(keep, s["ident"]): os.rename(keep, src)
+            if not _same(src, s["ident"]): return "missing"
+            for b, ident in (s.get("made") or {}).items():
+                if _same(self.folder/b, ident): os.remove(self.folder/b)   # чужой файл под тем же именем не трогаем
+        except OSError: return "error"
+        s.pop("made", None); return "renamed"
+
+    def run(self, jobs=8, progress=None)->Dict[str,str]:
+        """Выполнить (или доделать после сбоя). {старое имя: renamed/exists/missing/error,
+        у разрезаемых — split вместо renamed}. Пустой пакет (все имена уже такие) журнал не
+        пишет — иначе затёр бы журнал прошлого пакета, и отменить тот было бы нельзя."""
+        if not self.moves and not self.splits: return {}
+        self.save()
+        status = self._drive("dst", jobs, progress) if self.moves else {}
+        for s in self.splits: status[s["src"]] = self._split(s)
+        self.done = True; self.save()
+        return status
+
+    @classmethod
+    def resume(cls, folder: Path, jobs=8)->Optional[Dict[str,str]]:
+        """Доделать незавершённый пакет папки (сбой прошлого запуска); None — доделывать нечего."""
+        batch = cls.load(folder)
+        if batch is None or batch.done: return None
+        return batch.run(jobs)
+
+    def undo(self, jobs=8, progress=None)->Dict[str,str]:
+        """Вернуть старые имена: отмена последнего пакета или откат недоделанного.
+        Разрезы отменяются первыми — их части могут стоять на именах, освобождённых ходами."""
+        status = {s["src"]: self._unsplit(s) for s in self.splits}
+        if self.splits: self.save()
+        if self.moves: status.update(self._drive("src", jobs, progress))
+        if all(v=="renamed" for v in status.values()): self.discard()
+        return status
+
+def split_tiff(path: Path, parts: List[Tuple[str, List[int]]])->List[str]:
+    """Разрезать многостраничный TIFF на файлы [(новое имя, страницы)] рядом с ним. Страницы
+    читаются и пишутся по одной (AppendingTiffWriter) — память не зависит от их числа. Часть
+    пишется под временным именем и появляется целиком; занятые имена не перезаписываются.
+    Разрез — всё или ничего: если часть не записалась, уже записанные удаляются."""
+    from PIL import TiffImagePlugin
+    folder = Path(path).parent; written = []
+    try:
+        with Image.open(path) as src:
+            for name, pages in parts:
+                dst = folder/name; tmp = folder/(".ella-part-" + name)
+                if dst.exists(): raise FileExistsError(str(dst))
+                try:
+                    with TiffImagePlugin.AppendingTiffWriter(str(tmp), new=True) as tf:
+                        for k in pages:
+                            src.seek(k); kw = {}
+                            comp = src.info.get("compression")
+                            if comp and comp!="raw" and (src.mode=="1" or not comp.startswith("group")): kw["compression"] = comp
+                            if src.info.get("dpi"): kw["dpi"] = src.info["dpi"]
+                            src.save(tf, format="TIFF", **kw); tf.newFrame()
+                    if dst.exists(): raise FileExistsError(str(dst))
+                    os.rename(tmp, dst); written.append(name)
+                finally:
+                    if tmp.exists(): os.remove(tmp)
+    except BaseException:
+        for name in written:
+            try: os.remove(folder/name)
+            except OSError: pass
+        raise
+    return written
+
+def rename_jobs(cfg: dict)->int:
+    # I/O, а не CPU: на сетевой папке параллельные запросы прячут задержку сети
+    return int(cfg.get("rename_jobs") or 16)
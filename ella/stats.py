@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Замеры распознавания: этапы (stage, timed) и сводка по пачке (StatsReport)."""
+import csv, json, time, threading, functools
+from contextlib import contextmanager
+from pathlib import Path
+
+# --- замеры: сколько времени и вызовов OCR ушло на каждый этап ---
+STAGES = (("decode", "декодирование"), ("orient", "выбор поворота"), ("osd", "OSD"), ("crop", "вырезка"),
+          ("preprocess", "предобработка"), ("ocr_words", "OCR слов"), ("ocr_digits", "OCR цифр"),
+          ("ocr_text", "OCR строки"), ("dup", "сверка с оригиналом"), ("ocr_error", "сбои OCR"))
+OCR_STAGES = ("osd", "ocr_words", "ocr_digits", "ocr_text")
+_tls = threading.local()   # счётчики текущего файла; вне extract_number_debug замеры не ведутся
+
+@contextmanager
+def stage(name):
+    st = getattr(_tls, "stages", None)
+    if st is None: yield; return
+    t = time.perf_counter()
+    try: yield
+    finally:
+        c = st.setdefault(name, [0, 0.0]); c[0] += 1; c[1] += time.perf_counter()-t
+
+def add_stages(dst: dict, src: dict):
+    """Счётчики src (этап -> [вызовов, секунд]) — к dst."""
+    for k,(n,sec) in src.items():
+        c = dst.setdefault(k, [0, 0.0]); c[0] += n; c[1] += sec
+
+def mark(name):
+    """Событие без замера времени (сбой OCR) — в счётчики текущего файла."""
+    st = getattr(_tls, "stages", None)
+    if st is not None: st.setdefault(name, [0, 0.0])[0] += 1
+
+def timed(name):
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*a, **kw):
+            with stage(name): return fn(*a, **kw)
+        return wrapper
+    return deco
+
+class StatsReport:
+    """Замеры по пачке: строка на файл (add) и итоги (totals) — для строки состояния и выгрузки
+    в JSON/CSV. Файлы из кэша считаются отдельно: OCR для них не запускался и замеров нет;
+    повторные сканы (dup) считаются распознанными, но OCR у них тоже нет."""
+    def __init__(self):
+        self.rows = []; self.t0 = self.t1 = time.monotonic()
+
+    def add(self, name, dbg: dict):
+        st = dbg.get("stats") or {}
+        self.rows.append({"file": name, "serial": dbg.get("serial"), "cached": bool(dbg.get("cached")),
+                          "dup": dbg.get("dup"), "angle": st.get("angle"), "hit": st.get("hit"), "total": st.get("total", 0.0),
+                          "ocr_calls": st.get("ocr_calls", 0), "stages": st.get("stages", {})})
+        self.t1 = time.monotonic()
+
+    def totals(self)->dict:
+        stages = {}; hits = {}; angles = {}
+        for r in self.rows:
+            add_stages(stages, r["stages"])
+            if r["cached"]: continue
+            hit = r["hit"] or "не найден"; hits[hit] = hits.get(hit, 0) + 1
+            if r["angle"] is not None: angles[r["angle"]] = angles.get(r["angle"], 0) + 1
+        done = [r for r in self.rows if not r["cached"]]
+        calls = sum(r["ocr_calls"] for r in done)
+        return {"files": len(self.rows), "cached": len(self.rows)-len(done),
+                "dups": sum(1 for r in self.rows if r["dup"]),
+                "found": sum(1 for r in self.rows if r["serial"]), "wall": self.t1-self.t0,
+                "cpu": sum(r["total"] for r in done), "ocr_calls": calls,
+                "ocr_per_file": calls/len(done) if done else 0.0,
+                "stages": stages, "hits": hits, "angles": angles}
+
+    def summary(self)->str:
+        t = self.totals(); st = t["stages"]
+        ocr = sum(st.get(k, (0, 0.0))[1] for k in OCR_STAGES)
+        return (f"OCR: {t['ocr_calls']} вызовов ({t['ocr_per_file']:.1f} на файл), "
+                f"декодирование {st.get('decode', (0, 0.0))[1]:.1f} с, OCR {ocr:.1f} с, "
+                f"из кэша {t['cached']}, повторных сканов {t['dups']}, всего {t['wall']:.1f} с")
+
+    def to_json(self, path):
+        Path(path).write_text(json.dumps({"totals": self.totals(), "files": self.rows},
+                                         ensure_ascii=False, indent=2), encoding="utf-8")
+
+    def to_csv(self, path):
+        cols = ["file", "serial", "cached", "dup", "angle", "hit", "total", "ocr_calls"]
+        # utf-8-sig — чтобы Excel открыл кириллицу без мастера импорта
+        with open(path, "w", newline="", encoding="utf-8-sig") as f:
+            w = csv.writer(f, delimiter=";")
+            w.writerow(cols + [f"{k}_{x}" for k,_ in STAGES for x in ("calls", "s")])
+            for r in self.rows:
+                st = r["stages"]
+                w.writerow([r[c] or "" if c=="dup" else r[c] for c in cols[:6]] + [f"{r['total']:.4f}", r["ocr_calls"]]
+                           + [v for k,_ in STAGES for v in (st.get(k, (0,))[0], f"{st.get(k, (0, 0.0))[1]:.4f}")])
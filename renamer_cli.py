@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""Пакетный режим без GUI: распознаёт одну или несколько папок и пишет по строке JSONL на файл.
+
+    python renamer_cli.py D:\\Сканы\\01.02.2024 D:\\Сканы\\02.02.2024 --jobs 8 > result.jsonl
+    python renamer_cli.py D:\\Сканы\\01.02.2024 --apply
+    python renamer_cli.py D:\\Сканы\\01.02.2024 --undo
+    python renamer_cli.py D:\\Сканы\\01.02.2024 --watch >> watch.jsonl
+    python renamer_cli.py D:\\Сканы\\01.02.2024 --report stats.csv
+    python renamer_cli.py D:\\Сканы --tree --apply          # все датированные папки внутри
+"""
+import argparse, json, re, sys, threading, multiprocessing
+from pathlib import Path
+
+from ella.config import load_config
+from ella.naming import parse_date_from_folder, FolderSnapshot, NameIndex
+from ella.stats import StatsReport
+from ella.ocr import ensure_tess, backend_error
+from ella.cache import open_cache
+from ella.hotspots import open_model
+from ella.pool import iter_recognize, watch_folders
+from ella.rename import RenameBatch, rename_jobs
+from ella.batch import FolderJob, TreeRun
+
+def emit(out, rec: dict):
+    out.write(json.dumps(rec, ensure_ascii=False) + "\n"); out.flush()
+
+def finish_pending(folder: Path, cfg: dict)->bool:
+    """Незавершённый пакет переименования (сбой прошлого запуска) доделываем до новой работы."""
+    status = RenameBatch.resume(folder, rename_jobs(cfg))
+    if status is None: return True
+    bad = sum(1 for v in status.values() if v!="renamed")
+    print(f"{folder}: доделано прерванное переименование ({len(status)} файлов, ошибок {bad})", file=sys.stderr)
+    return bad==0
+
+def run_folder(folder: Path, args, cfg: dict, cache, out, report=None, model=None)->dict:
+    """Записи выходят по мере готовности, но в порядке файлов папки: суффиксы имён
+    (« 1», « 2») должны совпасть с предпросмотром в GUI. Буфер упорядочивания ограничен
+    окном iter_recognize, так что память не зависит от числа файлов."""
+    date = args.date or parse_date_from_folder(folder)
+    if not date:
+        emit(out, {"folder": str(folder), "error": "не удалось определить дату по имени папки"})
+        return {"error": 1}
+    if args.apply and not finish_pending(folder, cfg):
+        emit(out, {"folder": str(folder), "error": "прерванное переименование не доделано, см. --undo"})
+        return {"error": 1}
+    # с --apply записи ждут конца папки: переименование идёт одним пакетом (RenameBatch)
+    job = FolderJob(folder, date, args.apply, report)
+    for i, _p, dbg in iter_recognize(job.files, cfg, args.wide, jobs=args.jobs, cache=cache, force=args.force,
+                                      model=model):
+        for rec in job.add(i, dbg): emit(out, rec)
+    for rec in job.finish(rename_jobs(cfg)): emit(out, rec)
+    return job.counts
+
+def run_tree(root: Path, args, cfg: dict, cache, out, report=None, model=None)->bool:
+    """Все датированные папки дерева root одним пулом (TreeRun); по каждой готовой папке —
+    строка итогов в stderr. Прерванный прогон (Ctrl+C, сбой) следующий запуск продолжит."""
+    run = TreeRun(root, cfg, args.wide, args.apply, args.jobs, cache, args.force, model, report, args.restart)
+    total = len(run.folders); ndone = 0; failed = False
+    print(f"{root}: папок с датой — {total}", file=sys.stderr)
+    def on_records(job, recs):
+        for rec in recs: emit(out, rec)
+    def on_folder(rel, job, counts):
+        nonlocal ndone, failed
+        ndone += 1; failed |= counts.get("error", 0) > 0
+        note = " (готово в прошлый раз)" if job is None and "ok" in counts else ""
+        print(f"[{ndone}/{total}] {rel}: " + ", ".join(f"{k}={v}" for k,v in counts.items()) + note, file=sys.stderr)
+    try:
+        if not run.run(on_records, on_folder):
+            failed = True
+    except KeyboardInterrupt:
+        print(f"{root}: прервано, продолжить — тем же запуском (--restart — начать заново)", file=sys.stderr)
+        return False
+    return not failed
+
+def run_undo(folder: Path, cfg: dict, out)->bool:
+    batch = RenameBatch.load(folder)
+    if batch is None:
+        emit(out, {"folder": str(folder), "error": "нечего отменять"}); return False
+    status = batch.undo(rename_jobs(cfg))
+    for m in batch.moves:
+        emit(out, {"folder": str(folder), "file": m["dst"], "new": m["src"],
+                   "status": "restored" if status.get(m["src"])=="renamed" else status.get(m["src"], "error")})
+    for sp in batch.splits:
+        emit(out, {"folder": str(folder), "file": [b for b,_ in sp["parts"]], "new": sp["src"],
+                   "status": "restored" if status.get(sp["src"])=="renamed" else status.get(sp["src"], "error")})
+    return all(v=="renamed" for v in status.values())
+
+def run_watch(folders, args, cfg: dict, cache, out, model=None):
+    """Режим слежения: запись на каждый дописанный сканером файл; имя — предварительное,
+    в порядке поступления (окончательные суффиксы даст предпросмотр, он возьмёт всё из кэша)."""
+    state = {}
+    for f in folders:
+        date = args.date or parse_date_from_folder(f)
+        state[f] = NameIndex(date, FolderSnapshot(f).names) if date else None
+    def on_result(p: Path, d: dict):
+        names = state[p.parent]
+        serial = d["serial"]
+        rec = {"folder": str(p.parent), "file": p.name, "serial": serial, "new": None,
+               "status": "ok" if serial else "not_found", "angle": d.get("angle", 0),
+               "source": d.get("source"), "bbox": d.get("bbox"), "cached": bool(d.get("cached")),
+               "stats": d.get("stats")}
+        if d.get("error"):
+            rec["error"] = d["error"]
+            if not serial: rec["status"] = "error"
+        if d.get("dup"): rec["dup"] = d["dup"]
+        if serial and names is not None:
+            i = len(names.rows); names.set(i, p.name, serial, p.suffix.lower()); rec["new"] = names.name(i)
+        emit(out, rec)
+    stop = threading.Event()
+    try:
+        watch_folders(folders, cfg, on_result, args.wide, args.jobs, cache, stop,
+                      settle=args.settle, skip_existing=args.skip_existing, model=model)
+    except KeyboardInterrupt:
+        stop.set()
+
+def main(argv=None)->int:
+    ap = argparse.ArgumentParser(description="Ella Renamer — пакетное распознавание без GUI (JSONL в stdout).")
+    ap.add_argument("folders", nargs="+", type=Path, help="папки со сканами")
+    ap.add_argument("--date", help="дата ДД.ММ.ГГГГ (по умолчанию — из имени каждой папки)")
+    ap.add_argument("--jobs", "-j", type=int, default=None, help="число рабочих процессов (по умолчанию — все ядра)")
+    ap.add_argument("--apply", action="store_true", help="переименовать файлы (без флага — только предпросмотр)")
+    ap.add_argument("--undo", action="store_true", help="вернуть старые имена последнего --apply (или прерванного)")
+    ap.add_argument("--multipage", choices=("first", "split"), help="многостраничный TIFF: имя по первой "
+                    "странице с номером или разрезать по номерам (по умолчанию — из config.json, иначе first)")
+    ap.add_argument("--wide", action="store_true", help="широкие зоны поиска")
+    ap.add_argument("--no-rotations", action="store_true", help="не пробовать повороты 90/180/270")
+    ap.add_argument("--no-cache", action="store_true", help="не использовать кэш распознавания")
+    ap.add_argument("--no-model", action="store_true", help="не искать номер сначала в привычных местах")
+    ap.add_argument("--force", action="store_true", help="распознать заново и обновить кэш")
+    ap.add_argument("--report", type=Path, help="сохранить замеры по этапам (.json или .csv)")
+    ap.add_argument("--tesseract", help="путь к tesseract (по умолчанию — из config.json)")
+    ap.add_argument("--tree", action="store_true", help="папки — корни: пройти все датированные папки внутри")
+    ap.add_argument("--restart", action="store_true", help="не продолжать прерванный прогон дерева (--tree)")
+    ap.add_argument("--watch", action="store_true", help="следить за папками и распознавать новые сканы (до Ctrl+C)")
+    ap.add_argument("--settle", type=float, default=2.0, help="сколько секунд файл не должен меняться (--watch)")
+    ap.add_argument("--skip-existing", action="store_true", help="не трогать файлы, лежавшие до запуска (--watch)")
+    args = ap.parse_args(argv)
+    if args.undo and (args.apply or args.watch):
+        ap.error("--undo запускается отдельно")
+    if args.watch and args.apply:
+        ap.error("--watch только распознаёт; переименование — отдельным запуском с --apply")
+    if args.tree and (args.undo or args.watch or args.date):
+        ap.error("--tree не сочетается с --undo, --watch и --date: дата берётся из имени каждой папки")
+    if args.date and not re.fullmatch(r"\d{2}\.\d{2}\.\d{4}", args.date):
+        ap.error("дата должна быть в формате ДД.ММ.ГГГГ")
+
+    cfg = load_config()
+    if args.tesseract: cfg["tesseract_path"] = args.tesseract
+    cfg["use_rotations"] = not args.no_rotations
+    if args.multipage: cfg["multipage"] = args.multipage
+    ensure_tess(cfg)
+    cache = None if args.no_cache else open_cache(cfg)
+    model = None if args.no_model else open_model(cfg)
+    try: sys.stdout.reconfigure(encoding="utf-8")
+    except Exception: pass
+
+    err = None if args.undo else backend_error(cfg)
+    if err:
+        print(f"OCR недоступен: {err}", file=sys.stderr); return 2
+
+    if args.watch:
+        missing = [f for f in args.folders if not f.is_dir()]
+        if missing: ap.error(f"папка не найдена: {missing[0]}")
+        run_watch(args.folders, args, cfg, cache, sys.stdout, model)
+        return 0
+
+    if args.undo:
+        ok = True
+        for folder in args.folders: ok &= run_undo(folder, cfg, sys.stdout)
+        return 0 if ok else 1
+
+    failed = False; report = StatsReport()
+    for folder in args.folders:
+        if not folder.is_dir():
+            emit(sys.stdout, {"folder": str(folder), "error": "папка не найдена"}); failed = True; continue
+        if args.tree:
+            failed |= not run_tree(folder, args, cfg, cache, sys.stdout, report, model); continue
+        counts = run_folder(folder, args, cfg, cache, sys.stdout, report, model)
+        failed |= counts.get("error", 0) > 0
+        print(f"{folder}: " + ", ".join(f"{k}={v}" for k,v in counts.items()), file=sys.stderr)
+    if report.rows: print(report.summary(), file=sys.stderr)
+    if args.report:
+        if args.report.suffix.lower()==".json": report.to_json(args.report)
+        else: report.to_csv(args.report)
+    return 1 if failed else 0
+
+if __name__=="__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -1,235 +1,74 @@
 # -*- coding: utf-8 -*-
-import os, re, json, sys
+"""Окно программы — тонкая оболочка над пакетом ella: распознавание, имена, кэш и переименование
+живут там и от tkinter не зависят (их же берут renamer_cli.py и bench)."""
+import multiprocessing
+
+if __name__=="__main__":
+    # рабочие процессы собранного exe запускают этот же файл — пусть уходят в пул сразу,
+    # не загружая tkinter и остальной интерфейс
+    multiprocessing.freeze_support()
+
+import os, re, sys, time, queue, threading
 from pathlib import Path
-from typing import Optional, List, Tuple, Dict
+from typing import Optional, List, Tuple
 
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 
-try:
-    from PIL import Image, ImageOps, ImageFilter, ImageTk
-except Exception:
-    Image = None; ImageOps = None; ImageFilter = None; ImageTk = None
-
-try:
-    import pytesseract
-except Exception:
-    pytesseract = None
+from ella.lazy import Image, ImageTk
+from ella.config import load_config, save_config
+from ella.naming import PATTERN, parse_date_from_folder, FolderSnapshot, NameIndex
+from ella.stats import StatsReport
+from ella.ocr import ensure_tess, backend_error, ocr_data_digits
+from ella.imaging import ImageCache, OCR_DPI
+from ella.recognize import search_regions, extract_pages, empty_result, read_selection
+from ella.cache import open_cache
+from ella.hotspots import open_model
+from ella.pool import default_jobs, iter_recognize
+from ella.rename import RenameBatch, rename_jobs
+from ella.batch import TreeRun
 
 APP_TITLE = "Переименование отсканированных файлов — Ella Renamer v3.2 (зоны+якоря, ручное выделение)"
-SUPPORTED_EXTS = (".jpg",".jpeg",".png",".webp",".tif",".tiff",".bmp",".jfif")
-PATTERN = re.compile(r"(2711\d{4}|20\d{6})")
-CONFIG_NAME = "config.json"
-
-def app_dir()->Path:
-    if getattr(sys, "frozen", False):
-        return Path(sys.executable).parent
-    return Path(__file__).parent
-
-def load_config()->dict:
-    cfg_path = app_dir() / CONFIG_NAME
-    if cfg_path.exists():
-        try:
-            return json.loads(cfg_path.read_text(encoding="utf-8"))
-        except Exception:
-            pass
-    return {"tesseract_path": r"C:\Program Files\Tesseract-OCR\tesseract.exe",
-            "use_rotations": True}
-
-def save_config(cfg: dict):
-    (app_dir() / CONFIG_NAME).write_text(json.dumps(cfg, ensure_ascii=False, indent=2), encoding="utf-8")
-
-def ensure_tess(cfg: dict):
-    global pytesseract
-    if pytesseract is None: return
-    path = cfg.get("tesseract_path") or ""
-    if os.name=="nt" and path and os.path.exists(path):
-        pytesseract.pytesseract.tesseract_cmd = path
-
-def parse_date_from_folder(folder: Path)->Optional[str]:
-    name = folder.name
-    m = re.search(r"(\d{2})[.\-_/](\d{2})[.\-_/](\d{4})", name)
-    if m: return f"{m.group(1)}.{m.group(2)}.{m.group(3)}"
-    m = re.search(r"(\d{4})[.\-_/](\d{2})[.\-_/](\d{2})", name)
-    if m: return f"{m.group(3)}.{m.group(2)}.{m.group(1)}"
-    m = re.search(r"(\d{8})", name)
-    if m:
-        raw = m.group(1)
-        if raw.startswith("20"):
-            y,mm,d = raw[:4], raw[4:6], raw[6:]
-        else:
-            d,mm,y = raw[:2], raw[2:4], raw[4:]
-        return f"{d}.{mm}.{y}"
-    return None
-
-def pil_open(path: Path):
-    img = Image.open(path)
-    try: img = ImageOps.exif_transpose(img)
-    except Exception: pass
-    return img
-
-def preprocess(img):
-    img = img.convert("L")
-    try: img = ImageOps.autocontrast(img)
-    except Exception: pass
-    try: img = img.filter(ImageFilter.SHARPEN)
-    except Exception: pass
-    return img
-
-# --- OCR helpers ---
-def ocr_data_words(pil, lang="rus+eng")->List[Dict]:
-    if pytesseract is None: return []
-    try:
-        d = pytesseract.image_to_data(pil, lang=lang, config="--psm 6", output_type=pytesseract.Output.DICT)
-        out=[]; n=len(d["text"])
-        for i in range(n):
-            txt=(d["text"][i] or "").strip()
-            if not txt: continue
-            out.append({"text": txt, "left": d["left"][i], "top": d["top"][i], "width": d["width"][i], "height": d["height"][i]})
-        return out
-    except Exception:
-        return []
-
-def ocr_text_digits(pil)->str:
-    if pytesseract is None: return ""
-    try:
-        return pytesseract.image_to_string(pil, lang="eng",
-            config="--psm 6 -c tessedit_char_whitelist=0123456789")
-    except Exception:
-        return ""
-
-def ocr_data_digits(pil)->List[Dict]:
-    if pytesseract is None: return []
-    try:
-        d = pytesseract.image_to_data(pil, lang="eng",
-            config="--psm 6 -c tessedit_char_whitelist=0123456789",
-            output_type=pytesseract.Output.DICT)
-        out=[]; n=len(d["text"])
-        for i in range(n):
-            txt=(d["text"][i] or "").strip().replace(" ","")
-            if not txt: continue
-            out.append({"text": txt, "left": d["left"][i], "top": d["top"][i],
-                        "width": d["width"][i], "height": d["height"][i]})
-        return out
-    except Exception:
-        return []
-
-# --- зоны поиска (стандарт/широкие) ---
-def search_regions(img, wide=False):
-    w,h=img.size
-    if not wide:
-        return [
-            ((int(w*0.55), 0, int(w*0.995), int(h*0.40)), "правый верх"),
-            ((0, 0, int(w*0.22), h), "левая вертикаль"),
-        ]
-    else:
-        return [
-            ((int(w*0.50), 0, int(w*0.995), int(h*0.55)), "правый верх (шир.)"),
-            ((0, 0, int(w*0.28), h), "левая вертикаль (шир.)"),
-        ]
-
-def orientations(img, use_rot=True):
-    lst=[(0, img)]
-    if not use_rot: return lst
-    try:
-        lst += [(90, img.rotate(90,expand=True)),
-                (180, img.rotate(180,expand=True)),
-                (270, img.rotate(270,expand=True))]
-    except Exception: pass
-    return lst
-
-# --- Поиск рядом с якорями «отправка №», «№» ---
-def find_near_anchor(region_img)->Tuple[Optional[str], Optional[Tuple[int,int,int,int]], str]:
-    words = ocr_data_words(preprocess(region_img))
-    W,H = region_img.size
-    norm = [(w["text"].lower().replace("ё","е"), w) for w in words]
-    candidates = []
-    for i,(t,w) in enumerate(norm):
-        has_no = ("№" in w["text"]) or (t=="no") or (t=="n°") or (t=="№")
-        has_otpr = ("отправк" in t)
-        if has_no and i>0 and "отправк" in norm[i-1][0]:
-            anchor = w
-            l = anchor["left"] + anchor["width"]
-            t0 = max(0, anchor["top"] - int(anchor["height"]*0.5))
-            r = min(W, l + int(W*0.40))
-            b = min(H, anchor["top"] + int(anchor["height"]*1.8))
-            candidates.append((l,t0,r,b,"по якорю: отправка №"))
-        elif has_no:
-            anchor = w
-            l = anchor["left"] + anchor["width"]
-            t0 = max(0, anchor["top"] - int(anchor["height"]*0.5))
-            r = min(W, l + int(W*0.40))
-            b = min(H, anchor["top"] + int(anchor["height"]*1.8))
-            candidates.append((l,t0,r,b,"по якорю: №"))
-        elif has_otpr:
-            anchor = w
-            l = anchor["left"] + anchor["width"]
-            t0 = max(0, anchor["top"] - int(anchor["height"]*0.5))
-            r = min(W, l + int(W*0.45))
-            b = min(H, anchor["top"] + int(anchor["height"]*1.8))
-            candidates.append((l,t0,r,b,"по якорю: отправка"))
-    for (l,t0,r,b,source) in candidates:
-        roi = region_img.crop((l,t0,r,b))
-        for item in ocr_data_digits(preprocess(roi)):
-            m = PATTERN.fullmatch(item["text"].replace(" ", ""))
-            if m:
-                L = l + item["left"]; T = t0 + item["top"]
-                R = L + item["width"]; B = T + item["height"]
-                return m.group(1), (L,T,R,B), source
-        text = ocr_text_digits(preprocess(roi)).replace(" ", "")
-        m = PATTERN.search(text)
-        if m:
-            return m.group(1), (l,t0,r,b), source
-    return None, None, ""
-
-def extract_number_debug(path: Path, cfg: dict, wide=False):
-    if Image is None:
-        return {"serial": None, "angle":0, "bbox": None, "source": None, "img": None,
-                "regions": []}
-    try: base = pil_open(path)
-    except Exception:
-        return {"serial": None, "angle":0, "bbox": None, "source": None, "img": None,
-                "regions": []}
-
-    best = {"serial": None, "angle":0, "bbox": None, "source": None, "img": base,
-            "regions": []}
-    for angle, img in orientations(base, cfg.get("use_rotations", True)):
-        regs = search_regions(img, wide)
-        if angle==0: best["regions"] = regs
-        # 1) По якорям
-        for bbox_reg, lbl in regs:
-            region = img.crop(bbox_reg)
-            serial, box, why = find_near_anchor(region)
-            if serial:
-                if box:
-                    L = bbox_reg[0] + box[0]; T = bbox_reg[1] + box[1]
-                    R = bbox_reg[0] + box[2]; B = bbox_reg[1] + box[3]
-                    gb = (L,T,R,B)
-                else:
-                    gb = bbox_reg
-                return {"serial": serial, "angle": angle, "bbox": gb,
-                        "source": f"{lbl}, {why}", "img": img, "regions": regs}
-        # 2) Фолбэк: цифры внутри зон
-        for bbox_reg, lbl in regs:
-            region = img.crop(bbox_reg)
-            for item in ocr_data_digits(preprocess(region)):
-                m = PATTERN.fullmatch(item["text"].replace(" ", ""))
-                if m:
-                    L = bbox_reg[0] + item["left"]; T = bbox_reg[1] + item["top"]
-                    R = L + item["width"]; B = T + item["height"]
-                    return {"serial": m.group(1), "angle": angle, "bbox": (L,T,R,B),
-                            "source": f"{lbl}, без якоря", "img": img, "regions": regs}
-    return best
-
-def propose(date_str:str, serial:str, ext:str, existing:set, seen:dict)->str:
-    base = f"{date_str} {serial}"
-    seen[base] = seen.get(base,0)+1
-    cand = base if seen[base]==1 else f"{base} 1"
-    name = f"{cand}{ext}"
-    i=2
-    while name in existing:
-        name = f"{base} {i-1}{ext}"; i+=1
-    return name
+
+SEL_DELAY_MS = 40   # выделение, отпущенное и тут же начатое заново, не распознаётся
+
+class SelectionReader:
+    """OCR выделенной области в своём потоке, чтобы окно не замирало. Поток один на всё время
+    работы: tesserocr держит API в потоке, и traineddata второй раз не грузится (движок
+    прогревается сразу при старте). Берётся только последняя заявка; submit() и cancel()
+    делают прежние устаревшими — их проход прерывается между вызовами OCR, итог не отдаётся."""
+    def __init__(self, images: ImageCache):
+        self.images = images; self.gen = 0
+        self.todo = queue.Queue(); self.done = queue.Queue()
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def submit(self, key, box, tag)->int:
+        """key — (путь, угол, страница) показанной страницы, box — в её координатах."""
+        self.gen += 1; self.todo.put((self.gen, key, box, tag)); return self.gen
+
+    def cancel(self):
+        self.gen += 1
+
+    def _loop(self):
+        try: ocr_data_digits(Image.new("L", (64, 32), 255))
+        except Exception: pass
+        while True:
+            job = self.todo.get()
+            try:
+                while True: job = self.todo.get_nowait()
+            except queue.Empty: pass
+            gen, (path, angle, frame), box, tag = job
+            if gen != self.gen: continue
+            t0 = time.perf_counter()
+            try: serial, found = read_selection(self.images.view(path, angle, frame), box, lambda: gen != self.gen)
+            except Exception: serial, found = None, None
+            if gen == self.gen: self.done.put((gen, tag, serial, found, time.perf_counter()-t0))
+
+DUP_STATUS = "ДУБЛЬ"   # номер взят у ранее распознанного скана той же страницы, OCR не было
+
+def row_status(dbg: dict)->str:
+    if not dbg["serial"]: return "НЕ НАЙДЕНО"
+    return DUP_STATUS if dbg.get("dup") else "OK"
 
 class App(ttk.Frame):
     def __init__(self, master):
@@ -239,17 +78,32 @@ class App(ttk.Frame):
         self.dir_var=tk.StringVar(); self.date_var=tk.StringVar()
         self.tess_var=tk.StringVar(value=self.cfg.get("tesseract_path",""))
         self.status=tk.StringVar(value="Готово"); self.rows=[]; self.preview_cache={}
+        self.snapshot=None; self.names=None   # FolderSnapshot и NameIndex последнего предпросмотра
         self._photo=None
+        # фоновый предпросмотр: очередь результатов из потока-диспетчера и флаг отмены
+        self._q=None; self._cancel=None
+        self._renaming=False   # идёт пакет переименования (RenameBatch) в фоне
         self.wide_var = tk.BooleanVar(value=False)   # «Широкие зоны»
+        self.force_var = tk.BooleanVar(value=False)  # «Заново (без кэша)»
+        self.ocr_cache = open_cache(self.cfg)
+        self.report = StatsReport()   # замеры последнего предпросмотра
+        self.model = open_model(self.cfg)   # где обычно стоит номер — учится на находках и исправлениях
         # для ручного выделения
         self.sel_start=None; self.sel_rect=None
-        self.disp_scale=1.0; self.disp_off=(0,0); self.last_img=None
+        self.disp_scale=1.0; self.disp_off=(0,0)
+        self.last_key=None; self.last_size=None   # (путь, угол, страница) и полный размер показанной страницы
+        self.images = ImageCache(int(self.cfg.get("thumb_cache", 64)), int(self.cfg.get("page_cache", 2)),
+                                 self.cfg.get("ocr_dpi", OCR_DPI))
+        self.reader = None; self._sel_after = None   # SelectionReader — при первом показе страницы
         self.build()
         # хоткеи
         master.bind("<F5>", lambda e: self.preview())
         master.bind("<F6>", lambda e: self.apply())
+        master.bind("<F7>", lambda e: self.rerecognize_selected())
         master.bind("<F9>", lambda e: self.recognize_in_selection())
         master.bind("<Control-o>", lambda e: self.choose_dir())
+        master.bind("<Escape>", lambda e: self.cancel_preview())
+        master.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def build(self):
         top=ttk.Frame(self); top.pack(fill="x", padx=10, pady=8)
@@ -266,12 +120,19 @@ class App(ttk.Frame):
         ttk.Button(top,text="Найти...",command=self.choose_tess).grid(row=2,column=2,padx=4)
         ttk.Button(top,text="Сохранить",command=self.save_cfg).grid(row=2,column=3,padx=4)
         ttk.Checkbutton(top,text="Широкие зоны",variable=self.wide_var).grid(row=2,column=4,padx=(10,0))
+        ttk.Checkbutton(top,text="Заново (без кэша)",variable=self.force_var).grid(row=3,column=4,padx=(10,0),sticky="w")
 
-        toolbar=ttk.Frame(top); toolbar.grid(row=3, column=0, columnspan=5, sticky="we", pady=(8,0))
+        toolbar=ttk.Frame(top); toolbar.grid(row=3, column=0, columnspan=4, sticky="we", pady=(8,0))
         ttk.Button(toolbar,text="Предпросмотр (F5)",command=self.preview).pack(side="left",padx=4)
+        self.cancel_btn=ttk.Button(toolbar,text="Отмена (Esc)",command=self.cancel_preview,state="disabled")
+        self.cancel_btn.pack(side="left",padx=4)
         ttk.Button(toolbar,text="Переименовать (F6)",command=self.apply).pack(side="left",padx=4)
+        ttk.Button(toolbar,text="Отменить переименование",command=self.undo_rename).pack(side="left",padx=4)
         ttk.Button(toolbar,text="Открыть папку",command=self.open_folder).pack(side="left",padx=4)
-        ttk.Button(toolbar,text="Распознать в выделенной области (F9)",command=self.recognize_in_selection).pack(side="left",padx=10)
+        ttk.Button(toolbar,text="Отчёт…",command=self.export_report).pack(side="left",padx=4)
+        ttk.Button(toolbar,text="Папки по датам…",command=self.run_tree).pack(side="left",padx=4)
+        ttk.Button(toolbar,text="Заново выбранный (F7)",command=self.rerecognize_selected).pack(side="left",padx=(10,4))
+        ttk.Button(toolbar,text="Распознать в выделенной области (F9)",command=self.recognize_in_selection).pack(side="left",padx=4)
 
         manual=ttk.Frame(top); manual.grid(row=4, column=0, columnspan=5, sticky="we", pady=(6,0))
         ttk.Label(manual, text="Ручной ввод номера (для выбранного файла):").pack(side="left")
@@ -298,7 +159,10 @@ class App(ttk.Frame):
         self.canvas.bind("<B1-Motion>", self.on_canvas_drag)
         self.canvas.bind("<ButtonRelease-1>", self.on_canvas_up)
 
-        ttk.Label(self,textvariable=self.status,anchor="w").pack(fill="x", padx=10, pady=(0,8))
+        bottom=ttk.Frame(self); bottom.pack(fill="x", padx=10, pady=(0,8))
+        ttk.Label(bottom,textvariable=self.status,anchor="w").pack(side="left", fill="x", expand=True)
+        self.progress=ttk.Progressbar(bottom, length=220, mode="determinate")
+        self.progress.pack(side="right")
         top.columnconfigure(1, weight=1)
 
     # ==== утилиты ====
@@ -313,8 +177,16 @@ class App(ttk.Frame):
 
     def save_cfg(self):
         cfg = load_config()
-        cfg["tesseract_path"]=self.tess_var.get().strip()
-        save_config(cfg); ensure_tess(cfg); self.status.set("Путь к Tesseract сохранён.")
+        cfg["tesseract_path"]=self.cfg["tesseract_path"]=self.tess_var.get().strip()
+        save_config(cfg); ensure_tess(self.cfg); self.status.set("Путь к Tesseract сохранён.")
+
+    def run_cfg(self, parent=None)->Optional[dict]:
+        """Настройки прогона — config.json целиком (движок OCR, dpi, dedupe…), повороты включены.
+        None — OCR по ним не запустится, причина уже показана оператору."""
+        cfg=dict(self.cfg, use_rotations=True)
+        err=backend_error(cfg)
+        if err: messagebox.showerror("OCR недоступен", err, parent=parent or self.master); return None
+        return cfg
 
     def fill_date(self):
         f=Path(self.dir_var.get().strip())
@@ -323,14 +195,46 @@ class App(ttk.Frame):
             if ds: self.date_var.set(ds)
 
     def files(self)->List[Path]:
+        """Файлы папки по свежему снимку (self.snapshot) — один scandir на предпросмотр."""
         f=Path(self.dir_var.get().strip())
-        if not f.exists(): return []
-        return [f/n for n in sorted(os.listdir(f)) if n.lower().endswith(SUPPORTED_EXTS)]
+        if not f.is_dir(): return []
+        try: self.snapshot=FolderSnapshot(f)
+        except OSError: return []
+        return self.snapshot.files()
+
+    def set_serial(self, i, serial, parts=None):
+        """Номер строки i и пересчёт новых имён — только у строк затронутых серий (NameIndex).
+        parts — части многостраничного файла [(номер, страницы)], если его надо разрезать."""
+        date=self.date_var.get().strip()
+        if self.names.date!=date and re.fullmatch(r"\d{2}\.\d{2}\.\d{4}", date):
+            # дату поправили после предпросмотра — все имена заново
+            self.names=NameIndex(date, self.snapshot.names)
+            for j,rj in enumerate(self.rows):
+                if j!=i and rj["serial"]:
+                    self.names.set_parts(j, rj["old"], [ps for ps,_ in rj.get("parts") or [(rj["serial"], None)]],
+                                         Path(rj["old"]).suffix.lower())
+            for j,rj in enumerate(self.rows):
+                if j!=i: rj["new"]=self.names.name(j); self.update_row(j)
+        r=self.rows[i]; r["serial"]=serial or ""
+        parts = parts if serial and parts and len(parts)>1 else None
+        if parts: r["parts"]=[tuple(pt) for pt in parts]
+        else: r.pop("parts", None)
+        for j in self.names.set_parts(i, r["old"], [ps for ps,_ in parts] if parts else [serial] if serial else [],
+                                      Path(r["old"]).suffix.lower()):
+            self.rows[j]["new"]=self.names.name(j)
+            if j!=i: self.update_row(j)
+        r["new"]=self.names.name(i); self.update_row(i)
 
     # ==== основной поток ====
     def preview(self):
-        self.tree.delete(*self.tree.get_children()); self.preview_cache.clear()
-        self.canvas.delete("all"); self._photo=None; self.sel_clear()
+        if self._renaming: return
+        # настройки — до всякой правки окна: при недоступном OCR прежний предпросмотр остаётся как был
+        cfg=self.run_cfg()
+        if cfg is None: return
+        if not self.check_journal(Path(self.dir_var.get().strip())): return
+        self.cancel_preview()
+        self.tree.delete(*self.tree.get_children()); self.preview_cache.clear(); self.images.clear()
+        self.canvas.delete("all"); self._photo=None; self.sel_clear(); self.last_key=self.last_size=None
         mode = "Широкие" if self.wide_var.get() else "Стандартные"
         self.status.set(f"Распознавание ({mode} зоны; якоря «отправка №», «№»)..."); self.update_idletasks()
 
@@ -339,35 +243,238 @@ class App(ttk.Frame):
         date=self.date_var.get().strip()
         if not re.fullmatch(r"\d{2}\.\d{2}\.\d{4}", date):
             messagebox.showwarning("Дата","Введите ДД.ММ.ГГГГ или нажмите «Из имени папки»."); self.status.set("Ожидает даты."); return
-        folder=Path(self.dir_var.get().strip()); existing=set(os.listdir(folder)); seen={}; self.rows=[]
-
-        for p in fs:
-            dbg = extract_number_debug(p, {"use_rotations": True}, wide=self.wide_var.get()) if Image else \
-                  {"serial": None, "img": None, "bbox": None, "angle": 0, "source": None, "regions":[]}
-            self.preview_cache[p.name] = dbg
-            serial = dbg["serial"]
-            if not serial: st="НЕ НАЙДЕНО"; newname=""
-            else: st="OK"; newname=propose(date,serial,p.suffix.lower(),existing,seen)
-            row={"old":p.name,"serial":serial or "","new":newname,"status":st}
-            self.rows.append(row); self.tree.insert("", "end", values=(row["old"],row["serial"],row["new"],row["status"]))
-        self.status.set("Готово. Выберите строку — справа подсветятся зоны и найденное место.")
+        self._files=fs; self.names=NameIndex(date, self.snapshot.names)
+        self._results=[None]*len(fs); self._ndone=0; self._t0=time.monotonic()
+        self.report=StatsReport()
+        self.rows=[{"old":p.name,"serial":"","new":"","status":"…"} for p in fs]
+        self.refresh_tree()
+        self.progress.configure(maximum=len(fs), value=0); self.cancel_btn.configure(state="normal")
+
+        self._q=queue.Queue(); self._cancel=threading.Event()
+        threading.Thread(target=self._preview_worker, daemon=True,
+                         args=(fs, cfg, self.wide_var.get(), self.force_var.get(), self._q, self._cancel)).start()
+        self.after(50, self._poll_preview, self._q)
+
+    def _preview_worker(self, fs, cfg, wide, force, q, cancel):
+        """Поток-диспетчер: гоняет пул процессов и складывает результаты в очередь (Tk не трогает)."""
+        err=None
+        try:
+            for i, _p, dbg in iter_recognize(fs, cfg, wide, cancel=cancel, cache=self.ocr_cache, force=force,
+                                            model=self.model):
+                q.put((i, dbg))
+        except Exception as e: err=e
+        q.put((None, err))
+
+    def _poll_preview(self, q):
+        if q is not self._q: return
+        try:
+            while True:
+                i, dbg = q.get_nowait()
+                if i is None: self._finish_preview(dbg); return
+                self._on_result(i, dbg)
+        except queue.Empty: pass
+        self._show_progress()
+        self.after(100, self._poll_preview, q)
+
+    def _on_result(self, i, dbg):
+        self._results[i]=dbg; self._ndone+=1
+        self.preview_cache[self._files[i].name]=dbg
+        self.report.add(self._files[i].name, dbg)
+        self.rows[i]["status"]=row_status(dbg)
+        # суффиксы не зависят от порядка готовности: NameIndex раздаёт их в порядке строк
+        self.set_serial(i, dbg["serial"], dbg.get("parts"))
+
+    def _show_progress(self):
+        n=self._ndone; total=len(self.rows)
+        self.progress.configure(value=n)
+        if not n: return
+        left=int((time.monotonic()-self._t0)/n*(total-n))
+        t=self.report.totals()
+        self.status.set(f"Распознано {n} из {total}, осталось ~{left//60}:{left%60:02d}; "
+                        f"OCR {t['ocr_per_file']:.1f} вызова на файл")
+
+    def _finish_preview(self, err):
+        cancelled=self._cancel.is_set()
+        self._q=None; self.cancel_btn.configure(state="disabled")
+        self.progress.configure(value=self._ndone)
+        for i,r in enumerate(self.rows):
+            if self._results[i] is None: r["status"]="ОТМЕНЕНО"; self.update_row(i)
+        if err is not None:
+            messagebox.showerror("Ошибка распознавания", str(err)); self.status.set("Ошибка распознавания.")
+        elif cancelled:
+            self.status.set(f"Отменено. Распознано {self._ndone} из {len(self.rows)}. {self.report.summary()}")
+        else:
+            self.status.set(f"Готово. {self.report.summary()}. Выберите строку — справа подсветятся зоны.")
+
+    def export_report(self):
+        if not self.report.rows: messagebox.showinfo("Нет данных","Сначала выполните предпросмотр."); return
+        p=filedialog.asksaveasfilename(title="Сохранить отчёт", defaultextension=".csv",
+                                       filetypes=[("CSV","*.csv"),("JSON","*.json")])
+        if not p: return
+        try:
+            if p.lower().endswith(".json"): self.report.to_json(p)
+            else: self.report.to_csv(p)
+        except Exception as e:
+            messagebox.showerror("Отчёт", str(e)); return
+        self.status.set(f"Отчёт сохранён: {p}")
+
+    def run_tree(self):
+        """Все датированные папки внутри выбранной — одним пулом (TreeDialog)."""
+        if self._q is not None or self._renaming:
+            messagebox.showinfo("Идёт работа","Дождитесь окончания предпросмотра или переименования."); return
+        p=filedialog.askdirectory(title="Папка, внутри которой папки по датам")
+        if p: TreeDialog(self, Path(p))
+
+    def rerecognize_selected(self):
+        """Выбранный файл — заново, мимо кэша; задачи (угол, зона, стратегия) одного файла
+        считаются параллельно (run_jobs), так что ждать приходится примерно самую долгую из них."""
+        sel=self.tree.selection()
+        if not sel or not self.rows: messagebox.showinfo("Нет выбора","Слева выберите файл."); return
+        if self._q is not None:
+            messagebox.showinfo("Идёт распознавание","Дождитесь окончания предпросмотра или нажмите «Отмена»."); return
+        i=int(sel[0]); path=Path(self.dir_var.get().strip())/self.rows[i]["old"]
+        cfg=self.run_cfg()
+        if cfg is None: return
+        wide=self.wide_var.get(); spots=self.model.snapshot() if self.model is not None else None
+        # задачи файла идут в нескольких потоках — OpenMP внутри tesseract только отбирал бы у них ядра
+        os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+        self.rows[i]["status"]="…"; self.update_row(i); self.status.set(f"Распознаю заново: {path.name}")
+        q=queue.Queue()
+        def work():
+            try: dbg=extract_pages(path, cfg, wide, spots=spots, par=default_jobs(cfg))
+            except Exception: dbg=empty_result()
+            q.put(dbg)
+        threading.Thread(target=work, daemon=True).start()
+        self.after(50, self._poll_rerecognize, q, i, path, cfg, wide)
+
+    def _poll_rerecognize(self, q, i, path, cfg, wide):
+        try: dbg=q.get_nowait()
+        except queue.Empty: self.after(50, self._poll_rerecognize, q, i, path, cfg, wide); return
+        if i>=len(self.rows) or self.rows[i]["old"]!=path.name: return   # за это время был новый предпросмотр
+        if self.ocr_cache is not None and dbg["serial"] and not dbg.get("error"):
+            try: self.ocr_cache.put(self.ocr_cache.key(path, cfg, wide), dbg)
+            except Exception: pass
+        if self.model is not None and dbg["serial"]: self.model.learn(dbg["bbox"], dbg.get("size"))
+        self.preview_cache[path.name]=dbg
+        r=self.rows[i]; r["status"]=row_status(dbg)
+        self.set_serial(i, dbg["serial"], dbg.get("parts"))
+        t=dbg.get("stats") or {}
+        self.status.set(f"{path.name}: {r['serial'] or 'номер не найден'} за {t.get('total', 0):.1f} с, OCR {t.get('ocr_calls', 0)}")
+        if self.tree.selection()==(str(i),): self.show_image_with_overlays(path, dbg)
+
+    def cancel_preview(self):
+        if self._q is not None: self._cancel.set()
+
+    def on_close(self):
+        self.cancel_preview()
+        if self.model is not None: self.model.save()
+        self.master.destroy()
+
+    RENAME_STATUS = {"renamed": "ПЕРЕИМ.", "split": "РАЗРЕЗАН", "exists": "СУЩЕСТВУЕТ", "missing": "НЕТ ФАЙЛА", "error": "ОШИБКА"}
 
     def apply(self):
         if not self.rows: messagebox.showinfo("Нет данных","Сначала выполните предпросмотр."); return
-        folder=Path(self.dir_var.get().strip()); ok=0
-        for r in self.rows:
-            if r["status"]!="OK" or not r["new"]: continue
-            src=folder/r["old"]; dst=folder/r["new"]
+        if self._q is not None or self._renaming:
+            messagebox.showinfo("Идёт работа","Дождитесь окончания предпросмотра или переименования."); return
+        folder=Path(self.dir_var.get().strip())
+        if not self.check_journal(folder): return
+        rows=[r for r in self.rows if r["status"] in ("OK", DUP_STATUS) and r["new"]]
+        # многостраничные файлы с несколькими номерами режутся на части, а не переименовываются
+        splits={r["old"]: [(self.names.name(i,k), pages) for k,(_,pages) in enumerate(r["parts"])]
+                for i,r in enumerate(self.rows) if r["status"] in ("OK", DUP_STATUS) and r["new"] and r.get("parts")}
+        names=self.snapshot.names if self.snapshot is not None and self.snapshot.folder==folder else None
+        try: batch, skipped = RenameBatch.plan(folder, [(r["old"], r["new"]) for r in rows if r["old"] not in splits],
+                                              names, list(splits.items()))
+        except Exception as e: messagebox.showerror("Переименование", str(e)); return
+        def done(status):
+            self._snapshot_moved(folder, [(m["src"], m["dst"]) for m in batch.moves if status.get(m["src"])=="renamed"])
+            for old, parts in splits.items():
+                if status.get(old)=="split": self._snapshot_moved(folder, [(old, name) for name,_ in parts])
+            status=dict(skipped, **status); ok=0
+            for r in rows:
+                st=status.get(r["old"], "renamed")   # старое имя = новому — делать нечего
+                r["status"]=self.RENAME_STATUS[st]
+                if st=="split": ok+=1
+                if st!="renamed": continue
+                ok+=1; d=self.preview_cache.get(r["old"])
+                # переименование — подтверждение оператора: место номера весит больше автоматической находки
+                if self.model is not None and d and d.get("serial")==r["serial"]:
+                    self.model.learn(d.get("bbox"), d.get("size"), weight=2)
+            if self.model is not None: self.model.save()
+            self.refresh_tree(); self.status.set(f"Готово. Успешно переименовано: {ok}. Отменить — «Отменить переименование».")
+        self.status.set(f"Переименование: {len(batch.moves)+len(batch.splits)} файлов…")
+        self._run_batch(batch.run, done)
+
+    def undo_rename(self):
+        if self._q is not None or self._renaming: return
+        folder=Path(self.dir_var.get().strip()); batch=RenameBatch.load(folder)
+        if batch is None: messagebox.showinfo("Отмена переименования","В этой папке нечего отменять."); return
+        n=len(batch.moves)+len(batch.splits)
+        if not messagebox.askyesno("Отмена переименования", f"Вернуть старые имена {n} файлам?"): return
+        def done(status):
+            back={m["dst"]: m["src"] for m in batch.moves if status.get(m["src"])=="renamed"}
+            self._snapshot_moved(folder, list(back.items()))
+            for s in batch.splits:
+                if status.get(s["src"])!="renamed": continue
+                # разрез отменён: части удалены, исходник вернулся из «исходные»
+                self._snapshot_moved(folder, [(b, s["src"]) for b,_ in s["parts"]]); back[s["parts"][0][0]]=s["src"]
+            for r in self.rows:
+                if r["status"] in ("ПЕРЕИМ.", "РАЗРЕЗАН") and r["new"] in back: r["status"]="OK"
+            self.refresh_tree()
+            bad=sum(1 for v in status.values() if v!="renamed")
+            self.status.set(f"Старые имена возвращены: {len(back)}" + (f", не удалось: {bad}" if bad else ""))
+        self._run_batch(batch.undo, done)
+
+    def _snapshot_moved(self, folder, pairs):
+        # снимок папки правим по сделанному — перечитывать её незачем
+        if self.snapshot is None or self.snapshot.folder!=folder: return
+        for a,_ in pairs: self.snapshot.remove(a)
+        for _,b in pairs: self.snapshot.add(b)
+
+    def check_journal(self, folder: Path)->bool:
+        """Незавершённый пакет в папке (сбой, закрытие окна) — доделать или откатить до новой работы."""
+        batch=RenameBatch.load(folder)
+        if batch is None or batch.done: return True
+        ans=messagebox.askyesnocancel("Незавершённое переименование",
+            f"В папке не закончено переименование {len(batch.moves)+len(batch.splits)} файлов.\n"
+            "Да — доделать, Нет — вернуть старые имена, Отмена — ничего не делать.")
+        if ans is None: return False
+        def done(status):
+            bad=sum(1 for v in status.values() if v!="renamed")
+            self.status.set(("Переименование доделано." if ans else "Старые имена возвращены.")
+                            + (f" Не удалось: {bad}." if bad else "") + " Обновите предпросмотр (F5).")
+        self._run_batch(batch.run if ans else batch.undo, done)
+        return False
+
+    def _run_batch(self, action, done):
+        """action(jobs, progress) — в отдельном потоке; done(status) — в потоке Tk."""
+        q=queue.Queue(); self._renaming=True
+        def work():
+            try: q.put(("done", action(rename_jobs(self.cfg), lambda n, total: q.put(("progress", n, total)))))
+            except Exception as e: q.put(("error", e))
+        def poll():
             try:
-                if src.resolve()!=dst.resolve(): src.rename(dst)
-                ok+=1; r["status"]="ПЕРЕИМ."
-            except FileExistsError: r["status"]="СУЩЕСТВУЕТ"
-            except Exception: r["status"]="ОШИБКА"
-        self.refresh_tree(); self.status.set(f"Готово. Успешно переименовано: {ok}")
+                while True:
+                    msg=q.get_nowait()
+                    if msg[0]=="progress": self.progress.configure(maximum=msg[2], value=msg[1]); continue
+                    self._renaming=False
+                    if msg[0]=="error": messagebox.showerror("Переименование", str(msg[1])); self.status.set("Ошибка переименования.")
+                    else: done(msg[1])
+                    return
+            except queue.Empty: pass
+            self.after(50, poll)
+        threading.Thread(target=work, daemon=True).start()
+        self.after(50, poll)
 
     def refresh_tree(self):
         self.tree.delete(*self.tree.get_children())
-        for r in self.rows: self.tree.insert("", "end", values=(r["old"],r["serial"],r["new"],r["status"]))
+        for i,r in enumerate(self.rows):
+            self.tree.insert("", "end", iid=str(i), values=()); self.update_row(i)
+
+    def update_row(self, i):
+        r=self.rows[i]; new=r["new"]
+        if r.get("parts") and new: new+=f" (+{len(r['parts'])-1})"
+        self.tree.item(str(i), values=(r["old"],r["serial"],new,r["status"]))
 
     def open_folder(self):
         p=self.dir_var.get().strip()
@@ -389,21 +496,32 @@ class App(ttk.Frame):
         folder=Path(self.dir_var.get().strip())
         path = folder/filename
         self.show_image_with_overlays(path, dbg)
+        # эта страница для выделения и соседние строки — заранее, пока оператор смотрит на эту
+        if not Image: return
+        if self.reader is None: self.reader = SelectionReader(self.images)
+        i = self.tree.index(sel[0]); items = []
+        for j in (i+1, i-1, i+2, i-2):
+            if 0 <= j < len(self.rows):
+                name = self.rows[j]["old"]; d = self.preview_cache.get(name) or {}
+                items.append((folder/name, d.get("angle") or 0, d.get("frame") or 0))
+        self.images.prefetch(items, self.canvas_box(), page=(path, (dbg or {}).get("frame") or 0))
+
+    def canvas_box(self)->Tuple[int,int]:
+        return (self.canvas.winfo_width() or 560, self.canvas.winfo_height() or 560)
 
     def show_image_with_overlays(self, path: Path, dbg: dict):
         self.canvas.delete("all"); self._photo=None; self.sel_clear()
-        if Image is None: return
+        if not Image: return
+        dbg = dbg or {}
+        angle = dbg.get("angle") or 0; frame = dbg.get("frame") or 0
+        cw, ch = self.canvas_box()
         try:
-            img = dbg["img"] if (dbg and dbg.get("img") is not None) else pil_open(path)
+            disp, (w,h) = self.images.thumb(path, angle, (cw,ch), frame)
         except Exception:
             return
-        self.last_img = img
-        cw = self.canvas.winfo_width() or 560
-        ch = self.canvas.winfo_height() or 560
-        w,h = img.size
-        scale = min(cw/w, ch/h)
-        nw, nh = int(w*scale), int(h*scale)
-        disp = img.resize((nw,nh))
+        self.last_key = (path, angle, frame); self.last_size = (w,h)
+        nw, nh = disp.size
+        scale = nw/w   # миниатюра не увеличивается (load_thumb): масштаб — по ней, а не по холсту
         self._photo = ImageTk.PhotoImage(disp)
         x0 = (cw-nw)//2; y0 = (ch-nh)//2
         self.disp_scale = scale
@@ -411,7 +529,7 @@ class App(ttk.Frame):
         self.canvas.create_image(x0, y0, image=self._photo, anchor="nw")
 
         # подсветка "зон поиска"
-        regs = dbg.get("regions") or search_regions(img, self.wide_var.get())
+        regs = dbg.get("regions") or search_regions((w,h), self.wide_var.get())
         for (L,T,R,B), _lbl in regs:
             l = int(L*scale)+x0; r=int(R*scale)+x0; t=int(T*scale)+y0; b=int(B*scale)+y0
             self.canvas.create_rectangle(l,t,r,b, outline="#ffb000", dash=(5,3), width=2)
@@ -441,17 +559,20 @@ class App(ttk.Frame):
             self.canvas.coords(self.sel_rect, x0, y0, e.x, e.y)
 
     def on_canvas_up(self, e):
-        # по отпусканию ЛКМ можно сразу OCRнуть выбранную область
-        self.recognize_in_selection(auto=True)
+        # по отпусканию ЛКМ область распознаётся сама — в фоне и с короткой задержкой
+        self._sel_after = self.after(SEL_DELAY_MS, self.recognize_in_selection, True)
 
     def sel_clear(self):
+        # новое выделение (или другая страница) — прежнее распознавание уже не нужно
+        if self._sel_after: self.after_cancel(self._sel_after); self._sel_after = None
+        if self.reader is not None: self.reader.cancel()
         if self.sel_rect:
             self.canvas.delete(self.sel_rect)
         self.sel_rect=None; self.sel_start=None
 
     def selection_bbox_image_coords(self)->Optional[Tuple[int,int,int,int]]:
         """Вернёт прямоугольник выделения в координатах исходного изображения."""
-        if not self.sel_rect or not self.last_img: return None
+        if not self.sel_rect or not self.last_size: return None
         x0,y0,x1,y1 = self.canvas.coords(self.sel_rect)
         if x0==x1 or y0==y1: return None
         if x0>x1: x0,x1 = x1,x0
@@ -460,8 +581,8 @@ class App(ttk.Frame):
         scale = self.disp_scale
         # пересечение с областью изображения на canvas
         ix0 = max(x0, sx); iy0 = max(y0, sy)
-        ix1 = min(x1, sx + int(self.last_img.size[0]*scale))
-        iy1 = min(y1, sy + int(self.last_img.size[1]*scale))
+        ix1 = min(x1, sx + int(self.last_size[0]*scale))
+        iy1 = min(y1, sy + int(self.last_size[1]*scale))
         if ix0>=ix1 or iy0>=iy1: return None
         # перевод в координаты исходного изображения
         L = int((ix0 - sx) / scale)
@@ -471,55 +592,54 @@ class App(ttk.Frame):
         # небольшая подушка
         padx = max(2, int((R-L)*0.03)); pady = max(2, int((B-T)*0.03))
         L = max(0, L-padx); T = max(0, T-pady)
-        R = min(self.last_img.size[0], R+padx); B = min(self.last_img.size[1], B+pady)
+        R = min(self.last_size[0], R+padx); B = min(self.last_size[1], B+pady)
         return (L,T,R,B)
 
     def recognize_in_selection(self, auto=False):
-        """OCR в выделенной области → заполнить номер у выбранного файла."""
+        """OCR в выделенной области → заполнить номер у выбранного файла (SelectionReader)."""
+        self._sel_after = None
         sel = self.tree.selection()
         if not sel:
             if not auto:
                 messagebox.showinfo("Нет выбора","Слева выберите файл.")
             return
-        if not self.last_img:
+        if not self.last_size:
             if not auto: messagebox.showinfo("Нет изображения","Нечего распознавать.")
             return
         box = self.selection_bbox_image_coords()
         if not box:
             if not auto: messagebox.showinfo("Нет выделения","Выделите прямоугольник на изображении.")
             return
-        L,T,R,B = box
-        roi = self.last_img.crop((L,T,R,B))
-        # OCR цифр
-        serial = None
-        for item in ocr_data_digits(preprocess(roi)):
-            m = PATTERN.fullmatch(item["text"].replace(" ",""))
-            if m: serial = m.group(1); break
-        if not serial:
-            txt = ocr_text_digits(preprocess(roi)).replace(" ","")
-            m = PATTERN.search(txt)
-            if m: serial = m.group(1)
+        if self.reader is None: self.reader = SelectionReader(self.images)
+        i = int(sel[0])
+        gen = self.reader.submit(self.last_key, box, (i, self.rows[i]["old"], self.last_key, self.last_size, auto))
+        self.status.set("Распознаю выделенную область…")
+        self.after(15, self._poll_selection, gen)
+
+    def _poll_selection(self, gen):
+        if gen != self.reader.gen: return   # заменено новым выделением
+        try: gen_done, tag, serial, found, sec = self.reader.done.get_nowait()
+        except queue.Empty: self.after(15, self._poll_selection, gen); return
+        if gen_done != gen: self.after(15, self._poll_selection, gen); return
+        i, fname, key, size, auto = tag
+        if i >= len(self.rows) or self.rows[i]["old"] != fname: return   # за это время был новый предпросмотр
         if not serial:
+            self.status.set(f"В выделенной области номер не найден ({sec*1000:.0f} мс).")
             if not auto:
                 messagebox.showwarning("Не распозналось","В этой области не нашёл 2711xxxx или 20xxxxxx. Введите вручную ниже и нажмите «Применить к выбранному».")
             return
 
         # записать в таблицу + предложить имя
-        vals = self.tree.item(sel[0],"values"); fname = vals[0]
-        for r in self.rows:
-            if r["old"]==fname:
-                r["serial"]=serial; r["status"]="OK"
-                date=self.date_var.get().strip()
-                folder=Path(self.dir_var.get().strip())
-                existing=set(os.listdir(folder)); seen={}
-                r["new"] = propose(date, serial, Path(r["old"]).suffix.lower(), existing, seen)
-                break
-        self.refresh_tree()
+        self.rows[i]["status"]="OK"; self.set_serial(i, serial)
         # показать красную рамку
         dbg = self.preview_cache.get(fname) or {}
-        dbg["img"]=self.last_img; dbg["bbox"]=box; self.preview_cache[fname]=dbg
-        self.show_image_with_overlays(Path(self.dir_var.get())/fname, dbg)
-        self.status.set(f"Найден номер {serial} в выделенной области.")
+        dbg.update(bbox=found, serial=serial, angle=key[1], size=size)
+        self.preview_cache[fname]=dbg
+        # исправление оператора — самый надёжный пример для модели мест
+        if self.model is not None:
+            self.model.learn(found, size, weight=3); self.model.save()
+        if self.last_key == key: self.show_image_with_overlays(Path(self.dir_var.get())/fname, dbg)
+        self.status.set(f"Найден номер {serial} в выделенной области ({sec*1000:.0f} мс).")
 
     def apply_manual(self):
         sel = self.tree.selection()
@@ -527,14 +647,83 @@ class App(ttk.Frame):
         serial = self.manual_var.get().strip()
         if not PATTERN.fullmatch(serial):
             messagebox.showwarning("Неверный формат","Введите 8 цифр: 2711xxxx или 20xxxxxx."); return
-        vals = self.tree.item(sel[0],"values"); fname = vals[0]
-        for r in self.rows:
-            if r["old"]==fname: r["serial"]=serial; r["status"]="OK"; break
-        date=self.date_var.get().strip(); folder=Path(self.dir_var.get().strip())
-        existing=set(os.listdir(folder)); seen={}
-        for r in self.rows:
-            r["new"] = propose(date, r["serial"], Path(r["old"]).suffix.lower(), existing, seen) if r["serial"] else ""
-        self.refresh_tree(); self.status.set("Ручной номер применён.")
+        i = int(sel[0]); self.rows[i]["status"]="OK"; self.set_serial(i, serial)
+        self.status.set("Ручной номер применён.")
+
+class TreeDialog(tk.Toplevel):
+    """Прогон дерева папок (TreeRun) с прогрессом по каждой папке. Окно модальное: пока оно
+    открыто, главное окно не распознаёт и не переименовывает. Распознанное ложится в кэш —
+    открытая потом папка собирается без OCR; прерванный прогон продолжается со следующего запуска."""
+    def __init__(self, app: "App", root: Path):
+        super().__init__(app.master); self.app=app; self.root=root
+        self.title(f"Папки по датам — {root}"); self.geometry("760x460")
+        self.apply_var=tk.BooleanVar(value=False)
+        self.q=None; self.cancel=threading.Event(); self.items={}
+        self.run_obj=TreeRun(root, dict(app.cfg, use_rotations=True), app.wide_var.get())
+        bar=ttk.Frame(self); bar.pack(fill="x", padx=10, pady=8)
+        ttk.Checkbutton(bar, text="Сразу переименовать", variable=self.apply_var).pack(side="left")
+        self.start_btn=ttk.Button(bar, text="Начать", command=self.start); self.start_btn.pack(side="left", padx=8)
+        self.cancel_btn=ttk.Button(bar, text="Прервать", command=self.cancel.set, state="disabled")
+        self.cancel_btn.pack(side="left")
+        self.tree=ttk.Treeview(self, columns=("folder","date","done","status"), show="headings")
+        for k,t,w in [("folder","Папка",360),("date","Дата",100),("done","Распознано",110),("status","Итог",160)]:
+            self.tree.heading(k,text=t); self.tree.column(k,width=w,anchor="w" if k=="folder" else "center")
+        self.tree.pack(fill="both", expand=True, padx=10)
+        self.status=tk.StringVar(value=f"Папок с датой: {len(self.run_obj.folders)}")
+        ttk.Label(self, textvariable=self.status, anchor="w").pack(fill="x", padx=10, pady=6)
+        for folder, date in self.run_obj.folders: self._item(self.run_obj.rel(folder), date)
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.transient(app.master); self.grab_set()
+
+    def _item(self, rel, date=""):
+        if rel not in self.items: self.items[rel]=self.tree.insert("", "end", values=(rel or ".", date, "", ""))
+        return self.items[rel]
+
+    def start(self):
+        if self.q is not None: return
+        app=self.app; cfg=app.run_cfg(self)
+        if cfg is None: return
+        # состояние перечитывается с диска: прерванный прогон продолжится, законченный начнётся заново
+        run=self.run_obj=TreeRun(self.root, cfg, app.wide_var.get(), self.apply_var.get(),
+                                 cache=app.ocr_cache, force=app.force_var.get(), model=app.model)
+        self.q=q=queue.Queue(); self.start_btn.configure(state="disabled"); self.cancel_btn.configure(state="normal")
+        def work():
+            try:
+                ok=run.run(on_folder=lambda rel, job, counts: q.put(("folder", rel, counts)),
+                           cancel=self.cancel,
+                           on_file=lambda rel, job: q.put(("file", rel, job.received, len(job.files))))
+                q.put(("end", ok))
+            except Exception as e: q.put(("error", e))
+        threading.Thread(target=work, daemon=True).start()
+        self.after(100, self.poll)
+
+    def poll(self):
+        try:
+            while True:
+                msg=self.q.get_nowait()
+                if msg[0]=="file":
+                    _, rel, n, total=msg; self.tree.set(self._item(rel), "done", f"{n} из {total}")
+                elif msg[0]=="folder":
+                    _, rel, counts=msg
+                    self.tree.set(self._item(rel), "status", "ошибка" if counts.get("error") else
+                                  ", ".join(f"{k} {v}" for k,v in counts.items() if v and k!="error"))
+                    self.status.set(f"Готово папок: {sum(1 for it in self.items.values() if self.tree.set(it, 'status'))} "
+                                    f"из {len(self.items)}")
+                else:
+                    self.q=None; self.cancel_btn.configure(state="disabled")
+                    if msg[0]=="error": messagebox.showerror("Папки по датам", str(msg[1]), parent=self)
+                    elif msg[1]: self.status.set("Все папки пройдены.")
+                    else: self.status.set("Прервано. «Начать» продолжит с места остановки.")
+                    self.start_btn.configure(state="normal"); self.cancel.clear()
+                    return
+        except queue.Empty: pass
+        self.after(100, self.poll)
+
+    def close(self):
+        if self.q is not None:
+            self.cancel.set(); self.after(100, self.close); return
+        if self.app.model is not None: self.app.model.save()
+        self.grab_release(); self.destroy()
 
 def main():
     root=tk.Tk(); App(root); root.mainloop()
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from PIL import Image
+
+from ella.batch import FolderJob, TreeRun
+from ella.ocr import DIGITS, FakeBackend
+
+# фабрики движков для рабочих процессов пула ("ocr_backend": "модуль:фабрика")
+def broken():
+    raise RuntimeError("tesseract не найден")
+
+def digits():
+    def reader(pil, lang, whitelist):
+        if whitelist!=DIGITS: return []
+        return [{"text": "27110001", "left": 10, "top": 10, "width": 80, "height": 14}]
+    return FakeBackend(reader)
+
+def cfg(backend):
+    return {"ocr_backend": f"{__name__}:{backend}", "use_rotations": False}
+
+@pytest.fixture
+def tree(tmp_path):
+    folder = tmp_path/"17.10.2026"; folder.mkdir()
+    for k in range(5): Image.new("L", (620, 877), 255).save(folder/f"scan_{k:04d}.png", dpi=(75, 75))
+    return tmp_path
+
+def test_resume_after_engine_failure_rescans(tree):
+    cancel = threading.Event(); seen = []
+    def on_records(job, recs): seen.extend(recs)
+    def on_file(rel, job):
+        if job.received: cancel.set()   # прерываем после первых итогов
+    assert not TreeRun(tree, cfg("broken"), jobs=1).run(on_records, cancel=cancel, on_file=on_file)
+    assert seen and all(r["status"]=="error" and r["error"] for r in seen)
+
+    recs = []
+    assert TreeRun(tree, cfg("digits"), jobs=1).run(lambda job, rs: recs.extend(rs))
+    assert len(recs) == 5
+    assert all(r["serial"]=="27110001" and not r["cached"] for r in recs)
+
+def test_failure_is_counted_apart_from_not_found(tree):
+    job = FolderJob(tree/"17.10.2026", "17.10.2026")
+    recs = job.add(0, {"serial": None, "error": "сбой OCR"}) + job.add(1, {"serial": None})
+    assert [(r["status"], r.get("error")) for r in recs] == [("error", "сбой OCR"), ("not_found", None)]
+    assert (job.counts["error"], job.counts["not_found"]) == (1, 1)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from ella.naming import NameIndex
+
+DATE = "17.10.2026"
+
+def names(ix, n):
+    return [ix.name(i) for i in range(n)]
+
+def test_series_in_row_order_skips_taken():
+    ix = NameIndex(DATE, ["a.jpg", "b.jpg", "c.jpg", f"{DATE} 27110001 1.jpg"])
+    for i, old in enumerate(["a.jpg", "b.jpg", "c.jpg"]): ix.set(i, old, "27110001", ".jpg")
+    assert names(ix, 3) == [f"{DATE} 27110001.jpg", f"{DATE} 27110001 2.jpg", f"{DATE} 27110001 3.jpg"]
+
+def test_result_does_not_depend_on_arrival_order():
+    rows = [("a.jpg", "27110001"), ("b.png", "27110001"), ("c.jpg", "20123456"), ("d.jpg", "27110001")]
+    fwd = NameIndex(DATE, [r[0] for r in rows]); back = NameIndex(DATE, [r[0] for r in rows])
+    for i, (old, serial) in enumerate(rows): fwd.set(i, old, serial, old[-4:])
+    for i, (old, serial) in reversed(list(enumerate(rows))): back.set(i, old, serial, old[-4:])
+    assert names(fwd, 4) == names(back, 4)
+    assert names(fwd, 4)[:2] == [f"{DATE} 27110001.jpg", f"{DATE} 27110001 1.png"]
+
+def test_row_already_named_keeps_its_name():
+    old = f"{DATE} 27110001.jpg"
+    ix = NameIndex(DATE, ["0001.jpg", old])
+    ix.set(0, "0001.jpg", "27110001", ".jpg"); ix.set(1, old, "27110001", ".jpg")
+    assert names(ix, 2) == [f"{DATE} 27110001 1.jpg", old]
+
+def test_changed_serial_frees_the_series_name():
+    old = f"{DATE} 27110001.jpg"
+    ix = NameIndex(DATE, ["a.jpg", old])
+    ix.set(0, "a.jpg", "27110001", ".jpg")
+    assert ix.name(0) == f"{DATE} 27110001 1.jpg"   # имя занято файлом без номера
+    assert ix.set(1, old, "27110002", ".jpg") == [0, 1]
+    assert names(ix, 2) == [f"{DATE} 27110001.jpg", f"{DATE} 27110002.jpg"]
+    assert ix.set(1, old, None, ".jpg") == [0, 1]
+    assert names(ix, 2) == [f"{DATE} 27110001 1.jpg", ""]
+
+def test_parts_follow_their_row():
+    ix = NameIndex(DATE, ["a.tif", "b.tif"])
+    ix.set_parts(0, "a.tif", ["27110001", "27110002"], ".tif")
+    ix.set(1, "b.tif", "27110002", ".tif")
+    assert ix.nparts(0) == 2
+    assert (ix.name(0), ix.name(0, 1), ix.name(1)) == (f"{DATE} 27110001.tif", f"{DATE} 27110002.tif",
+                                                      f"{DATE} 27110002 1.tif")
+    ix.set_parts(0, "a.tif", ["27110001"], ".tif")
+    assert ix.nparts(0) == 1 and ix.name(1) == f"{DATE} 27110002.tif"
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+pytest.importorskip("PIL")
+pytest.importorskip("numpy")
+
+from PIL import Image
+
+from ella.cache import OcrCache
+from ella.dups import DupIndex
+from ella.pool import iter_recognize
+
+CFG = {"ocr_backend": "tests.test_batch:digits", "use_rotations": False}
+
+def test_rescans_run_when_dup_index_fails(tmp_path, monkeypatch):
+    paths = []
+    for k in range(3):   # один и тот же лист трижды: второй и третий ждут первого в parked
+        paths.append(tmp_path/f"scan_{k}.png"); Image.new("L", (620, 877), 255).save(paths[-1], dpi=(75, 75))
+    def broken(self, *a): raise OSError("база занята")
+    monkeypatch.setattr(DupIndex, "add", broken)
+    cache = OcrCache(tmp_path/"cache.sqlite")
+    got = sorted(i for i, _p, dbg in iter_recognize(paths, CFG, jobs=1, cache=cache))
+    assert got == [0, 1, 2]
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+pytest.importorskip("PIL")
+
+from PIL import Image
+
+from ella.ocr import DIGITS, FakeBackend, ensure_tess, set_backend
+from ella.recognize import extract_number_debug
+
+CFG = {"use_rotations": False}
+
+@pytest.fixture
+def page(tmp_path):
+    path = tmp_path/"scan.png"; Image.new("L", (1240, 1754), 255).save(path, dpi=(150, 150))
+    return path
+
+@pytest.fixture
+def backend():
+    def use(reader):
+        b = FakeBackend(reader); set_backend(b); return b
+    yield use
+    ensure_tess({})   # следующий get_backend создаст движок заново
+
+def digits_only(pil, lang, whitelist):
+    """Номер виден только проходу по цифрам: словесный проход ничего не находит."""
+    if whitelist!=DIGITS: return []
+    return [{"text": "27110001", "left": 10, "top": 10, "width": 80, "height": 14}]
+
+def test_serial_from_digits_pass(page, backend):
+    b = backend(digits_only)
+    dbg = extract_number_debug(page, CFG, keep_img=False)
+    assert dbg["serial"] == "27110001" and not dbg.get("error")
+    assert dbg["source"].endswith("без якоря")
+    assert b.calls == dbg["stats"]["ocr_calls"] > 0
+
+def test_ocr_failure_is_marked(page, backend):
+    def broken(pil, lang, whitelist): raise RuntimeError("нет tesseract")
+    backend(broken)
+    dbg = extract_number_debug(page, CFG, keep_img=False)
+    assert dbg["serial"] is None and dbg["error"]
+    assert dbg["stats"]["stages"]["ocr_error"][0] > 0
+
+def test_nothing_found_is_not_an_error(page, backend):
+    backend(None)
+    dbg = extract_number_debug(page, CFG, keep_img=False)
+    assert dbg["serial"] is None and not dbg.get("error")
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import json, os
+
+from ella.rename import JOURNAL_NAME, RenameBatch
+
+def make(folder, **files):
+    for name, text in files.items(): (folder/name).write_text(text, encoding="utf-8")
+
+def contents(folder):
+    return {p.name: p.read_text(encoding="utf-8") for p in folder.iterdir() if p.is_file() and p.name!=JOURNAL_NAME}
+
+def test_plan_refuses_missing_and_taken(tmp_path):
+    make(tmp_path, **{"a.jpg": "A", "b.jpg": "B", "x.jpg": "X"})
+    batch, skipped = RenameBatch.plan(tmp_path, [("a.jpg", "x.jpg"), ("b.jpg", "n.jpg"), ("c.jpg", "m.jpg"),
+                                                  ("b.jpg", "b.jpg")])
+    assert skipped == {"a.jpg": "exists", "c.jpg": "missing"}
+    assert [(m["src"], m["dst"]) for m in batch.moves] == [("b.jpg", "n.jpg")]
+
+def test_swap_and_cycle_go_through_temporary_names(tmp_path):
+    make(tmp_path, **{"a.jpg": "A", "b.jpg": "B", "c.jpg": "C", "d.jpg": "D", "e.jpg": "E"})
+    batch, skipped = RenameBatch.plan(tmp_path, [("a.jpg", "b.jpg"), ("b.jpg", "a.jpg"),
+                                                  ("c.jpg", "d.jpg"), ("d.jpg", "e.jpg"), ("e.jpg", "c.jpg")])
+    assert not skipped
+    status = batch.run(jobs=4)
+    assert set(status.values()) == {"renamed"}
+    assert contents(tmp_path) == {"a.jpg": "B", "b.jpg": "A", "c.jpg": "E", "d.jpg": "C", "e.jpg": "D"}
+    assert json.loads((tmp_path/JOURNAL_NAME).read_text(encoding="utf-8"))["done"]
+
+def test_undo_restores_names_and_drops_journal(tmp_path):
+    make(tmp_path, **{"a.jpg": "A", "b.jpg": "B"})
+    batch, _ = RenameBatch.plan(tmp_path, [("a.jpg", "b.jpg"), ("b.jpg", "c.jpg")])
+    batch.run()
+    assert contents(tmp_path) == {"b.jpg": "A", "c.jpg": "B"}
+    status = RenameBatch.load(tmp_path).undo()
+    assert set(status.values()) == {"renamed"}
+    assert contents(tmp_path) == {"a.jpg": "A", "b.jpg": "B"}
+    assert not (tmp_path/JOURNAL_NAME).exists()
+
+def interrupted(folder):
+    """Пакет a→b, b→c, d→e, прерванный на середине: b уже на временном имени, d — на новом."""
+    make(folder, **{"a.jpg": "A", "b.jpg": "B", "d.jpg": "D"})
+    batch, _ = RenameBatch.plan(folder, [("a.jpg", "b.jpg"), ("b.jpg", "c.jpg"), ("d.jpg", "e.jpg")])
+    batch.save()
+    os.rename(folder/"b.jpg", folder/batch.moves[1]["tmp"]); os.rename(folder/"d.jpg", folder/"e.jpg")
+    return batch
+
+def test_resume_finishes_interrupted_batch(tmp_path):
+    interrupted(tmp_path)
+    assert {batch.locate(m) for batch in [RenameBatch.load(tmp_path)] for m in batch.moves} == {"src", "tmp", "dst"}
+    status = RenameBatch.resume(tmp_path)
+    assert set(status.values()) == {"renamed"}
+    assert contents(tmp_path) == {"b.jpg": "A", "c.jpg": "B", "e.jpg": "D"}
+    assert RenameBatch.resume(tmp_path) is None   # уже доделан
+
+def test_undo_rolls_back_interrupted_batch(tmp_path):
+    interrupted(tmp_path)
+    RenameBatch.load(tmp_path).undo()
+    assert contents(tmp_path) == {"a.jpg": "A", "b.jpg": "B", "d.jpg": "D"}
+
+def test_foreign_file_on_target_is_not_overwritten(tmp_path):
+    make(tmp_path, **{"a.jpg": "A"})
+    batch, _ = RenameBatch.plan(tmp_path, [("a.jpg", "n.jpg")])
+    make(tmp_path, **{"n.jpg": "чужой"})   # появился между предпросмотром и переименованием
+    assert batch.run() == {"a.jpg": "exists"}
+    assert contents(tmp_path) == {"a.jpg": "A", "n.jpg": "чужой"}
+
+def test_nothing_to_do_keeps_previous_journal(tmp_path):
+    make(tmp_path, **{"a.jpg": "A"})
+    batch, _ = RenameBatch.plan(tmp_path, [("a.jpg", "n.jpg")]); batch.run()
+    again, _ = RenameBatch.plan(tmp_path, [("n.jpg", "n.jpg")])   # повторный --apply по уже готовой папке
+    assert again.run() == {}
+    assert RenameBatch.load(tmp_path).undo() == {"a.jpg": "renamed"}
+    assert contents(tmp_path) == {"a.jpg": "A"}
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from PIL import Image
+
+from ella import rename
+from ella.rename import JOURNAL_NAME, SPLIT_KEEP_DIR, RenameBatch
+
+def tiff(path, n):
+    pages = [Image.new("L", (40, 30), 40*k) for k in range(n)]
+    pages[0].save(path, save_all=True, append_images=pages[1:], compression="tiff_lzw")
+
+def split(folder, parts, pairs=()):
+    batch, skipped = RenameBatch.plan(folder, list(pairs), splits=[("doc.tif", parts)])
+    return batch, dict(skipped, **batch.run())
+
+def listing(folder):
+    return sorted(p.name for p in folder.iterdir() if p.name!=JOURNAL_NAME)
+
+def test_split_writes_parts_and_keeps_source(tmp_path):
+    tiff(tmp_path/"doc.tif", 3)
+    _, status = split(tmp_path, [("a.tif", [0]), ("b.tif", [1, 2])])
+    assert status == {"doc.tif": "split"}
+    with Image.open(tmp_path/"b.tif") as im: assert im.n_frames == 2
+    assert listing(tmp_path) == ["a.tif", "b.tif", SPLIT_KEEP_DIR]
+    assert (tmp_path/SPLIT_KEEP_DIR/"doc.tif").exists()
+
+def test_split_is_all_or_nothing(tmp_path):
+    tiff(tmp_path/"doc.tif", 3)
+    (tmp_path/"c.tif").write_bytes(b"busy")
+    _, status = split(tmp_path, [("a.tif", [0]), ("b.tif", [1]), ("c.tif", [2])])
+    assert status == {"doc.tif": "exists"}
+    assert listing(tmp_path) == ["c.tif", "doc.tif"]
+
+def test_split_failure_removes_written_parts(tmp_path, monkeypatch):
+    tiff(tmp_path/"doc.tif", 3)
+    real = os.rename; calls = []
+    def flaky(src, dst):
+        calls.append(dst)
+        if len(calls)==2: raise OSError("сеть отвалилась")
+        real(src, dst)
+    monkeypatch.setattr(rename.os, "rename", flaky)
+    _, status = split(tmp_path, [("a.tif", [0]), ("b.tif", [1]), ("c.tif", [2])])
+    assert status == {"doc.tif": "error"}
+    assert listing(tmp_path) == ["doc.tif"]
+
+def test_part_takes_name_freed_by_rename(tmp_path):
+    tiff(tmp_path/"doc.tif", 2)
+    (tmp_path/"b.tif").write_bytes(b"B")
+    _, status = split(tmp_path, [("a.tif", [0]), ("b.tif", [1])], [("b.tif", "c.tif")])
+    assert status == {"b.tif": "renamed", "doc.tif": "split"}
+    assert (tmp_path/"c.tif").read_bytes() == b"B"
+
+def test_undo_reverses_split_and_renames(tmp_path):
+    tiff(tmp_path/"doc.tif", 2)
+    (tmp_path/"b.tif").write_bytes(b"B")
+    before = (tmp_path/"doc.tif").read_bytes()
+    split(tmp_path, [("a.tif", [0]), ("b.tif", [1])], [("b.tif", "c.tif")])
+    status = RenameBatch.load(tmp_path).undo()
+    assert status == {"b.tif": "renamed", "doc.tif": "renamed"}
+    assert listing(tmp_path) == ["b.tif", "doc.tif", SPLIT_KEEP_DIR]
+    assert (tmp_path/"doc.tif").read_bytes() == before and (tmp_path/"b.tif").read_bytes() == b"B"
+    assert not (tmp_path/JOURNAL_NAME).exists()
+
+def test_resume_moves_source_after_crash(tmp_path):
+    tiff(tmp_path/"doc.tif", 2)
+    batch, _ = RenameBatch.plan(tmp_path, [], splits=[("doc.tif", [("a.tif", [0]), ("b.tif", [1])])])
+    batch.save()
+    s = batch.splits[0]
+    rename.split_tiff(tmp_path/"doc.tif", [("a.tif", [0]), ("b.tif", [1])])   # части записаны, исходник не убран
+    s["made"] = {b: rename._ident(os.stat(tmp_path/b)) for b in ("a.tif", "b.tif")}; batch.save()
+    assert RenameBatch.resume(tmp_path) == {"doc.tif": "split"}
+    assert listing(tmp_path) == ["a.tif", "b.tif", SPLIT_KEEP_DIR]